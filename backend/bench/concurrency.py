@@ -0,0 +1,136 @@
+"""Requests/sec under concurrent load, for comparing sync vs async handlers.
+
+Start the API (``uvicorn src.main:app --port 8000``) against a seeded
+database, then from ``backend/``:
+
+    python -m bench.concurrency --label before --out before.json
+    # check out / deploy the new code, restart uvicorn
+    python -m bench.concurrency --label after --out after.json --compare before.json
+
+Each level fires ``--requests`` calls with at most N in flight, rotating
+through the hot endpoints (login, results, attendance, messages), and
+reports requests/sec (all responses, and only the 2xx/3xx ones: a server
+shedding load with fast 503s is not faster) with the p50 and p95 latency
+of each call.
+Requires ``httpx`` (dev dependency).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+LEVELS = (50, 200, 500)
+
+
+async def _login(client, email, password):
+    r = await client.post("/api/auth/login", json={"email": email, "password": password})
+    r.raise_for_status()
+    body = r.json()
+    return body["access_token"], body["user"]
+
+
+def _endpoints(student_user, teacher_user, student_token, teacher_token, args):
+    student_id = student_user.get("student_id")
+    s_auth = {"Authorization": f"Bearer {student_token}"}
+    t_auth = {"Authorization": f"Bearer {teacher_token}"}
+    eps = [
+        ("GET", "/api/messages", t_auth, None),
+        ("GET", "/api/messages/users?q=a", t_auth, None),
+    ]
+    if student_id:
+        eps.append(("GET", f"/api/results/student/{student_id}", s_auth, None))
+        eps.append(("GET", f"/api/attendance/student/{student_id}", s_auth, None))
+    if args.class_id:
+        eps.append(("GET", f"/api/attendance?class_id={args.class_id}", t_auth, None))
+        eps.append(("GET", f"/api/results/class/{args.class_id}", t_auth, None))
+    if args.include_login:
+        eps.append(("POST", "/api/auth/login", {}, {"email": args.teacher_email, "password": args.teacher_password}))
+    return eps
+
+
+async def _run_level(client, endpoints, concurrency, total):
+    sem = asyncio.Semaphore(concurrency)
+    ok = errors = 0
+    latencies = []
+
+    async def one(i):
+        nonlocal ok, errors
+        method, path, headers, body = endpoints[i % len(endpoints)]
+        async with sem:
+            sent = time.perf_counter()
+            try:
+                r = await client.request(method, path, headers=headers, json=body)
+                if r.status_code < 400:
+                    ok += 1
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - sent)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"concurrency": concurrency, "requests": total, "ok": ok, "errors": errors,
+            "seconds": round(elapsed, 3), "rps": round(total / elapsed, 1), "ok_rps": round(ok / elapsed, 1),
+            "p50_ms": _ms(latencies, 0.50), "p95_ms": _ms(latencies, 0.95)}
+
+
+def _ms(sorted_seconds, q):
+    return round(sorted_seconds[min(int(len(sorted_seconds) * q), len(sorted_seconds) - 1)] * 1000, 1)
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=max(LEVELS) + 10, max_keepalive_connections=max(LEVELS))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        s_token, s_user = await _login(client, args.student_email, args.student_password)
+        t_token, t_user = await _login(client, args.teacher_email, args.teacher_password)
+        endpoints = _endpoints(s_user, t_user, s_token, t_token, args)
+        results = []
+        for level in args.levels:
+            res = await _run_level(client, endpoints, level, args.requests)
+            results.append(res)
+            print(f"[{args.label}] c={level:<4} rps={res['rps']:<8} ok_rps={res['ok_rps']:<8} p50={res['p50_ms']}ms p95={res['p95_ms']}ms "
+                  f"ok={res['ok']} errors={res['errors']} t={res['seconds']}s")
+    return results
+
+
+def _compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r["concurrency"]: r for r in json.load(f)["results"]}
+    print(f"{'clients':>8} {'ok rps before':>14} {'ok rps after':>13} {'change':>8} {'p95 before':>11} {'p95 after':>10}")
+    for r in results:
+        b = baseline.get(r["concurrency"])
+        if not b:
+            continue
+        before = b.get("ok_rps", b["rps"])
+        change = (r["ok_rps"] - before) / before * 100 if before else 0
+        print(f"{r['concurrency']:>8} {before:>14} {r['ok_rps']:>13} {change:>7.1f}% "
+              f"{b.get('p95_ms', '-'):>9}ms {r['p95_ms']:>8}ms")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--base-url", default="http://localhost:8000")
+    p.add_argument("--levels", type=int, nargs="+", default=list(LEVELS))
+    p.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    p.add_argument("--class-id", default=None, help="class to use for class-level endpoints")
+    p.add_argument("--include-login", action="store_true", help="mix bcrypt logins into the load")
+    p.add_argument("--student-email", default="student@ultimatecollege.co.zw")
+    p.add_argument("--student-password", default="Student@123")
+    p.add_argument("--teacher-email", default="teacher@ultimatecollege.co.zw")
+    p.add_argument("--teacher-password", default="Teacher@123")
+    p.add_argument("--label", default="run")
+    p.add_argument("--out", default=None, help="write results JSON here")
+    p.add_argument("--compare", default=None, help="baseline JSON from a previous --out")
+    args = p.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"label": args.label, "results": results}, f, indent=2)
+    if args.compare:
+        _compare(results, args.compare)
@@ -0,0 +1,449 @@
+"""Deterministic synthetic school, bulk-loaded with COPY into the real schema.
+
+Default scale is a 5,000-student school over 10 academic years: about 12,500
+students ever enrolled, ~1.2M exam results, ~9M attendance rows, 150k
+invoices and 100k messages. The same ``--seed`` always produces the same
+ids and rows, so benchmark runs are comparable.
+
+Use a dedicated database with schema.sql applied and ``python -m
+src.migrate`` run. From ``backend/``:
+
+    python -m bench.datagen --truncate                  # full scale
+    python -m bench.datagen --students 600 --years 2    # quick
+    python -m bench.datagen --dry-run                   # generate only, count rows
+
+Every generated account uses the password ``BENCH_PASSWORD`` and an
+``@bench.local`` email. ``--manifest`` (default bench_dataset.json) lists
+sample accounts and ids for ``bench.loadtest``. ``--truncate`` empties all
+school data tables and deletes previous bench users first.
+"""
+import argparse
+import csv
+import datetime as dt
+import io
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+BENCH_PASSWORD = "Bench#Pass2025"
+DOMAIN = "bench.local"
+COPY_BATCH = 50_000
+
+FORMS = ["Form 1", "Form 2", "Form 3", "Form 4", "Form 5", "Form 6"]
+SUBJECTS = [
+    ("Mathematics", "MATH"), ("English Language", "ENG"), ("Shona", "SHONA"), ("Physical Science", "PHY"),
+    ("Biology", "BIO"), ("Geography", "GEO"), ("History", "HIST"), ("Commerce", "COMM"),
+    ("Accounts", "ACC"), ("Computer Science", "COMP"), ("Literature in English", "LIT"),
+]
+FIRST_NAMES = [
+    "Tendai", "Rudo", "Tatenda", "Chipo", "Farai", "Nyasha", "Takudzwa", "Rutendo", "Kudakwashe", "Tinashe",
+    "Ruvimbo", "Tafadzwa", "Munashe", "Anesu", "Tanaka", "Vimbai", "Simbarashe", "Chiedza", "Tapiwa", "Ropafadzo",
+    "Blessing", "Precious", "Tawanda", "Kuda", "Panashe", "Nokutenda", "Shamiso", "Kundai", "Mufaro", "Tariro",
+]
+LAST_NAMES = [
+    "Moyo", "Ncube", "Sibanda", "Dube", "Mpofu", "Ndlovu", "Chikwanha", "Mutasa", "Chirwa", "Mhlanga",
+    "Nyathi", "Marufu", "Gumbo", "Shumba", "Mapfumo", "Zvobgo", "Chimuka", "Makoni", "Mushonga", "Banda",
+    "Mazarura", "Chinembiri", "Matanda", "Kambarami", "Hove", "Maposa", "Tshuma", "Mlambo", "Mutema", "Nkomo",
+]
+ATTENDANCE_STATUSES = (("PRESENT", 0.92), ("ABSENT", 0.04), ("LATE", 0.03), ("EXCUSED", 0.01))
+EXAM_TYPES = ("TEST", "TERM", "CONTINUOUS")
+FORM_FEES = (Decimal("350.00"), Decimal("350.00"), Decimal("380.00"), Decimal("420.00"), Decimal("450.00"), Decimal("450.00"))
+APP_TABLES = (
+    "academic_years", "students", "teachers", "parents", "messages", "library_items",
+    "applications", "news_events", "fee_structures",
+)
+
+
+def _term_dates(year):
+    return (
+        ("Term 1", dt.date(year, 1, 13), dt.date(year, 4, 4)),
+        ("Term 2", dt.date(year, 4, 28), dt.date(year, 8, 1)),
+        ("Term 3", dt.date(year, 9, 8), dt.date(year, 12, 5)),
+    )
+
+
+def _school_days(start, end):
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            yield d
+        d += dt.timedelta(days=1)
+
+
+def _stream_name(i):
+    letters = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        letters = chr(65 + r) + letters
+    return letters
+
+
+class Loader:
+    def __init__(self, cur, seed, dry_run=False):
+        self.cur = cur
+        self.rnd = random.Random(seed)
+        self.dry_run = dry_run
+        self.counts = {}
+
+    def uid(self):
+        return str(uuid.UUID(int=self.rnd.getrandbits(128), version=4))
+
+    def copy(self, table, columns, rows):
+        """Stream ``rows`` into ``table`` with COPY in batches; returns the row count."""
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        n = 0
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        for row in rows:
+            w.writerow(row)
+            n += 1
+            if n % COPY_BATCH == 0:
+                self._flush(sql, buf)
+                buf = io.StringIO()
+                w = csv.writer(buf)
+        self._flush(sql, buf)
+        self.counts[table] = self.counts.get(table, 0) + n
+        return n
+
+    def _flush(self, sql, buf):
+        if self.dry_run or not buf.tell():
+            return
+        buf.seek(0)
+        self.cur.copy_expert(sql, buf)
+
+    def name(self):
+        return self.rnd.choice(FIRST_NAMES), self.rnd.choice(LAST_NAMES)
+
+
+def _ensure_reference(cur, ld, n_streams):
+    """Forms, streams and subjects are reused by name so seed.sql data is kept."""
+    forms, streams, subjects = {}, {}, {}
+    if ld.dry_run:
+        for i, name in enumerate(FORMS):
+            forms[name] = ld.uid()
+            for s in range(n_streams):
+                streams[(name, _stream_name(s))] = ld.uid()
+        for name, _ in SUBJECTS:
+            subjects[name] = ld.uid()
+        return forms, streams, subjects
+    for i, name in enumerate(FORMS):
+        cur.execute("""
+            INSERT INTO forms (name, display_order) VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE SET display_order = EXCLUDED.display_order
+            RETURNING id
+        """, (name, i + 1))
+        forms[name] = str(cur.fetchone()["id"])
+        for s in range(n_streams):
+            cur.execute("""
+                INSERT INTO streams (name, form_id) VALUES (%s, %s)
+                ON CONFLICT (name, form_id) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id
+            """, (_stream_name(s), forms[name]))
+            streams[(name, _stream_name(s))] = str(cur.fetchone()["id"])
+    for name, code in SUBJECTS:
+        cur.execute("""
+            INSERT INTO subjects (name, code, is_examinable) VALUES (%s, %s, true)
+            ON CONFLICT (name) DO UPDATE SET code = COALESCE(subjects.code, EXCLUDED.code)
+            RETURNING id
+        """, (name, code))
+        subjects[name] = str(cur.fetchone()["id"])
+    return forms, streams, subjects
+
+
+def generate(cur, args, password_hash):
+    ld = Loader(cur, args.seed, args.dry_run)
+    rnd = ld.rnd
+    cohort_size = max(1, args.students // len(FORMS))
+    n_streams = math.ceil(cohort_size / args.class_size)
+    first_year = args.last_year - args.years + 1
+    n_cohorts = args.years + len(FORMS) - 1  # cohort c enters Form 1 in first_year - 5 + c
+
+    forms, streams, subjects = _ensure_reference(cur, ld, n_streams)
+    subject_names = [s for s, _ in SUBJECTS]
+
+    # ---- Academic years and terms
+    years, terms = [], {}
+    for y in range(first_year, args.last_year + 1):
+        ay = ld.uid()
+        years.append((ay, y))
+        terms[ay] = [(ld.uid(), name, start, end) for name, start, end in _term_dates(y)]
+    if not ld.dry_run:
+        cur.execute("UPDATE academic_years SET is_current = false WHERE is_current")
+    ld.copy("academic_years", ("id", "name", "start_date", "end_date", "is_current", "created_at"),
+            ((ay, str(y), dt.date(y, 1, 13), dt.date(y, 12, 5), y == args.last_year, dt.datetime(y - 1, 12, 1))
+             for ay, y in years))
+    ld.copy("terms", ("id", "academic_year_id", "name", "start_date", "end_date"),
+            ((tid, ay, name, start, end) for ay, _ in years for tid, name, start, end in terms[ay]))
+
+    # ---- Users and people
+    users = []
+
+    def user(email, role, created):
+        uid = ld.uid()
+        users.append((uid, email, password_hash, role, True, created))
+        return uid
+
+    epoch = dt.datetime(first_year - 1, 12, 1)
+    admins = [user(f"admin{i}@{DOMAIN}", "ADMIN_STAFF", epoch) for i in range(2)]
+    finance = [user(f"finance{i}@{DOMAIN}", "FINANCE_OFFICER", epoch) for i in range(3)]
+
+    teachers = []
+    for i in range(max(len(subject_names), args.students // 25)):
+        first, last = ld.name()
+        teachers.append((ld.uid(), user(f"teacher{i}@{DOMAIN}", "TEACHER", epoch), first, last,
+                         rnd.choice(("Mr", "Mrs", "Ms", "Dr")), f"+26377{rnd.randrange(10**7):07d}", f"T{i:05d}"))
+
+    students, cohorts = [], []
+    for c in range(n_cohorts):
+        entry_year = first_year - len(FORMS) + 1 + c
+        graduated = entry_year + len(FORMS) - 1 < args.last_year
+        members = []
+        for k in range(cohort_size):
+            n = len(students)
+            first, last = ld.name()
+            created = dt.datetime(entry_year - 1, 12, 1) + dt.timedelta(minutes=n)
+            students.append((ld.uid(), user(f"student{n}@{DOMAIN}", "STUDENT", created), f"S{entry_year}{k:05d}",
+                             first, last, dt.date(entry_year - 13, 1, 1) + dt.timedelta(days=rnd.randrange(365)),
+                             rnd.choice(("Male", "Female")), "GRADUATED" if graduated else "ACTIVE", created))
+            members.append(n)
+        cohorts.append((entry_year, members))
+
+    parents, links, children = [], [], {}
+    n_parents = max(1, int(len(students) * 0.8))
+    for i in range(n_parents):
+        first, last = ld.name()
+        parents.append((ld.uid(), user(f"parent{i}@{DOMAIN}", "PARENT", epoch), first, last, f"+26371{rnd.randrange(10**7):07d}"))
+    for n, s in enumerate(students):
+        p = n % n_parents if n < n_parents else rnd.randrange(n_parents)  # every parent has a child; some have siblings
+        guardians = {p}
+        if rnd.random() < 0.3:
+            guardians.add(rnd.randrange(n_parents))
+        for j, g in enumerate(sorted(guardians)):
+            links.append((ld.uid(), parents[g][0], s[0], "Parent" if j == 0 else "Guardian", j == 0))
+            children.setdefault(g, []).append(n)
+
+    ld.copy("users", ("id", "email", "password_hash", "role", "is_active", "created_at"), users)
+    ld.copy("teachers", ("id", "user_id", "first_name", "last_name", "title", "phone", "employee_number"), teachers)
+    ld.copy("students", ("id", "user_id", "student_number", "first_name", "last_name", "date_of_birth", "gender",
+                         "enrollment_status", "created_at"), students)
+    ld.copy("parents", ("id", "user_id", "first_name", "last_name", "phone"), parents)
+    ld.copy("parent_student_links", ("id", "parent_id", "student_id", "relationship", "is_primary"), links)
+
+    # ---- Classes, rosters and subject teachers per year
+    classes = []  # (class_id, ay, year, form_index, roster[list of student idx], subject ids, teacher per subject)
+    for ay, y in years:
+        for f, form in enumerate(FORMS):
+            entry_year = y - f
+            c = entry_year - (first_year - len(FORMS) + 1)
+            members = cohorts[c][1]
+            picked = rnd.sample(subject_names, min(args.subjects_per_class, len(subject_names)))
+            for s in range(n_streams):
+                roster = members[s::n_streams]
+                if not roster:
+                    continue
+                sub_ids = [subjects[name] for name in picked]
+                classes.append((ld.uid(), ay, y, f, roster, sub_ids,
+                                [teachers[rnd.randrange(len(teachers))][0] for _ in sub_ids],
+                                streams[(form, _stream_name(s))], forms[form], f"{form} {_stream_name(s)}"))
+    ld.copy("classes", ("id", "academic_year_id", "form_id", "stream_id", "name", "created_at"),
+            ((c[0], c[1], c[8], c[7], c[9], dt.datetime(c[2] - 1, 12, 1)) for c in classes))
+    # Form-wide termly fees, priced by billing runs (src/finance/billing.py)
+    ld.copy("fee_structures", ("academic_year_id", "form_id", "amount", "description"),
+            ((ay, forms[form], FORM_FEES[f], f"Tuition {form}") for ay, _ in years for f, form in enumerate(FORMS)))
+    ld.copy("class_teachers", ("id", "class_id", "teacher_id", "subject_id", "academic_year_id"),
+            ((ld.uid(), c[0], t, s, c[1]) for c in classes for s, t in zip(c[5], c[6])))
+    ld.copy("student_classes", ("id", "student_id", "class_id", "academic_year_id", "enrolled_at"),
+            ((ld.uid(), students[n][0], c[0], c[1], dt.datetime(c[2], 1, 13)) for c in classes for n in c[4]))
+
+    # ---- Exams and results: ability per student, difficulty per exam
+    ability = [rnd.gauss(58, 12) for _ in students]
+    exams = []
+    for c in classes:
+        for tid, tname, start, end in terms[c[1]]:
+            for s, t in zip(c[5], c[6]):
+                for e in range(args.exams_per_term):
+                    kind = EXAM_TYPES[e % len(EXAM_TYPES)]
+                    exams.append((ld.uid(), tid, c[0], s, f"{tname} {kind.title()} {e + 1}", kind,
+                                  Decimal(100), dt.datetime.combine(end, dt.time(8)) - dt.timedelta(days=7 * e), c, t))
+    ld.copy("exams", ("id", "term_id", "class_id", "subject_id", "name", "exam_type", "total_marks", "created_at"),
+            (e[:8] for e in exams))
+
+    approver = admins[0]
+
+    def results():
+        for e in exams:
+            c, teacher = e[8], e[9]
+            shift = rnd.gauss(0, 6)
+            approved = e[7] + dt.timedelta(days=10) if c[2] < args.last_year else None
+            for n in c[4]:
+                marks = min(100.0, max(0.0, ability[n] + shift + rnd.gauss(0, 9)))
+                yield (e[0], students[n][0], f"{marks:.1f}", teacher, approver if approved else None, approved, e[7], e[7])
+
+    ld.copy("exam_results", ("exam_id", "student_id", "marks", "entered_by", "approved_by", "approved_at",
+                             "created_at", "updated_at"), results())
+
+    # ---- Attendance: every school day of the most recent --attendance-years
+    statuses = [s for s, _ in ATTENDANCE_STATUSES]
+    weights = [w for _, w in ATTENDANCE_STATUSES]
+    attendance_from = args.last_year - args.attendance_years + 1
+
+    def attendance():
+        for c in classes:
+            if c[2] < attendance_from:
+                continue
+            marker = c[6][0]
+            for tid, tname, start, end in terms[c[1]]:
+                for day in _school_days(start, end):
+                    picks = rnd.choices(statuses, weights, k=len(c[4]))
+                    created = dt.datetime.combine(day, dt.time(7, 45))
+                    for n, status in zip(c[4], picks):
+                        yield (students[n][0], c[0], day, status, marker, created)
+
+    ld.copy("attendance", ("student_id", "class_id", "date", "status", "marked_by", "created_at"), attendance())
+
+    # ---- Fees: one invoice per student per term; most paid, recent ones less so
+    invoices, payments = [], []
+    for c in classes:
+        fee = FORM_FEES[c[3]]
+        for i, (tid, tname, start, end) in enumerate(terms[c[1]]):
+            current = c[2] == args.last_year and i == len(terms[c[1]]) - 1
+            for n in c[4]:
+                inv = ld.uid()
+                roll = rnd.random()
+                if current:
+                    status = "PENDING" if roll < 0.45 else "PARTIAL" if roll < 0.7 else "PAID"
+                else:
+                    status = "PAID" if roll < 0.93 else "PARTIAL" if roll < 0.98 else "OVERDUE"
+                created = dt.datetime.combine(start, dt.time(9)) - dt.timedelta(days=14)
+                invoices.append((inv, students[n][0], c[1], tid, c[8], fee, start + dt.timedelta(days=21), status,
+                                 created, created))
+                paid = fee if status == "PAID" else (fee * Decimal(rnd.choice((25, 40, 50, 60))) / 100).quantize(Decimal("0.01")) if status == "PARTIAL" else 0
+                if paid:
+                    day = start + dt.timedelta(days=rnd.randrange(0, 40))
+                    payments.append((inv, paid, day, rnd.choice(("CASH", "ECOCASH", "BANK_TRANSFER")),
+                                     f"REF{len(payments):08d}", rnd.choice(finance), dt.datetime.combine(day, dt.time(11))))
+    ld.copy("invoices", ("id", "student_id", "academic_year_id", "term_id", "form_id", "amount", "due_date", "status",
+                         "created_at", "updated_at"), invoices)
+    ld.copy("payments", ("invoice_id", "amount", "payment_date", "payment_method", "reference", "recorded_by",
+                         "created_at"), payments)
+
+    # ---- Messages between parents and teachers (both directions) plus staff notices
+    last_day = dt.datetime(args.last_year, 12, 5)
+
+    def messages():
+        for i in range(args.messages):
+            teacher = teachers[rnd.randrange(len(teachers))][1]
+            parent = parents[rnd.randrange(len(parents))][1]
+            sender, recipient = (teacher, parent) if rnd.random() < 0.6 else (parent, teacher)
+            sent = last_day - dt.timedelta(minutes=rnd.randrange(365 * 24 * 60 * min(args.years, 3)))
+            yield (sender, recipient, f"Message {i}", "Good day, please note the update regarding your child's progress.",
+                   rnd.random() < 0.8, sent)
+
+    ld.copy("messages", ("sender_id", "recipient_id", "subject", "body", "is_read", "created_at"), messages())
+
+    # ---- Learning materials and assignments for the current year
+    current_classes = [c for c in classes if c[2] == args.last_year]
+    ld.copy("learning_materials", ("id", "class_id", "subject_id", "uploaded_by", "title", "is_published", "created_at"),
+            ((ld.uid(), c[0], s, t, f"Notes week {w + 1}", True, dt.datetime(args.last_year, 1, 20) + dt.timedelta(days=7 * w))
+             for c in current_classes for s, t in zip(c[5], c[6]) for w in range(4)))
+    ld.copy("assignments", ("id", "class_id", "subject_id", "created_by", "title", "due_date", "term_id", "created_at"),
+            ((ld.uid(), c[0], s, t, f"Assignment {w + 1}", dt.datetime(args.last_year, 2, 10) + dt.timedelta(days=14 * w),
+              terms[c[1]][0][0], dt.datetime(args.last_year, 1, 27) + dt.timedelta(days=14 * w))
+             for c in current_classes for s, t in zip(c[5], c[6]) for w in range(3)))
+
+    return ld, _manifest(args, years, terms, classes, students, teachers, parents, children, finance, admins)
+
+
+def _manifest(args, years, terms, classes, students, teachers, parents, children, finance, admins):
+    rnd = random.Random(args.seed + 1)
+    ay, _ = years[-1]
+    current = [c for c in classes if c[1] == ay]
+    teacher_classes = {}
+    for c in current:
+        for t in c[6]:
+            teacher_classes.setdefault(t, set()).add(c[0])
+    teacher_email = {t[0]: i for i, t in enumerate(teachers)}
+    sample_teachers = rnd.sample(sorted(teacher_classes), min(50, len(teacher_classes)))
+    active = sorted({n for c in current for n in c[4]})
+    sample_parents = [g for g in rnd.sample(sorted(children), min(200, len(children)))
+                      if any(n in set(active) for n in children[g])][:100]
+    active_set = set(active)
+    return {
+        "password": BENCH_PASSWORD,
+        "seed": args.seed,
+        "academic_year_id": ay,
+        "term_ids": [t[0] for t in terms[ay]],
+        "current_term": {"id": terms[ay][-1][0], "start_date": str(terms[ay][-1][2]), "end_date": str(terms[ay][-1][3])},
+        "class_ids": [c[0] for c in current],
+        "teachers": [{"email": f"teacher{teacher_email[t]}@{DOMAIN}", "class_ids": sorted(teacher_classes[t])}
+                     for t in sample_teachers],
+        "parents": [{"email": f"parent{g}@{DOMAIN}", "student_ids": [students[n][0] for n in children[g] if n in active_set]}
+                    for g in sample_parents],
+        "students": [{"email": f"student{n}@{DOMAIN}", "student_id": students[n][0]}
+                     for n in rnd.sample(active, min(100, len(active)))],
+        "finance": [f"finance{i}@{DOMAIN}" for i in range(len(finance))],
+        "admins": [f"admin{i}@{DOMAIN}" for i in range(len(admins))],
+    }
+
+
+def _truncate(cur):
+    cur.execute(f"TRUNCATE {', '.join(APP_TABLES)} CASCADE")
+    cur.execute("DELETE FROM users WHERE email LIKE %s", (f"%@{DOMAIN}",))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--students", type=int, default=5000, help="students enrolled in any one year")
+    p.add_argument("--years", type=int, default=10)
+    p.add_argument("--last-year", type=int, default=2025, help="the current academic year")
+    p.add_argument("--attendance-years", type=int, default=None, help="years with daily registers (default: all)")
+    p.add_argument("--class-size", type=int, default=40)
+    p.add_argument("--subjects-per-class", type=int, default=8)
+    p.add_argument("--exams-per-term", type=int, default=1)
+    p.add_argument("--messages", type=int, default=100_000)
+    p.add_argument("--manifest", default="bench_dataset.json")
+    p.add_argument("--database-url", default=None)
+    p.add_argument("--truncate", action="store_true", help="empty school data tables and remove bench users first")
+    p.add_argument("--dry-run", action="store_true", help="generate rows without a database and print counts")
+    args = p.parse_args()
+    args.attendance_years = min(args.years, args.attendance_years or args.years)
+
+    import bcrypt
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt(rounds=12)).decode()
+    started = time.perf_counter()
+    if args.dry_run:
+        ld, manifest = generate(None, args, password_hash)
+    else:
+        import psycopg2
+        from psycopg2.extras import RealDictCursor
+        from src.config import get_settings
+
+        conn = psycopg2.connect(args.database_url or get_settings().database_url, cursor_factory=RealDictCursor)
+        try:
+            with conn, conn.cursor() as cur:
+                if args.truncate:
+                    _truncate(cur)
+                else:
+                    cur.execute("SELECT EXISTS (SELECT 1 FROM students) AS has_students")
+                    if cur.fetchone()["has_students"]:
+                        sys.exit("Database already has students; use --truncate on a dedicated benchmark database")
+                ld, manifest = generate(cur, args, password_hash)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE")
+        finally:
+            conn.close()
+    elapsed = time.perf_counter() - started
+    for table, n in ld.counts.items():
+        print(f"{table:<22} {n:>12,}")
+    total = sum(ld.counts.values())
+    print(f"{'total':<22} {total:>12,}  in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=1)
+    print(f"manifest written to {args.manifest}")
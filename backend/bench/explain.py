@@ -0,0 +1,171 @@
+"""EXPLAIN (ANALYZE) the API's hot queries and report which indexes they use.
+
+Run against a large seeded database (see the synthetic data generator) after
+``python -m src.migrate``:
+
+    python -m bench.explain                  # table of plans
+    python -m bench.explain --verbose        # full text plans
+    python -m bench.explain --fail-on-seq-scan
+
+Queries mirror the route SQL; list queries take their ORDER BY/LIMIT from
+the routes' own keysets. Sample ids (a class, a student, ...) are read from
+the database first. Everything runs in a rolled-back transaction.
+"""
+import argparse
+import json
+import sys
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from src.config import get_settings
+from src.pagination import Page
+from src.students.routes import BY_NAME as STUDENTS_BY_NAME
+from src.users.routes import NEWEST_FIRST as USERS_NEWEST
+from src.messages.routes import NEWEST_FIRST as MESSAGES_NEWEST
+from src.attendance.routes import REGISTER_ORDER
+from src.finance.routes import INVOICES_NEWEST_FIRST
+from src.finance import billing
+from src.learning.routes import MATERIALS_NEWEST_FIRST
+from src.assignments.routes import NEWEST_FIRST as ASSIGNMENTS_NEWEST
+from src.exams.routes import NEWEST_FIRST as EXAMS_NEWEST
+
+# Tables large enough that a sequential scan on a hot path is a regression
+LARGE_TABLES = {
+    "users", "students", "student_classes", "attendance", "exam_results", "exams",
+    "invoices", "payments", "messages", "learning_materials", "assignments", "user_directory",
+    "student_balances",
+}
+
+SAMPLES = """
+    SELECT
+        (SELECT email FROM users WHERE role = 'STUDENT' LIMIT 1) AS email,
+        (SELECT id FROM users WHERE role = 'STUDENT' LIMIT 1) AS user_id,
+        (SELECT class_id FROM student_classes LIMIT 1) AS class_id,
+        (SELECT student_id FROM student_classes LIMIT 1) AS student_id,
+        (SELECT term_id FROM exams LIMIT 1) AS term_id,
+        (SELECT id FROM academic_years WHERE is_current LIMIT 1) AS academic_year_id,
+        (SELECT recipient_id FROM messages LIMIT 1) AS recipient_id,
+        (SELECT id FROM invoices LIMIT 1) AS invoice_id
+"""
+
+
+def _first_page(keyset):
+    tail, params = keyset.clause(Page(50, None, None, None))
+    return tail.replace("%s", str(params[-1]))
+
+
+def queries():
+    return [
+        ("login_lower_email",
+         "SELECT id, email, password_hash, role, is_active FROM users WHERE LOWER(email) = LOWER(%(email)s)"),
+        ("users_list",
+         "SELECT id, email, role, is_active, created_at FROM users WHERE 1=1" + _first_page(USERS_NEWEST)),
+        ("students_by_class", """
+            SELECT s.id, s.first_name, s.last_name FROM students s
+            JOIN student_classes sc ON sc.student_id = s.id
+            WHERE sc.class_id = %(class_id)s""" + _first_page(STUDENTS_BY_NAME)),
+        ("students_directory",
+         "SELECT s.id, s.first_name, s.last_name FROM students s WHERE 1=1" + _first_page(STUDENTS_BY_NAME)),
+        ("student_results", """
+            SELECT er.id, er.marks, e.name FROM exam_results er
+            JOIN exams e ON e.id = er.exam_id
+            WHERE er.student_id = %(student_id)s AND e.term_id = %(term_id)s"""),
+        ("class_exams_for_term",
+         "SELECT id FROM exams WHERE class_id = %(class_id)s AND term_id = %(term_id)s"),
+        ("exams_list",
+         "SELECT e.id, e.created_at FROM exams e WHERE 1=1" + _first_page(EXAMS_NEWEST)),
+        ("attendance_register", """
+            SELECT a.id, a.date, s.last_name FROM attendance a
+            JOIN students s ON s.id = a.student_id
+            WHERE a.class_id = %(class_id)s""" + _first_page(REGISTER_ORDER)),
+        ("attendance_student_history",
+         "SELECT id, date, status FROM attendance WHERE student_id = %(student_id)s AND date >= CURRENT_DATE - 90 ORDER BY date DESC"),
+        ("finance_debtors", """
+            SELECT b.student_id, b.balance FROM student_balances b
+            WHERE b.academic_year_id = %(academic_year_id)s AND b.balance > 0
+            ORDER BY b.balance DESC"""),
+        ("billing_candidates",
+         "SELECT COUNT(*) FROM (" + billing.candidates_query(None) + ") c"),
+        ("finance_summary",
+         "SELECT SUM(invoiced), SUM(paid) FROM finance_rollups WHERE academic_year_id = %(academic_year_id)s"),
+        ("invoices_student_status",
+         "SELECT id FROM invoices WHERE student_id = %(student_id)s AND status = 'PENDING'"),
+        ("invoices_list",
+         "SELECT i.id, i.created_at FROM invoices i WHERE 1=1" + _first_page(INVOICES_NEWEST_FIRST)),
+        ("payments_for_invoice",
+         "SELECT id, amount FROM payments WHERE invoice_id = %(invoice_id)s"),
+        ("materials_by_class", """
+            SELECT lm.id, lm.created_at FROM learning_materials lm
+            WHERE lm.class_id = %(class_id)s AND lm.is_published = true""" + _first_page(MATERIALS_NEWEST_FIRST)),
+        ("assignments_by_class",
+         "SELECT a.id, a.created_at FROM assignments a WHERE a.class_id = %(class_id)s" + _first_page(ASSIGNMENTS_NEWEST)),
+        ("inbox", """
+            SELECT m.id, m.created_at FROM messages m
+            WHERE m.recipient_id = %(recipient_id)s""" + _first_page(MESSAGES_NEWEST)),
+        ("directory_search", """
+            SELECT d.user_id, d.display_name FROM user_directory d
+            WHERE d.is_active AND (d.search LIKE '%%moy%%' OR d.search %% 'moy')
+            ORDER BY d.search LIKE 'moy%%' DESC, similarity(d.search, 'moy') DESC, d.display_name LIMIT 50"""),
+        ("directory_prefix", """
+            SELECT d.user_id, d.display_name FROM user_directory d
+            WHERE d.is_active AND (d.search LIKE 'ta%%' OR LOWER(d.email) LIKE 'ta%%')
+            ORDER BY d.display_name LIMIT 50"""),
+    ]
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+def explain(cur, sql, params, analyze=True):
+    opts = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    cur.execute(f"EXPLAIN ({opts}) {sql}", params)
+    doc = cur.fetchone()["QUERY PLAN"]
+    plan = (json.loads(doc) if isinstance(doc, str) else doc)[0]
+    nodes = list(_walk(plan["Plan"]))
+    return {
+        "ms": plan.get("Execution Time"),
+        "indexes": sorted({n["Index Name"] for n in nodes if "Index Name" in n}),
+        "seq_scans": sorted({n["Relation Name"] for n in nodes
+                             if n["Node Type"] == "Seq Scan" and n.get("Relation Name") in LARGE_TABLES}),
+    }
+
+
+def main(dsn, analyze, verbose, fail_on_seq_scan):
+    conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    failures = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SAMPLES)
+            params = {k: (str(v) if v is not None else None) for k, v in cur.fetchone().items()}
+            missing = [k for k, v in params.items() if v is None]
+            if missing:
+                print(f"warning: no sample rows for {', '.join(missing)}; seed a larger dataset first")
+            print(f"{'query':<28} {'ms':>9}  {'seq scans':<22} indexes")
+            for name, sql in queries():
+                r = explain(cur, sql, params, analyze)
+                ms = f"{r['ms']:.2f}" if r["ms"] is not None else "-"
+                print(f"{name:<28} {ms:>9}  {','.join(r['seq_scans']) or '-':<22} {', '.join(r['indexes']) or '-'}")
+                failures += bool(r["seq_scans"])
+                if verbose:
+                    cur.execute(f"EXPLAIN {'(ANALYZE, BUFFERS) ' if analyze else ''}{sql}", params)
+                    print("\n".join("    " + r["QUERY PLAN"] for r in cur.fetchall()))
+    finally:
+        conn.rollback()
+        conn.close()
+    if fail_on_seq_scan and failures:
+        print(f"{failures} quer{'y' if failures == 1 else 'ies'} scanned a large table sequentially")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--database-url", default=None)
+    p.add_argument("--no-analyze", action="store_true", help="plan only; do not execute the queries")
+    p.add_argument("--verbose", action="store_true")
+    p.add_argument("--fail-on-seq-scan", action="store_true")
+    args = p.parse_args()
+    main(args.database_url or get_settings().database_url, not args.no_analyze, args.verbose, args.fail_on_seq_scan)
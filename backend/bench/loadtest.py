@@ -0,0 +1,310 @@
+"""Role-mix load test with per-endpoint latency percentiles and a regression gate.
+
+Virtual users log in as the accounts listed in the manifest written by
+``bench.datagen`` and then loop over what their role does most:
+
+    parent   results, attendance, invoices and report cards of their children
+    teacher  class rosters, marking registers (POST /attendance/bulk), class results, inbox
+    finance  debtors, fee summary, invoice lists and single invoices
+    student  own profile, results, invoices, message directory
+
+From ``backend/``, against the API in-process (no network, app start-up and
+shutdown hooks run) or a running server:
+
+    python -m bench.loadtest --users 50 --duration 60 --save-baseline baseline.json
+    python -m bench.loadtest --baseline baseline.json --threshold 15
+    python -m bench.loadtest --base-url http://localhost:8000 --mix parent=70,teacher=30
+
+For each endpoint (paths with ids collapsed to ``{id}``) it prints request
+count, errors, throughput and p50/p95/p99 latency. With ``--baseline`` the
+run exits 1 when any endpoint's p95 grows, or total throughput drops, by
+more than ``--threshold`` percent (p95 deltas under ``--min-delta-ms`` are
+treated as noise), or when an endpoint's error rate rises.
+
+Teacher users write attendance for school days of the current term, so run
+it against the benchmark database only. Requires ``httpx`` (dev dependency).
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import math
+import random
+import re
+import sys
+import time
+
+import httpx
+
+DEFAULT_MIX = "parent=50,teacher=30,finance=10,student=10"
+ROLE_ACCOUNTS = {"parent": "parents", "teacher": "teachers", "finance": "finance", "student": "students"}
+
+_ID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def endpoint_name(method, path):
+    return f"{method} {_ID.sub('{id}', path.split('?', 1)[0])}"
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.started = None
+
+    def add(self, name, ms, ok):
+        if self.started is None:
+            return  # warm-up
+        self.samples.setdefault(name, []).append(ms)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for name in sorted(self.samples):
+            values = sorted(self.samples[name])
+            endpoints[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(values) / elapsed, 2),
+                "p50": round(percentile(values, 50), 2),
+                "p95": round(percentile(values, 95), 2),
+                "p99": round(percentile(values, 99), 2),
+            }
+        every = sorted(v for values in self.samples.values() for v in values)
+        total = {
+            "count": len(every),
+            "errors": sum(self.errors.values()),
+            "rps": round(len(every) / elapsed, 2) if elapsed else 0,
+            "p50": round(percentile(every, 50) or 0, 2),
+            "p95": round(percentile(every, 95) or 0, 2),
+            "p99": round(percentile(every, 99) or 0, 2),
+        }
+        return {"seconds": round(elapsed, 2), "endpoints": endpoints, "total": total}
+
+
+class VirtualUser:
+    def __init__(self, client, recorder, role, account, manifest, rnd):
+        self.client = client
+        self.recorder = recorder
+        self.role = role
+        self.account = account
+        self.manifest = manifest
+        self.rnd = rnd
+        self.headers = {}
+        self.rosters = {}
+        self.invoice_ids = []
+
+    async def login(self):
+        email = self.account if isinstance(self.account, str) else self.account["email"]
+        r = await self.client.post("/api/auth/login", json={"email": email, "password": self.manifest["password"]})
+        r.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    async def request(self, method, path, body=None):
+        started = time.perf_counter()
+        try:
+            r = await self.client.request(method, path, headers=self.headers, json=body)
+            ok = r.status_code < 400
+        except httpx.HTTPError:
+            r, ok = None, False
+        self.recorder.add(endpoint_name(method, path), (time.perf_counter() - started) * 1000, ok)
+        return r if ok else None
+
+    def _term(self):
+        return self.rnd.choice(self.manifest["term_ids"])
+
+    async def parent(self):
+        student = self.rnd.choice(self.account["student_ids"])
+        action = self.rnd.choices(("results", "attendance", "invoices", "report", "me"), (35, 25, 20, 10, 10))[0]
+        if action == "results":
+            await self.request("GET", f"/api/results/student/{student}?term_id={self._term()}")
+        elif action == "attendance":
+            await self.request("GET", f"/api/attendance/student/{student}")
+        elif action == "invoices":
+            await self.request("GET", f"/api/finance/invoices?student_id={student}")
+        elif action == "report":
+            await self.request("GET", f"/api/report-cards/student/{student}?term_id={self._term()}")
+        else:
+            await self.request("GET", "/api/parents/me")
+
+    async def teacher(self):
+        class_id = self.rnd.choice(self.account["class_ids"])
+        action = self.rnd.choices(("register", "roster", "results", "attendance", "inbox"), (30, 20, 20, 15, 15))[0]
+        if action == "register":
+            roster = self.rosters.get(class_id)
+            if roster is None:
+                r = await self.request("GET", f"/api/students?class_id={class_id}&limit=200")
+                roster = self.rosters[class_id] = [s["id"] for s in r.json()] if r else []
+            statuses = self.rnd.choices(("PRESENT", "ABSENT", "LATE"), (92, 5, 3), k=len(roster))
+            await self.request("POST", f"/api/attendance/bulk?class_id={class_id}", {
+                "date": str(self._school_day()),
+                "entries": [{"student_id": s, "status": st} for s, st in zip(roster, statuses)],
+            })
+        elif action == "roster":
+            await self.request("GET", f"/api/students?class_id={class_id}")
+        elif action == "results":
+            await self.request("GET", f"/api/results/class/{class_id}?term_id={self._term()}")
+        elif action == "attendance":
+            await self.request("GET", f"/api/attendance?class_id={class_id}")
+        else:
+            await self.request("GET", "/api/messages")
+
+    def _school_day(self):
+        term = self.manifest["current_term"]
+        start, end = dt.date.fromisoformat(term["start_date"]), dt.date.fromisoformat(term["end_date"])
+        day = start + dt.timedelta(days=self.rnd.randrange((end - start).days + 1))
+        return day - dt.timedelta(days=max(0, day.weekday() - 4))  # weekends -> Friday
+
+    async def finance(self):
+        action = self.rnd.choices(("debtors", "summary", "pending", "invoice"), (30, 20, 30, 20))[0]
+        if action == "debtors":
+            await self.request("GET", "/api/finance/debtors")
+        elif action == "summary":
+            await self.request("GET", "/api/finance/summary")
+        elif action == "pending" or not self.invoice_ids:
+            r = await self.request("GET", f"/api/finance/invoices?status={self.rnd.choice(('PENDING', 'PARTIAL'))}")
+            if r:
+                self.invoice_ids = [i["id"] for i in r.json()] or self.invoice_ids
+        else:
+            await self.request("GET", f"/api/finance/invoices/{self.rnd.choice(self.invoice_ids)}")
+
+    async def student(self):
+        action = self.rnd.choices(("me", "results", "invoices", "directory"), (25, 40, 20, 15))[0]
+        if action == "me":
+            await self.request("GET", "/api/students/me")
+        elif action == "results":
+            await self.request("GET", f"/api/results/student/{self.account['student_id']}?term_id={self._term()}")
+        elif action == "invoices":
+            await self.request("GET", "/api/finance/invoices")
+        else:
+            await self.request("GET", f"/api/messages/users?q={self.rnd.choice('aeimnrt')}")
+
+    async def run(self, deadline, think_ms):
+        step = getattr(self, self.role)
+        while time.perf_counter() < deadline:
+            await step()
+            if think_ms:
+                await asyncio.sleep(self.rnd.expovariate(1000 / think_ms))
+
+
+def _parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        role, _, weight = part.partition("=")
+        if role not in ROLE_ACCOUNTS:
+            raise SystemExit(f"Unknown role {role!r} in --mix; expected {', '.join(ROLE_ACCOUNTS)}")
+        mix[role] = float(weight or 1)
+    return mix
+
+
+async def run(args, manifest):
+    rnd = random.Random(args.seed)
+    mix = _parse_mix(args.mix)
+    roles = list(mix)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users + 10, max_keepalive_connections=args.users)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60)
+        lifespan = None
+    else:
+        from src.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        lifespan = app.router.lifespan_context(app)
+    try:
+        if lifespan:
+            await lifespan.__aenter__()
+        users = []
+        for _ in range(args.users):
+            role = rnd.choices(roles, [mix[r] for r in roles])[0]
+            accounts = manifest[ROLE_ACCOUNTS[role]]
+            users.append(VirtualUser(client, recorder, role, rnd.choice(accounts), manifest, random.Random(rnd.random())))
+        # bcrypt logins happen before the clock starts
+        sem = asyncio.Semaphore(8)
+
+        async def login(u):
+            async with sem:
+                await u.login()
+
+        await asyncio.gather(*(login(u) for u in users))
+        print(f"{len(users)} users logged in: " + ", ".join(f"{r}={sum(u.role == r for u in users)}" for r in roles))
+
+        start = time.perf_counter()
+        deadline = start + args.warmup + args.duration
+
+        async def measure():
+            await asyncio.sleep(args.warmup)
+            recorder.started = time.perf_counter()
+
+        await asyncio.gather(measure(), *(u.run(deadline, args.think_ms) for u in users))
+        return recorder.summary(time.perf_counter() - recorder.started)
+    finally:
+        await client.aclose()
+        if lifespan:
+            await lifespan.__aexit__(None, None, None)
+
+
+def report(summary):
+    print(f"{'endpoint':<48} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(summary["endpoints"].items()) + [("TOTAL", summary["total"])]
+    for name, s in rows:
+        print(f"{name:<48} {s['count']:>7} {s['errors']:>5} {s['rps']:>8} {s['p50']:>8} {s['p95']:>8} {s['p99']:>8}")
+
+
+def compare(summary, baseline, threshold, min_delta_ms):
+    """Regression messages for ``summary`` against ``baseline`` (both from ``Recorder.summary``)."""
+    problems = []
+    limit = 1 + threshold / 100
+    for name, s in summary["endpoints"].items():
+        b = baseline["endpoints"].get(name)
+        if not b:
+            continue
+        if s["p95"] > b["p95"] * limit and s["p95"] - b["p95"] > min_delta_ms:
+            problems.append(f"{name}: p95 {b['p95']} -> {s['p95']} ms (+{(s['p95'] / b['p95'] - 1) * 100:.0f}%)")
+        if s["errors"] / s["count"] > b["errors"] / b["count"] + 0.01:
+            problems.append(f"{name}: errors {b['errors']}/{b['count']} -> {s['errors']}/{s['count']}")
+    t, bt = summary["total"], baseline["total"]
+    if bt["rps"] and t["rps"] < bt["rps"] / limit:
+        problems.append(f"throughput {bt['rps']} -> {t['rps']} req/s ({(t['rps'] / bt['rps'] - 1) * 100:.0f}%)")
+    return problems
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--manifest", default="bench_dataset.json", help="written by bench.datagen")
+    p.add_argument("--base-url", default=None, help="drive a running server instead of the app in-process")
+    p.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    p.add_argument("--duration", type=float, default=60, help="measured seconds")
+    p.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the measured window")
+    p.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's requests")
+    p.add_argument("--mix", default=DEFAULT_MIX, help="role weights, e.g. parent=50,teacher=30")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--save-baseline", default=None, help="write this run's results JSON here")
+    p.add_argument("--baseline", default=None, help="compare against a previous --save-baseline")
+    p.add_argument("--threshold", type=float, default=10, help="allowed p95/throughput regression, percent")
+    p.add_argument("--min-delta-ms", type=float, default=5, help="ignore p95 growth smaller than this")
+    args = p.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    summary = asyncio.run(run(args, manifest))
+    summary.update(mode=args.base_url or "in-process", users=args.users, mix=args.mix)
+    report(summary)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(summary, json.load(f), args.threshold, args.min_delta_ms)
+        for line in problems:
+            print("REGRESSION " + line)
+        if problems:
+            sys.exit(1)
+        print(f"No regression beyond {args.threshold:g}% against {args.baseline}")
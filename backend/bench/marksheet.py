@@ -0,0 +1,101 @@
+"""Mark-sheet import throughput with large sheets (default 10,000 rows).
+
+Offline (no server needed) it times parsing and validation of a synthetic
+class roster for CSV and, if openpyxl is installed, XLSX:
+
+    python -m bench.marksheet --rows 10000
+
+End to end, upload the generated sheet to a running API. The exam's class
+must contain students whose student_number matches the sheet, e.g. data
+from the synthetic generator:
+
+    python -m bench.marksheet --rows 10000 --base-url http://localhost:8000 \\
+        --exam-id <uuid> --token <jwt> --numbers-from roster.txt
+"""
+import argparse
+import csv
+import io
+import random
+import time
+import uuid
+
+from src.exams import marks
+
+
+def _roster(n, numbers=None):
+    numbers = numbers or [f"S{100000 + i}" for i in range(n)]
+    return {num: str(uuid.uuid4()) for num in numbers[:n]}
+
+
+def _csv_bytes(numbers, total):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["student_number", "marks"])
+    rnd = random.Random(42)
+    for num in numbers:
+        w.writerow([num, round(rnd.uniform(0, total), 1)])
+    return buf.getvalue().encode()
+
+
+def _xlsx_bytes(numbers, total):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["student_number", "marks"])
+    rnd = random.Random(42)
+    for num in numbers:
+        ws.append([num, round(rnd.uniform(0, total), 1)])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _time_offline(label, data, reader, roster, total):
+    start = time.perf_counter()
+    rows = reader(io.BytesIO(data))
+    accepted, errors = marks.validate_rows(rows, roster, total)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<5} rows={len(accepted) + len(errors):<7} accepted={len(accepted):<7} errors={len(errors):<4} "
+          f"{elapsed * 1000:8.1f} ms  {(len(accepted) + len(errors)) / elapsed:10.0f} rows/s")
+
+
+def _time_http(args, data, filename):
+    import httpx
+    start = time.perf_counter()
+    r = httpx.post(f"{args.base_url}/api/exams/{args.exam_id}/results/import",
+                   headers={"Authorization": f"Bearer {args.token}"},
+                   files={"file": (filename, data)}, timeout=300)
+    elapsed = time.perf_counter() - start
+    body = r.json()
+    print(f"HTTP {filename}: status={r.status_code} summary={body.get('summary')} {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, default=10000)
+    p.add_argument("--total-marks", type=float, default=100)
+    p.add_argument("--numbers-from", default=None, help="file with one student_number per line")
+    p.add_argument("--base-url", default=None)
+    p.add_argument("--exam-id", default=None)
+    p.add_argument("--token", default=None)
+    args = p.parse_args()
+
+    numbers = None
+    if args.numbers_from:
+        with open(args.numbers_from) as f:
+            numbers = [line.strip() for line in f if line.strip()]
+    roster = _roster(args.rows, numbers)
+    sheet_numbers = list(roster)
+    csv_data = _csv_bytes(sheet_numbers, args.total_marks)
+    _time_offline("csv", csv_data, marks.read_csv, roster, args.total_marks)
+    xlsx_data = None
+    try:
+        xlsx_data = _xlsx_bytes(sheet_numbers, args.total_marks)
+        _time_offline("xlsx", xlsx_data, marks.read_xlsx, roster, args.total_marks)
+    except ImportError:
+        print("xlsx  skipped (openpyxl not installed)")
+
+    if args.base_url and args.exam_id and args.token:
+        _time_http(args, csv_data, "marks.csv")
+        if xlsx_data:
+            _time_http(args, xlsx_data, "marks.xlsx")
@@ -0,0 +1,81 @@
+"""End-of-term report-card rendering throughput (default 1,200 cards).
+
+Offline (no database) it renders synthetic classes of 40 students with 10
+subjects through the same process pool the API uses:
+
+    python -m bench.report_cards --cards 1200 --workers 4
+
+Against a running API, pre-render a real term (admin token):
+
+    python -m bench.report_cards --base-url http://localhost:8000 --term-id <uuid> --token <jwt>
+"""
+import argparse
+import random
+import tempfile
+import time
+import uuid
+
+from src.reportcards import engine, pdf
+
+SUBJECTS = ["Mathematics", "English Language", "Shona", "Combined Science", "Geography",
+            "History", "Accounts", "Computer Science", "Agriculture", "Physics"]
+
+
+def _report(n_students, class_no, rnd):
+    students = []
+    for i in range(n_students):
+        subjects = []
+        for name in SUBJECTS:
+            score = round(rnd.uniform(20, 98), 1)
+            grade, remark = engine.grade_for(score)
+            subjects.append({"subject_id": str(uuid.uuid4()), "subject_name": name, "score": score,
+                             "grade": grade, "remark": remark, "position": rnd.randint(1, n_students),
+                             "candidates": n_students, "class_average": 55.0})
+        average = round(sum(s["score"] for s in subjects) / len(subjects), 1)
+        students.append({"student_id": str(uuid.uuid4()), "student_number": f"S{class_no:02d}{i:04d}",
+                         "first_name": f"Student{i}", "last_name": f"Class{class_no}",
+                         "total": average * len(subjects), "average": average,
+                         "grade": engine.grade_for(average)[0], "position": i + 1,
+                         "subjects_taken": len(subjects), "subjects": subjects})
+    return {"class_id": str(uuid.uuid4()), "class_name": f"Form 4 Class {class_no}", "form_name": "Form 4",
+            "term_id": str(uuid.uuid4()), "term_name": "Term 3", "academic_year_name": "2025",
+            "candidates": n_students, "weights": engine.EXAM_TYPE_WEIGHTS, "students": students}
+
+
+def offline(cards, class_size, workers):
+    rnd = random.Random(42)
+    school = {"name": "Benchmark High School", "address": "Harare"}
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = []
+        for c in range(0, cards, class_size):
+            jobs.append((_report(min(class_size, cards - c), c // class_size, rnd), f"{tmp}/{c // class_size}"))
+        start = time.perf_counter()
+        rendered = pdf.render_reports(school, jobs, workers)
+        elapsed = time.perf_counter() - start
+        pdf.shutdown()
+    print(f"rendered={rendered} classes={len(jobs)} workers={workers or 'cpu'} "
+          f"{elapsed:8.1f} s  {rendered / elapsed:8.1f} cards/s")
+
+
+def online(base_url, term_id, token):
+    import httpx
+    start = time.perf_counter()
+    r = httpx.post(f"{base_url.rstrip('/')}/api/report-cards/render", params={"term_id": term_id, "force": True},
+                   headers={"Authorization": f"Bearer {token}"}, timeout=None)
+    r.raise_for_status()
+    print(r.json(), f"wall={time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--cards", type=int, default=1200)
+    p.add_argument("--class-size", type=int, default=40)
+    p.add_argument("--workers", type=int, default=0, help="0 = one per CPU")
+    p.add_argument("--base-url")
+    p.add_argument("--term-id")
+    p.add_argument("--token")
+    args = p.parse_args()
+    if args.base_url:
+        online(args.base_url, args.term_id, args.token)
+    else:
+        offline(args.cards, args.class_size, args.workers)
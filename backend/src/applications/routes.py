@@ -4,9 +4,16 @@ from pydantic import BaseModel, EmailStr
 
 from ..db import get_cursor, fetch_one, fetch_all
 from ..auth import get_current_user_optional, require_roles
+from ..pagination import Keyset, Page, SortKey, page_params, paginate
 
 router = APIRouter(prefix="/applications", tags=["applications"])
 
+NEWEST_FIRST = Keyset(
+    "applications",
+    SortKey("a.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("a.id", "uuid", "id", desc=True),
+)
+
 
 class ApplicationCreate(BaseModel):
     first_name: str
@@ -60,8 +67,7 @@ def add_document(
 @router.get("")
 def list_applications(
     status: Optional[str] = Query(None),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    page: Page = Depends(page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF"])),
 ):
     with get_cursor() as cur:
@@ -77,10 +83,9 @@ def list_applications(
         if status:
             q += " AND a.status = %s"
             params.append(status)
-        q += " ORDER BY a.created_at DESC LIMIT %s OFFSET %s"
-        params.extend([limit, skip])
-        cur.execute(q, params)
-        rows = cur.fetchall()
+        tail, tail_params = NEWEST_FIRST.clause(page)
+        cur.execute(q + tail, params + tail_params)
+        rows = paginate(page, NEWEST_FIRST, cur.fetchall())
         return [dict(r, id=str(r["id"])) for r in rows]
 
 
@@ -4,10 +4,24 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 
 from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles
+from ..auth import require_roles, ensure_student_access, require_teacher_id
+from ..pagination import Keyset, Page, SortKey, optional_page_params, paginate
 
 router = APIRouter(prefix="/assignments", tags=["assignments"])
 
+NEWEST_FIRST = Keyset(
+    "assignments",
+    SortKey("a.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("a.id", "uuid", "id", desc=True),
+)
+
+# Undated assignments sort last, as with DESC NULLS LAST
+BY_DUE_DATE = Keyset(
+    "assignments_due",
+    SortKey("COALESCE(a.due_date, '-infinity'::timestamptz)", "timestamptz", "due_date", desc=True, null="-infinity"),
+    SortKey("a.id", "uuid", "id", desc=True),
+)
+
 
 class CreateAssignmentBody(BaseModel):
     class_id: str
@@ -29,12 +43,14 @@ def list_assignments(
     class_id: Optional[str] = Query(None),
     subject_id: Optional[str] = Query(None),
     student_id: Optional[str] = Query(None),
+    page: Page = Depends(optional_page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT"])),
 ):
+    keyset = BY_DUE_DATE if student_id else NEWEST_FIRST
+    tail, tail_params = keyset.clause(page)
     with get_cursor() as cur:
         if student_id:
-            if current["role"] == "STUDENT" and current.get("student_id") != student_id:
-                raise HTTPException(status_code=403)
+            ensure_student_access(current, student_id)
             cur.execute("""
                 SELECT a.id, a.class_id, a.subject_id, a.title, a.description, a.due_date, a.total_marks, a.created_at,
                        sub.name AS subject_name, c.name AS class_name,
@@ -44,8 +60,8 @@ def list_assignments(
                 JOIN classes c ON c.id = a.class_id
                 JOIN student_classes sc ON sc.class_id = a.class_id AND sc.student_id = %s
                 LEFT JOIN assignment_submissions asub ON asub.assignment_id = a.id AND asub.student_id = %s
-                ORDER BY a.due_date DESC NULLS LAST
-            """, (student_id, student_id))
+                WHERE 1=1
+            """ + tail, [student_id, student_id, *tail_params])
         elif class_id:
             cur.execute("""
                 SELECT a.id, a.class_id, a.subject_id, a.title, a.due_date, a.total_marks, a.created_at,
@@ -53,8 +69,7 @@ def list_assignments(
                 FROM assignments a
                 JOIN subjects sub ON sub.id = a.subject_id
                 WHERE a.class_id = %s
-                ORDER BY a.created_at DESC
-            """, (class_id,))
+            """ + tail, [class_id, *tail_params])
         else:
             cur.execute("""
                 SELECT a.id, a.class_id, a.subject_id, a.title, a.due_date, a.total_marks, a.created_at,
@@ -62,9 +77,9 @@ def list_assignments(
                 FROM assignments a
                 JOIN subjects sub ON sub.id = a.subject_id
                 JOIN classes c ON c.id = a.class_id
-                ORDER BY a.created_at DESC
-            """)
-        rows = cur.fetchall()
+                WHERE 1=1
+            """ + tail, tail_params)
+        rows = paginate(page, keyset, cur.fetchall())
         return [_row_to_dict(r) for r in rows]
 
 
@@ -79,13 +94,10 @@ def _row_to_dict(r):
 @router.post("")
 def create_assignment(
     body: CreateAssignmentBody,
-    current=Depends(require_roles(["TEACHER", "ADMIN_STAFF", "SUPER_ADMIN"])),
+    current=Depends(require_roles(["TEACHER"])),
 ):
-    teacher_id = current.get("teacher_id")
-    if current["role"] == "TEACHER" and not teacher_id:
-        raise HTTPException(status_code=403, detail="Teacher profile not found")
+    tid = require_teacher_id(current)
     with get_cursor() as cur:
-        tid = teacher_id or fetch_one(cur, "SELECT id FROM teachers LIMIT 1")["id"]
         cur.execute("""
             INSERT INTO assignments (class_id, subject_id, created_by, title, description, due_date, total_marks, term_id)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
@@ -154,11 +166,10 @@ def grade_submission(
     assignment_id: str,
     submission_id: str,
     body: GradeSubmissionBody,
-    current=Depends(require_roles(["TEACHER", "ADMIN_STAFF", "SUPER_ADMIN"])),
+    current=Depends(require_roles(["TEACHER"])),
 ):
-    teacher_id = current.get("teacher_id")
+    tid = require_teacher_id(current)
     with get_cursor() as cur:
-        tid = teacher_id or fetch_one(cur, "SELECT id FROM teachers LIMIT 1")["id"]
         cur.execute("""
             UPDATE assignment_submissions SET marks = %s, feedback = %s, graded_by = %s, graded_at = NOW()
             WHERE id = %s AND assignment_id = %s
@@ -0,0 +1,62 @@
+"""Scheduled attendance jobs (see ``src/scheduler.py``)."""
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_one
+from .. import scheduler
+
+settings = get_settings()
+
+CURRENT_TERM_SQL = """
+    SELECT t.id, t.academic_year_id, t.start_date, t.end_date
+    FROM terms t
+    JOIN academic_years ay ON ay.id = t.academic_year_id AND ay.is_current
+    WHERE CURRENT_DATE BETWEEN t.start_date AND t.end_date
+    ORDER BY t.start_date DESC
+    LIMIT 1
+"""
+
+
+@scheduler.job("attendance.chronic_absence", "0 18 * * 1-5")
+async def chronic_absence():
+    """Raise an alert per student absent for ``absence_alert_rate`` of this term's recorded days.
+
+    Students below ``absence_alert_min_days`` recorded days are not judged
+    yet; alerts whose student has since recovered are resolved.
+    """
+    async with get_async_cursor() as cur:
+        term = await fetch_one(cur, CURRENT_TERM_SQL)
+        if not term:
+            return {"term_id": None}
+        row = await fetch_one(cur, """
+            WITH stats AS (
+                SELECT a.student_id,
+                       COUNT(DISTINCT a.date) AS days_recorded,
+                       COUNT(DISTINCT a.date) FILTER (WHERE a.status = 'ABSENT') AS days_absent
+                FROM attendance a
+                JOIN classes c ON c.id = a.class_id AND c.academic_year_id = %(academic_year_id)s
+                WHERE a.date BETWEEN %(start_date)s AND LEAST(%(end_date)s, CURRENT_DATE)
+                GROUP BY a.student_id
+            ), flagged AS (
+                SELECT * FROM stats
+                WHERE days_recorded >= %(min_days)s AND days_absent >= %(rate)s * days_recorded
+            ), upserted AS (
+                INSERT INTO attendance_alerts AS al (student_id, term_id, days_recorded, days_absent)
+                SELECT student_id, %(term_id)s, days_recorded, days_absent FROM flagged
+                ON CONFLICT (student_id, term_id) DO UPDATE SET
+                    days_recorded = EXCLUDED.days_recorded,
+                    days_absent = EXCLUDED.days_absent,
+                    resolved_at = NULL,
+                    updated_at = NOW()
+                RETURNING (xmax = 0) AS inserted
+            ), resolved AS (
+                UPDATE attendance_alerts al SET resolved_at = NOW(), updated_at = NOW()
+                WHERE al.term_id = %(term_id)s AND al.resolved_at IS NULL
+                  AND NOT EXISTS (SELECT 1 FROM flagged f WHERE f.student_id = al.student_id)
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM upserted) AS flagged,
+                   (SELECT COUNT(*) FROM upserted WHERE inserted) AS new,
+                   (SELECT COUNT(*) FROM resolved) AS resolved
+        """, dict(term_id=term["id"], academic_year_id=term["academic_year_id"], start_date=term["start_date"],
+                  end_date=term["end_date"], min_days=settings.absence_alert_min_days,
+                  rate=settings.absence_alert_rate))
+    return dict(row, term_id=str(term["id"]))
@@ -1,13 +1,27 @@
 from typing import Optional
 from datetime import date
+from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 
-from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles
+from ..db_async import get_async_cursor, fetch_one, fetch_all
+from ..auth import require_roles, ensure_student_access
+from ..exports import FORMATS, export_response
+from ..pagination import Keyset, Page, SortKey, optional_page_params, paginate
+from .jobs import CURRENT_TERM_SQL
 
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
+VALID_STATUSES = ("PRESENT", "ABSENT", "LATE", "EXCUSED")
+MAX_BULK_ENTRIES = 5000
+
+REGISTER_ORDER = Keyset(
+    "attendance",
+    SortKey("a.date", "date", "date", desc=True),
+    SortKey("s.last_name", "text", "last_name"),
+    SortKey("a.id", "uuid", "id"),
+)
+
 
 class MarkAttendanceBody(BaseModel):
     student_id: str
@@ -18,53 +32,52 @@ class MarkAttendanceBody(BaseModel):
 
 class BulkAttendanceBody(BaseModel):
     date: date
-    entries: list[dict]  # [{"student_id": "...", "status": "PRESENT"}, ...]
+    entries: list[dict]  # [{"student_id": "...", "status": "PRESENT", "class_id": optional, "notes": optional}, ...]
 
 
 @router.get("")
-def list_attendance(
+async def list_attendance(
     class_id: str = Query(...),
     from_date: Optional[date] = Query(None),
     to_date: Optional[date] = Query(None),
+    format: str = Query("json", regex=FORMATS),
+    page: Page = Depends(optional_page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
 ):
-    with get_cursor() as cur:
-        q = """
-            SELECT a.id, a.student_id, a.class_id, a.date, a.status, a.notes, a.created_at,
-                   s.first_name, s.last_name
-            FROM attendance a
-            JOIN students s ON s.id = a.student_id
-            WHERE a.class_id = %s
-        """
-        params = [class_id]
-        if from_date:
-            q += " AND a.date >= %s"
-            params.append(from_date)
-        if to_date:
-            q += " AND a.date <= %s"
-            params.append(to_date)
-        q += " ORDER BY a.date DESC, s.last_name"
-        cur.execute(q, params)
-        rows = cur.fetchall()
+    q = """
+        SELECT a.id, a.student_id, a.class_id, a.date, a.status, a.notes, a.created_at,
+               s.first_name, s.last_name
+        FROM attendance a
+        JOIN students s ON s.id = a.student_id
+        WHERE a.class_id = %s
+    """
+    params = [class_id]
+    if from_date:
+        q += " AND a.date >= %s"
+        params.append(from_date)
+    if to_date:
+        q += " AND a.date <= %s"
+        params.append(to_date)
+    if format != "json":
+        # Exports ignore paging and stream the whole register
+        return export_response(format, f"{q} ORDER BY {REGISTER_ORDER.order_by()}", params,
+                               ["date", "last_name", "first_name", "status", "notes", "student_id"], "attendance")
+    async with get_async_cursor() as cur:
+        tail, tail_params = REGISTER_ORDER.clause(page)
+        await cur.execute(q + tail, params + tail_params)
+        rows = paginate(page, REGISTER_ORDER, await cur.fetchall())
         return [dict(r, id=str(r["id"]), student_id=str(r["student_id"]), class_id=str(r["class_id"])) for r in rows]
 
 
 @router.get("/student/{student_id}")
-def get_student_attendance(
+async def get_student_attendance(
     student_id: str,
     from_date: Optional[date] = Query(None),
     to_date: Optional[date] = Query(None),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
 ):
-    if current["role"] == "STUDENT" and current.get("student_id") != student_id:
-        raise HTTPException(status_code=403, detail="Not allowed")
-    if current["role"] == "PARENT":
-        with get_cursor() as cur:
-            cur.execute("SELECT 1 FROM parent_student_links WHERE parent_id = (SELECT id FROM parents WHERE user_id = %s) AND student_id = %s",
-                        (current["id"], student_id))
-            if not cur.fetchone():
-                raise HTTPException(status_code=403)
-    with get_cursor() as cur:
+    ensure_student_access(current, student_id)
+    async with get_async_cursor() as cur:
         q = "SELECT id, student_id, class_id, date, status, notes FROM attendance WHERE student_id = %s"
         params = [student_id]
         if from_date:
@@ -74,48 +87,141 @@ def get_student_attendance(
             q += " AND date <= %s"
             params.append(to_date)
         q += " ORDER BY date DESC"
-        cur.execute(q, params)
-        rows = cur.fetchall()
+        await cur.execute(q, params)
+        rows = await cur.fetchall()
         return [dict(r, id=str(r["id"]), student_id=str(r["student_id"]), class_id=str(r["class_id"])) for r in rows]
 
 
+@router.get("/alerts")
+async def list_absence_alerts(
+    term_id: Optional[str] = Query(None),
+    class_id: Optional[str] = Query(None),
+    include_resolved: bool = Query(False),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
+):
+    """Chronic-absence alerts raised by the ``attendance.chronic_absence`` job, worst first."""
+    async with get_async_cursor(commit=False) as cur:
+        if not term_id:
+            term = await fetch_one(cur, CURRENT_TERM_SQL)
+            if not term:
+                return []
+            term_id = term["id"]
+        q = """
+            SELECT al.id, al.student_id, al.term_id, al.days_recorded, al.days_absent, al.absence_rate,
+                   al.created_at, al.updated_at, al.resolved_at,
+                   s.first_name, s.last_name, s.student_number, c.id AS class_id, c.name AS class_name
+            FROM attendance_alerts al
+            JOIN terms t ON t.id = al.term_id
+            JOIN students s ON s.id = al.student_id
+            LEFT JOIN student_classes sc ON sc.student_id = al.student_id AND sc.academic_year_id = t.academic_year_id
+            LEFT JOIN classes c ON c.id = sc.class_id
+            WHERE al.term_id = %s
+        """
+        params = [term_id]
+        if not include_resolved:
+            q += " AND al.resolved_at IS NULL"
+        if class_id:
+            q += " AND sc.class_id = %s"
+            params.append(class_id)
+        q += " ORDER BY al.absence_rate DESC, s.last_name"
+        rows = await fetch_all(cur, q, params)
+    return [dict(r, id=str(r["id"]), student_id=str(r["student_id"]), term_id=str(r["term_id"]),
+                 class_id=str(r["class_id"]) if r["class_id"] else None) for r in rows]
+
+
 @router.post("")
-def mark_attendance(
+async def mark_attendance(
     body: MarkAttendanceBody,
     class_id: str = Query(...),
     current=Depends(require_roles(["TEACHER", "ADMIN_STAFF", "SUPER_ADMIN"])),
 ):
-    if body.status not in ("PRESENT", "ABSENT", "LATE", "EXCUSED"):
+    if body.status not in VALID_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid status")
-    teacher_id = current.get("teacher_id") if current.get("role") == "TEACHER" else None
-    with get_cursor() as cur:
-        cur.execute("""
+    async with get_async_cursor() as cur:
+        await cur.execute("""
             INSERT INTO attendance (student_id, class_id, date, status, notes, marked_by)
-            VALUES (%s, %s, %s, %s, %s, (SELECT id FROM teachers WHERE user_id = %s LIMIT 1))
-            ON CONFLICT (student_id, class_id, date) DO UPDATE SET status = EXCLUDED.status, notes = EXCLUDED.notes
-        """, (body.student_id, class_id, body.date, body.status, body.notes or "", current["id"]))
-        if teacher_id:
-            cur.execute("UPDATE attendance SET marked_by = %s WHERE student_id = %s AND class_id = %s AND date = %s",
-                        (teacher_id, body.student_id, class_id, body.date))
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (student_id, class_id, date) DO UPDATE SET status = EXCLUDED.status, notes = EXCLUDED.notes,
+                marked_by = COALESCE(EXCLUDED.marked_by, attendance.marked_by)
+        """, (body.student_id, class_id, body.date, body.status, body.notes or "", current.get("teacher_id")))
     return {"ok": True}
 
 
 @router.post("/bulk")
-def bulk_mark(
+async def bulk_mark(
     body: BulkAttendanceBody,
-    class_id: str = Query(...),
+    class_id: Optional[str] = Query(None),
     current=Depends(require_roles(["TEACHER", "ADMIN_STAFF", "SUPER_ADMIN"])),
 ):
-    teacher_id = current.get("teacher_id") if current.get("role") == "TEACHER" else None
-    with get_cursor() as cur:
-        for e in body.entries:
-            sid = e.get("student_id")
-            status = e.get("status", "PRESENT")
-            if status not in ("PRESENT", "ABSENT", "LATE", "EXCUSED") or not sid:
-                continue
-            cur.execute("""
-                INSERT INTO attendance (student_id, class_id, date, status, marked_by)
-                VALUES (%s, %s, %s, %s, (SELECT id FROM teachers WHERE user_id = %s LIMIT 1))
-                ON CONFLICT (student_id, class_id, date) DO UPDATE SET status = EXCLUDED.status
-            """, (sid, class_id, body.date, status, current["id"]))
-    return {"ok": True}
+    """Upsert a whole register (or several classes' registers) in one statement.
+
+    Each entry may carry its own ``class_id``; otherwise the query parameter
+    applies. Every entry gets an outcome: inserted, updated, or rejected with
+    a reason (bad input, duplicate, or student not enrolled in that class).
+    """
+    if len(body.entries) > MAX_BULK_ENTRIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ENTRIES} entries per request")
+    results, valid = _validate_entries(body.entries, class_id)
+    if valid:
+        idx, sids, cids, statuses, notes = (list(col) for col in zip(*valid))
+        async with get_async_cursor() as cur:
+            await cur.execute("""
+                WITH input AS (
+                    SELECT * FROM unnest(%s::int[], %s::uuid[], %s::uuid[], %s::text[], %s::text[])
+                        AS t(idx, student_id, class_id, status, notes)
+                ), enrolled AS (
+                    SELECT i.* FROM input i
+                    JOIN student_classes sc ON sc.student_id = i.student_id AND sc.class_id = i.class_id
+                ), upserted AS (
+                    INSERT INTO attendance (student_id, class_id, date, status, notes, marked_by)
+                    SELECT student_id, class_id, %s::date, status, notes, %s::uuid FROM enrolled
+                    ON CONFLICT (student_id, class_id, date) DO UPDATE
+                        SET status = EXCLUDED.status,
+                            notes = COALESCE(EXCLUDED.notes, attendance.notes),
+                            marked_by = COALESCE(EXCLUDED.marked_by, attendance.marked_by)
+                    RETURNING student_id, class_id, (xmax = 0) AS inserted
+                )
+                SELECT i.idx, u.inserted
+                FROM input i
+                LEFT JOIN upserted u ON u.student_id = i.student_id AND u.class_id = i.class_id
+            """, (idx, sids, cids, statuses, notes, body.date, current.get("teacher_id")))
+            for r in await cur.fetchall():
+                out = results[r["idx"]]
+                if r["inserted"] is None:
+                    out.update(result="rejected", error="Student is not enrolled in this class")
+                else:
+                    out["result"] = "inserted" if r["inserted"] else "updated"
+    summary = {"inserted": 0, "updated": 0, "rejected": 0}
+    for r in results:
+        summary[r["result"]] += 1
+    return {"ok": summary["rejected"] == 0, "date": body.date, "summary": summary, "results": results}
+
+
+def _validate_entries(entries, default_class_id):
+    """Check every entry before touching the database.
+
+    Returns per-entry outcome dicts (in request order) and the accepted rows
+    as ``(index, student_id, class_id, status, notes)`` tuples.
+    """
+    results, valid, seen = [], [], set()
+    for i, e in enumerate(entries):
+        sid = e.get("student_id")
+        cid = e.get("class_id") or default_class_id
+        status = e.get("status", "PRESENT")
+        out = {"index": i, "student_id": sid, "class_id": cid, "result": "rejected"}
+        results.append(out)
+        try:
+            sid_u, cid_u = UUID(str(sid)), UUID(str(cid))
+        except ValueError:
+            out["error"] = "student_id and class_id must be valid ids"
+            continue
+        if status not in VALID_STATUSES:
+            out["error"] = "Invalid status"
+            continue
+        if (sid_u, cid_u) in seen:
+            out["error"] = "Duplicate entry for this student and class"
+            continue
+        seen.add((sid_u, cid_u))
+        out["result"] = None
+        valid.append((i, sid_u, cid_u, status, e.get("notes")))
+    return results, valid
@@ -1,13 +1,26 @@
-from .jwt import create_access_token, decode_token, get_current_user_optional
-from .deps import require_roles, get_current_user
-from .password import hash_password, verify_password
+from .jwt import create_access_token, decode_token, get_current_user_optional, user_from_payload
+from .deps import require_roles, get_current_user, get_principal
+from .principal import ensure_student_access, invalidate_parent, invalidate_principal, require_teacher_id
+from .password import (
+    HashingBusy, hash_password, hash_password_async, needs_rehash, verify_password, verify_password_async,
+)
 
 __all__ = [
     "create_access_token",
     "decode_token",
     "get_current_user_optional",
+    "user_from_payload",
     "require_roles",
     "get_current_user",
+    "get_principal",
+    "ensure_student_access",
+    "require_teacher_id",
+    "invalidate_parent",
+    "invalidate_principal",
+    "HashingBusy",
     "hash_password",
+    "hash_password_async",
+    "needs_rehash",
     "verify_password",
+    "verify_password_async",
 ]
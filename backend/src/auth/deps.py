@@ -3,6 +3,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from .jwt import decode_token, get_current_user_optional
+from .principal import resolve_principal
 
 http_bearer = HTTPBearer(auto_error=False)
 
@@ -19,10 +20,14 @@ async def get_current_user(
     return current
 
 
+async def get_principal(current: dict = Depends(get_current_user)) -> dict:
+    return await resolve_principal(current)
+
+
 def require_roles(allowed_roles: List[str]):
     async def _check(user: dict = Depends(get_current_user)) -> dict:
         if user.get("role") not in allowed_roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
-        return user
+        return await resolve_principal(user)
 
     return _check
@@ -0,0 +1,27 @@
+"""Scheduled auth jobs (see ``src/scheduler.py``)."""
+from ..config import get_settings
+from ..db_async import get_async_cursor
+from .. import scheduler
+
+settings = get_settings()
+
+
+@scheduler.job("auth.prune_revocations", "0 3 * * *")
+async def prune_revocations():
+    """Drop revocations older than the token lifetime; every token they covered has expired."""
+    async with get_async_cursor() as cur:
+        await cur.execute("DELETE FROM token_revocations WHERE revoked_at < NOW() - make_interval(mins => %s)",
+                          (settings.jwt_expire_minutes,))
+        return {"deleted": cur.rowcount}
+
+
+@scheduler.job("auth.prune_sessions", "10 3 * * *")
+async def prune_sessions():
+    """Drop sessions expired or revoked longer ago than the token lifetime."""
+    async with get_async_cursor() as cur:
+        await cur.execute("""
+            DELETE FROM auth_sessions
+            WHERE expires_at < NOW() - make_interval(mins => %(mins)s)
+               OR revoked_at < NOW() - make_interval(mins => %(mins)s)
+        """, {"mins": settings.jwt_expire_minutes})
+        return {"deleted": cur.rowcount}
@@ -1,28 +1,52 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordBearer
 
+from ..cache import TTLCache
 from ..config import get_settings
+from .revocation import is_revoked
 
 settings = get_settings()
+# Verified payloads by token digest, each kept until the token's own expiry
+_verified = TTLCache(maxsize=settings.token_cache_size, ttl=settings.jwt_expire_minutes * 60)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 http_bearer = HTTPBearer(auto_error=False)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.jwt_expire_minutes))
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    # Fractional iat: a token minted just after a revocation in the same second stays valid
+    to_encode.update({"iat": time.time(), "exp": now + (expires_delta or timedelta(minutes=settings.jwt_expire_minutes))})
     return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
 def decode_token(token: str) -> Optional[dict]:
-    try:
-        return jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-    except JWTError:
+    """The verified payload, or None for a bad, expired or revoked token.
+
+    Signature checks are cached per token; revocation is checked every time.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _verified.get(key)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+        except JWTError:
+            return None
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            _verified.set(key, payload, ttl=remaining)
+    if is_revoked(payload):
         return None
+    return payload
+
+
+def token_cache_stats() -> dict:
+    return _verified.stats()
 
 
 async def get_current_user_optional(
@@ -30,11 +54,18 @@ async def get_current_user_optional(
 ) -> Optional[dict]:
     if not credentials or not credentials.credentials:
         return None
-    payload = decode_token(credentials.credentials)
+    return user_from_payload(decode_token(credentials.credentials), credentials.credentials)
+
+
+def user_from_payload(payload: Optional[dict], token: str) -> Optional[dict]:
+    """The ``{id, role, token, sid, claims}`` dict routes receive, or None for an unusable token.
+
+    ``claims`` is the verified ``scp`` claim (profile ids and scope), None for tokens without one.
+    """
     if not payload:
         return None
     user_id = payload.get("sub")
     role = payload.get("role")
     if not user_id or not role:
         return None
-    return {"id": user_id, "role": role, "token": credentials.credentials}
+    return {"id": user_id, "role": role, "token": token, "sid": payload.get("sid"), "claims": payload.get("scp")}
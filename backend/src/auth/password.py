@@ -1,21 +1,158 @@
+"""bcrypt password hashing.
+
+A hash costs about 250 ms of CPU at 12 rounds. Request handlers use
+``hash_password_async`` / ``verify_password_async``, which run bcrypt in a
+dedicated process pool so a burst of logins neither holds the GIL nor ties
+up the threadpool and DB connections. The pool's queue is bounded: past
+``password_hash_queue`` calls in flight, new ones raise ``HashingBusy``
+(served as 503) instead of piling up. The plain ``hash_password`` /
+``verify_password`` run inline, for scripts and one-off use.
+
+Workers receive ``bcrypt.hashpw`` / ``bcrypt.checkpw`` themselves, so they
+import nothing from the app.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import bcrypt
 
+from ..config import get_settings
+
+settings = get_settings()
+
 # bcrypt has a 72-byte max; we truncate to avoid errors (normal passwords are shorter)
 MAX_BCRYPT_BYTES = 72
+LATENCY_SAMPLES = 1000
+
+_executor = None
+_lock = threading.Lock()
+_in_flight = 0
+_rejected = 0
+_completed = 0
+_latencies = deque(maxlen=LATENCY_SAMPLES)  # seconds from submit to result, recent calls
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full; the caller should retry shortly."""
+
+
+def _encode(plain: str) -> bytes:
+    return plain.encode("utf-8")[:MAX_BCRYPT_BYTES]
 
 
 def hash_password(plain: str) -> str:
-    p = plain.encode("utf-8")
-    if len(p) > MAX_BCRYPT_BYTES:
-        p = p[:MAX_BCRYPT_BYTES]
-    return bcrypt.hashpw(p, bcrypt.gensalt(rounds=12)).decode("utf-8")
+    return bcrypt.hashpw(_encode(plain), bcrypt.gensalt(rounds=settings.password_hash_rounds)).decode("utf-8")
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    p = plain.encode("utf-8")
-    if len(p) > MAX_BCRYPT_BYTES:
-        p = p[:MAX_BCRYPT_BYTES]
     try:
-        return bcrypt.checkpw(p, hashed.encode("utf-8"))
+        return bcrypt.checkpw(_encode(plain), hashed.encode("utf-8"))
     except Exception:
         return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True when ``hashed`` was made with a different cost than ``password_hash_rounds``."""
+    try:
+        return int(hashed.split("$")[2]) != settings.password_hash_rounds
+    except (IndexError, ValueError):
+        return False
+
+
+# ========== Process pool ==========
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn, not fork: the parent holds DB pools and threads
+            _executor = ProcessPoolExecutor(max_workers=settings.password_hash_workers or os.cpu_count(),
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _reset(broken: ProcessPoolExecutor) -> None:
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _done(started: float):
+    def callback(future):
+        global _in_flight, _completed
+        with _lock:
+            _in_flight -= 1
+            _completed += 1
+            _latencies.append(time.monotonic() - started)
+    return callback
+
+
+async def _run(fn, *args):
+    global _in_flight, _rejected
+    executor = _get_executor()
+    with _lock:
+        if _in_flight >= settings.password_hash_queue:
+            _rejected += 1
+            raise HashingBusy()
+        _in_flight += 1
+    try:
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            _reset(executor)  # a worker died; start a fresh pool
+            future = _get_executor().submit(fn, *args)
+    except BaseException:
+        with _lock:
+            _in_flight -= 1
+        raise
+    future.add_done_callback(_done(time.monotonic()))
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password_async(plain: str) -> str:
+    salt = bcrypt.gensalt(rounds=settings.password_hash_rounds)
+    return (await _run(bcrypt.hashpw, _encode(plain), salt)).decode("utf-8")
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    try:
+        return await _run(bcrypt.checkpw, _encode(plain), hashed.encode("utf-8"))
+    except ValueError:
+        return False  # not a bcrypt hash
+
+
+def hash_pool_stats() -> dict:
+    with _lock:
+        samples = sorted(_latencies)
+        out = {
+            "workers": settings.password_hash_workers or os.cpu_count(),
+            "started": _executor is not None,
+            "in_flight": _in_flight,
+            "queue_limit": settings.password_hash_queue,
+            "completed": _completed,
+            "rejected": _rejected,
+        }
+    if samples:
+        out["latency_ms"] = {
+            "avg": round(sum(samples) / len(samples) * 1000, 1),
+            "p50": round(samples[len(samples) // 2] * 1000, 1),
+            "p95": round(samples[int(len(samples) * 0.95)] * 1000, 1),
+            "max": round(samples[-1] * 1000, 1),
+        }
+    return out
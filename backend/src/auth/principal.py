@@ -0,0 +1,134 @@
+"""Resolved principal: the token identity plus the caller's profile ids.
+
+Routes receive a dict with ``id``, ``role``, ``token`` and, once resolved,
+``teacher_id`` / ``student_id`` / ``parent_id``, ``student_ids`` (the set
+of students the caller may see: their own record, or a parent's linked
+children) and ``class_ids`` (classes a teacher takes this academic year), so
+authorization checks are set lookups.
+
+Access tokens carry these as a compact ``scp`` claim (``token_claims``), and
+a principal is then built from the verified claims without touching the
+database. Migration 0016 revokes a user's tokens when the rows behind their
+claims change, which makes the client refresh and pick up new ones. Tokens
+without the claim (older tokens, or a scope too large to embed) fall back to
+a per-user cache that must be invalidated whenever a profile or
+parent-student link changes.
+"""
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from ..cache import TTLCache
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_one
+
+settings = get_settings()
+_principals = TTLCache(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+
+# Ids per list a token may carry; beyond this the claim is left out and loaded per request
+MAX_CLAIM_IDS = 200
+
+
+async def _load(user_id: str, cur=None) -> dict:
+    if cur is None:
+        async with get_async_cursor(commit=False) as cur:
+            return await _load(user_id, cur)
+    row = await fetch_one(cur, """
+        SELECT t.id AS teacher_id, s.id AS student_id, p.id AS parent_id,
+               ARRAY(SELECT psl.student_id::text FROM parent_student_links psl WHERE psl.parent_id = p.id) AS linked_student_ids,
+               ARRAY(SELECT DISTINCT ct.class_id::text FROM class_teachers ct
+                     JOIN academic_years ay ON ay.id = ct.academic_year_id AND ay.is_current
+                     WHERE ct.teacher_id = t.id) AS class_ids
+        FROM users u
+        LEFT JOIN teachers t ON t.user_id = u.id
+        LEFT JOIN students s ON s.user_id = u.id
+        LEFT JOIN parents p ON p.user_id = u.id
+        WHERE u.id = %s
+    """, (user_id,))
+    row = row or {}
+    student_id = str(row["student_id"]) if row.get("student_id") else None
+    linked = set(row.get("linked_student_ids") or [])
+    if student_id:
+        linked.add(student_id)
+    return {
+        "teacher_id": str(row["teacher_id"]) if row.get("teacher_id") else None,
+        "student_id": student_id,
+        "parent_id": str(row["parent_id"]) if row.get("parent_id") else None,
+        "student_ids": frozenset(linked),
+        "class_ids": frozenset(row.get("class_ids") or []),
+    }
+
+
+async def token_claims(cur, user_id: str) -> Optional[dict]:
+    """The ``scp`` claim for a new access token, or None when the scope is too large to embed."""
+    profile = await _load(user_id, cur)
+    linked = profile["student_ids"] - {profile["student_id"]}
+    if len(linked) > MAX_CLAIM_IDS or len(profile["class_ids"]) > MAX_CLAIM_IDS:
+        return None
+    claims = {
+        "tid": profile["teacher_id"],
+        "stid": profile["student_id"],
+        "pid": profile["parent_id"],
+        "cls": sorted(profile["class_ids"]),
+        "stu": sorted(linked),
+    }
+    return {k: v for k, v in claims.items() if v}
+
+
+def _from_claims(claims: dict) -> dict:
+    student_ids = set(claims.get("stu", ()))
+    if claims.get("stid"):
+        student_ids.add(claims["stid"])
+    return {
+        "teacher_id": claims.get("tid"),
+        "student_id": claims.get("stid"),
+        "parent_id": claims.get("pid"),
+        "student_ids": frozenset(student_ids),
+        "class_ids": frozenset(claims.get("cls", ())),
+    }
+
+
+async def resolve_principal(current: dict) -> dict:
+    """Attach profile ids to the ``{id, role, token, claims}`` dict from the JWT."""
+    if current.get("claims") is not None:
+        return {**_from_claims(current["claims"]), **current}
+    key = current["id"]
+    profile = _principals.get(key)
+    if profile is None or profile["role"] != current["role"]:
+        profile = dict(await _load(key), role=current["role"])
+        _principals.set(key, profile)
+    return {**profile, **current}
+
+
+def invalidate_principal(user_id: Optional[str]) -> None:
+    if user_id:
+        _principals.pop(str(user_id))
+
+
+def invalidate_parent(parent_id: str) -> None:
+    """Drop the cached principal of the parent whose links just changed."""
+    parent_id = str(parent_id)
+    _principals.pop_where(lambda p: p.get("parent_id") == parent_id)
+
+
+def principal_cache_stats() -> dict:
+    return _principals.stats()
+
+
+def can_access_student(current: dict, student_id: str) -> bool:
+    if current["role"] in ("STUDENT", "PARENT"):
+        return str(student_id) in current.get("student_ids", ())
+    return True
+
+
+def require_teacher_id(current: dict) -> str:
+    """The caller's teacher profile id; 403 for callers without one (e.g. office staff)."""
+    if not current.get("teacher_id"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="A teacher profile is required for this action")
+    return current["teacher_id"]
+
+
+def ensure_student_access(current: dict, student_id: str) -> None:
+    """403 unless the caller is staff, the student themself, or a linked parent."""
+    if not can_access_student(current, student_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not linked to this student")
@@ -0,0 +1,105 @@
+"""In-memory view of ``token_revocations`` (migration 0014) and of revoked
+``auth_sessions`` (migration 0015).
+
+``is_revoked`` is a dict lookup, so checking a token costs no DB round trip.
+Each worker re-reads the live rows (those younger than the token lifetime)
+every ``token_revocation_poll_seconds`` and, with ``db_listen`` on, applies
+``token_revoked`` / ``session_revoked`` notifications as they arrive; a
+deactivation or signed-out session therefore takes effect within seconds
+everywhere.
+"""
+import asyncio
+import logging
+
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_all
+from .. import notify
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CHANNEL = "token_revoked"
+SESSION_CHANNEL = "session_revoked"
+
+_revoked = {}  # user id -> epoch seconds; that user's tokens issued until then are void
+_revoked_sessions = set()  # session ids whose access tokens are void
+_task = None
+
+
+def issued_at(payload: dict) -> float:
+    """``iat``, or for tokens minted without one, the latest it can have been."""
+    if payload.get("iat") is not None:
+        return payload["iat"]
+    return payload.get("exp", 0) - settings.jwt_expire_minutes * 60
+
+
+def is_revoked(payload: dict) -> bool:
+    if payload.get("sid") in _revoked_sessions:
+        return True
+    cutoff = _revoked.get(payload.get("sub"))
+    return cutoff is not None and issued_at(payload) <= cutoff
+
+
+def revoke_session(session_id: str) -> None:
+    """Apply a revocation made by this worker without waiting for the next poll."""
+    _revoked_sessions.add(str(session_id))
+
+
+def _on_notify(payload: str) -> None:
+    user_id, _, at = payload.partition(" ")
+    if user_id and at:
+        _revoked[user_id] = max(float(at), _revoked.get(user_id, 0))
+
+
+def _on_session_notify(payload: str) -> None:
+    if payload:
+        _revoked_sessions.add(payload)
+
+
+notify.subscribe(CHANNEL, _on_notify)
+notify.subscribe(SESSION_CHANNEL, _on_session_notify)
+
+
+async def reload() -> None:
+    global _revoked, _revoked_sessions
+    async with get_async_cursor(commit=False) as cur:
+        rows = await fetch_all(cur, """
+            SELECT user_id, EXTRACT(EPOCH FROM revoked_at)::float8 AS at
+            FROM token_revocations
+            WHERE revoked_at > NOW() - make_interval(mins => %s)
+        """, (settings.jwt_expire_minutes,))
+        sessions = await fetch_all(cur, """
+            SELECT id FROM auth_sessions
+            WHERE revoked_at > NOW() - make_interval(mins => %s)
+        """, (settings.jwt_expire_minutes,))
+    _revoked = {str(r["user_id"]): r["at"] for r in rows}
+    _revoked_sessions = {str(r["id"]) for r in sessions}
+
+
+async def _poll_forever():
+    while True:
+        try:
+            await reload()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not load token revocations: {e}")
+        await asyncio.sleep(settings.token_revocation_poll_seconds)
+
+
+async def start():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_poll_forever())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+def revocation_stats() -> dict:
+    return {"users": len(_revoked), "sessions": len(_revoked_sessions), "polling": _task is not None}
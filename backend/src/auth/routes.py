@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr
 
-from ..db import get_cursor, fetch_one
-from ..auth import hash_password, verify_password, create_access_token, get_current_user
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_one, fetch_all
+from ..auth import HashingBusy, hash_password_async, needs_rehash, verify_password_async, create_access_token, get_current_user
 from .deps import require_roles
+from . import sessions, throttle
+from .principal import token_claims
+from ..http_cache import cache_policy
+from ..ids import ids_or_404
 
 router = APIRouter(prefix="/auth", tags=["auth"])
+settings = get_settings()
 
 
 class LoginRequest(BaseModel):
@@ -19,32 +26,69 @@ class RegisterRequest(BaseModel):
     role: str  # validated in endpoint
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
-    user: dict
+    expires_in: int
+    refresh_token: Optional[str] = None
+    user: Optional[dict] = None
+
+
+def _tokens(user_id: str, role: str, session_id: str, refresh_token: str, scope: Optional[dict],
+            user: Optional[dict] = None) -> TokenResponse:
+    claims = {"sub": user_id, "role": role, "sid": session_id}
+    if scope is not None:
+        claims["scp"] = scope
+    return TokenResponse(
+        access_token=create_access_token(data=claims),
+        expires_in=settings.jwt_expire_minutes * 60,
+        refresh_token=refresh_token,
+        user=user,
+    )
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(data: LoginRequest):
-    with get_cursor() as cur:
-        row = fetch_one(
+async def login(data: LoginRequest, request: Request):
+    email = data.email.strip().lower()
+    ip = request.client.host if request.client else "unknown"
+    throttle.check(ip, email)
+    async with get_async_cursor(commit=False) as cur:
+        row = await fetch_one(
             cur,
             """
             SELECT id, email, password_hash, role, is_active
             FROM users WHERE LOWER(email) = LOWER(%s)
             """,
-            (data.email.strip(),),
+            (email,),
         )
-        if not row:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
-        if not row["is_active"]:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is inactive")
-        if not verify_password(data.password, row["password_hash"]):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    if not row:
+        throttle.failed(ip, email)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    if not row["is_active"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is inactive")
+    # bcrypt runs in the hashing pool, without holding a DB connection
+    if not await verify_password_async(data.password, row["password_hash"]):
+        throttle.failed(ip, email)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    throttle.succeeded(email)
+    new_hash = None
+    if needs_rehash(row["password_hash"]):
+        try:
+            new_hash = await hash_password_async(data.password)
+        except HashingBusy:
+            pass  # upgrade at a quieter login
+    async with get_async_cursor() as cur:
+        if new_hash:
+            await cur.execute("UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                              (new_hash, row["id"], row["password_hash"]))
         user_id = str(row["id"])
         role = row["role"]
-        token = create_access_token(data={"sub": user_id, "role": role})
+        session_id, refresh_token = await sessions.create(cur, user_id, request.headers.get("user-agent"), ip)
+        scope = await token_claims(cur, user_id)
         out = {
             "id": user_id,
             "email": row["email"],
@@ -52,30 +96,77 @@ def login(data: LoginRequest):
         }
         # Attach profile id for teacher/student/parent
         if role == "TEACHER":
-            t = fetch_one(cur, "SELECT id, first_name, last_name FROM teachers WHERE user_id = %s", (user_id,))
+            t = await fetch_one(cur, "SELECT id, first_name, last_name FROM teachers WHERE user_id = %s", (user_id,))
             if t:
                 out["teacher_id"] = str(t["id"])
                 out["first_name"] = t["first_name"]
                 out["last_name"] = t["last_name"]
         elif role == "STUDENT":
-            s = fetch_one(cur, "SELECT id, first_name, last_name FROM students WHERE user_id = %s", (user_id,))
+            s = await fetch_one(cur, "SELECT id, first_name, last_name FROM students WHERE user_id = %s", (user_id,))
             if s:
                 out["student_id"] = str(s["id"])
                 out["first_name"] = s["first_name"]
                 out["last_name"] = s["last_name"]
         elif role == "PARENT":
-            p = fetch_one(cur, "SELECT id, first_name, last_name FROM parents WHERE user_id = %s", (user_id,))
+            p = await fetch_one(cur, "SELECT id, first_name, last_name FROM parents WHERE user_id = %s", (user_id,))
             if p:
                 out["parent_id"] = str(p["id"])
                 out["first_name"] = p["first_name"]
                 out["last_name"] = p["last_name"]
-        return TokenResponse(access_token=token, user=out)
+    return _tokens(user_id, role, session_id, refresh_token, scope, out)
+
+
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh(data: RefreshRequest):
+    """New access and refresh tokens for a valid refresh token; no password, no bcrypt."""
+    async with get_async_cursor() as cur:
+        rotated = await sessions.rotate(cur, data.refresh_token)
+        scope = await token_claims(cur, rotated["user_id"]) if rotated else None
+    if not rotated:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token")
+    return _tokens(rotated["user_id"], rotated["role"], rotated["session_id"], rotated["refresh_token"], scope)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(data: RefreshRequest):
+    async with get_async_cursor() as cur:
+        await sessions.end(cur, data.refresh_token)
+
+
+@router.get("/sessions")
+async def list_sessions(current: dict = Depends(get_current_user)):
+    """The caller's signed-in devices, most recently used first."""
+    async with get_async_cursor(commit=False) as cur:
+        rows = await fetch_all(cur, """
+            SELECT id, user_agent, ip_address, created_at, last_used_at, expires_at
+            FROM auth_sessions
+            WHERE user_id = %s AND revoked_at IS NULL AND expires_at > NOW()
+            ORDER BY last_used_at DESC
+        """, (current["id"],))
+    return [dict(r, id=str(r["id"]), current=str(r["id"]) == current.get("sid")) for r in rows]
+
+
+@router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_session(session_id: str, current: dict = Depends(get_current_user)):
+    ids_or_404(session_id, detail="Session not found")
+    async with get_async_cursor() as cur:
+        n = await sessions.revoke(cur, current["id"], session_id=session_id)
+    if not n:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+
+
+@router.delete("/sessions")
+async def revoke_other_sessions(current: dict = Depends(get_current_user)):
+    """Sign out everywhere except this device."""
+    async with get_async_cursor() as cur:
+        n = await sessions.revoke(cur, current["id"], keep=current.get("sid"))
+    return {"revoked": n}
 
 
-@router.get("/me")
-def me(current: dict = Depends(get_current_user)):
-    with get_cursor() as cur:
-        row = fetch_one(
+@router.get("/me", dependencies=[cache_policy()])
+async def me(current: dict = Depends(get_current_user)):
+    async with get_async_cursor() as cur:
+        row = await fetch_one(
             cur,
             "SELECT id, email, role, is_active, created_at FROM users WHERE id = %s",
             (current["id"],),
@@ -86,19 +177,19 @@ def me(current: dict = Depends(get_current_user)):
         out["id"] = str(out["id"])
         role = out["role"]
         if role == "TEACHER":
-            t = fetch_one(cur, "SELECT id, first_name, last_name FROM teachers WHERE user_id = %s", (current["id"],))
+            t = await fetch_one(cur, "SELECT id, first_name, last_name FROM teachers WHERE user_id = %s", (current["id"],))
             if t:
                 out["teacher_id"] = str(t["id"])
                 out["first_name"] = t["first_name"]
                 out["last_name"] = t["last_name"]
         elif role == "STUDENT":
-            s = fetch_one(cur, "SELECT id, first_name, last_name FROM students WHERE user_id = %s", (current["id"],))
+            s = await fetch_one(cur, "SELECT id, first_name, last_name FROM students WHERE user_id = %s", (current["id"],))
             if s:
                 out["student_id"] = str(s["id"])
                 out["first_name"] = s["first_name"]
                 out["last_name"] = s["last_name"]
         elif role == "PARENT":
-            p = fetch_one(cur, "SELECT id, first_name, last_name FROM parents WHERE user_id = %s", (current["id"],))
+            p = await fetch_one(cur, "SELECT id, first_name, last_name FROM parents WHERE user_id = %s", (current["id"],))
             if p:
                 out["parent_id"] = str(p["id"])
                 out["first_name"] = p["first_name"]
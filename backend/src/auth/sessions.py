@@ -0,0 +1,122 @@
+"""Refresh-token sessions (migration 0015).
+
+A refresh token is ``"<session id>.<secret>"``. The secret is 32 random
+bytes, so SHA-256 is enough to store it (no bcrypt), and the session id
+makes a refresh one primary-key UPDATE that checks the hash, rotates it and
+returns the user's current role. Only when that UPDATE matches nothing does
+a second query check for reuse: the previous secret presented after the
+grace window revokes the session, logging out whoever holds the newer
+token. Any other secret is rejected without touching the session.
+"""
+import hashlib
+import secrets
+import uuid
+from typing import Optional
+
+from ..config import get_settings
+from ..db_async import fetch_one
+from .revocation import revoke_session
+
+settings = get_settings()
+
+MAX_USER_AGENT = 300
+
+
+def _digest(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode("utf-8")).digest()
+
+
+def _token(session_id, secret: str) -> str:
+    return f"{session_id}.{secret}"
+
+
+def _parse(token: str):
+    session_id, _, secret = (token or "").partition(".")
+    try:
+        return str(uuid.UUID(session_id)), secret
+    except ValueError:
+        return None, None
+
+
+async def create(cur, user_id: str, user_agent: Optional[str], ip: Optional[str]) -> tuple:
+    """Open a session; returns ``(session_id, refresh_token)``."""
+    secret = secrets.token_urlsafe(32)
+    row = await fetch_one(cur, """
+        INSERT INTO auth_sessions (user_id, token_hash, user_agent, ip_address, expires_at)
+        VALUES (%s, %s, %s, %s, NOW() + make_interval(days => %s))
+        RETURNING id
+    """, (user_id, _digest(secret), (user_agent or "")[:MAX_USER_AGENT] or None, ip,
+          settings.refresh_token_days))
+    return str(row["id"]), _token(row["id"], secret)
+
+
+async def rotate(cur, refresh_token: str) -> Optional[dict]:
+    """Swap a valid refresh token for a new one; returns user id, role, session id and the new token.
+
+    None for a token that cannot be refreshed. Commit either way: a detected
+    reuse revokes the session.
+    """
+    session_id, secret = _parse(refresh_token)
+    if not session_id or not secret:
+        return None
+    presented, fresh = _digest(secret), secrets.token_urlsafe(32)
+    row = await fetch_one(cur, """
+        UPDATE auth_sessions s SET
+            token_hash = %(fresh)s, previous_token_hash = s.token_hash, rotated_at = NOW(),
+            refresh_count = s.refresh_count + 1, last_used_at = NOW(),
+            expires_at = NOW() + make_interval(days => %(days)s)
+        FROM users u
+        WHERE s.id = %(id)s AND u.id = s.user_id AND u.is_active
+          AND s.revoked_at IS NULL AND s.expires_at > NOW()
+          AND (s.token_hash = %(presented)s
+               OR (s.previous_token_hash = %(presented)s AND s.rotated_at > NOW() - make_interval(secs => %(grace)s)))
+        RETURNING s.id, s.user_id, u.role
+    """, {"fresh": _digest(fresh), "days": settings.refresh_token_days, "id": session_id, "presented": presented,
+          "grace": settings.refresh_reuse_grace_seconds})
+    if row:
+        return {"session_id": str(row["id"]), "user_id": str(row["user_id"]), "role": row["role"],
+                "refresh_token": _token(row["id"], fresh)}
+    # Not rotated: the superseded secret, presented after the grace window, means the
+    # token was copied. Any other secret is just wrong and leaves the session alone,
+    # since the session id alone (the "sid" claim) must not let anyone end it.
+    reused = await fetch_one(cur, """
+        UPDATE auth_sessions SET revoked_at = NOW(), revoked_reason = 'REUSED'
+        WHERE id = %s AND revoked_at IS NULL AND expires_at > NOW() AND previous_token_hash = %s
+        RETURNING id
+    """, (session_id, presented))
+    if reused:
+        revoke_session(session_id)
+    return None
+
+
+async def end(cur, refresh_token: str) -> bool:
+    """Sign out the session a refresh token belongs to (the token proves ownership)."""
+    session_id, secret = _parse(refresh_token)
+    if not session_id or not secret:
+        return False
+    row = await fetch_one(cur, """
+        UPDATE auth_sessions SET revoked_at = NOW(), revoked_reason = 'LOGOUT'
+        WHERE id = %s AND revoked_at IS NULL AND (token_hash = %s OR previous_token_hash = %s)
+        RETURNING id
+    """, (session_id, _digest(secret), _digest(secret)))
+    if row:
+        revoke_session(session_id)
+    return row is not None
+
+
+async def revoke(cur, user_id: str, session_id: Optional[str] = None, reason: str = "REVOKED",
+                 keep: Optional[str] = None) -> int:
+    """Revoke one of the user's sessions, or all of them except ``keep``; returns the count."""
+    q = "UPDATE auth_sessions SET revoked_at = NOW(), revoked_reason = %s WHERE user_id = %s AND revoked_at IS NULL"
+    params = [reason, user_id]
+    if session_id:
+        q += " AND id = %s"
+        params.append(session_id)
+    if keep:
+        q += " AND id <> %s"
+        params.append(keep)
+    await cur.execute(q + " RETURNING id", params)
+    rows = await cur.fetchall()
+    for r in rows:
+        revoke_session(r["id"])
+    return len(rows)
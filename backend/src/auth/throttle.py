@@ -0,0 +1,60 @@
+"""Login throttling by client IP and by account.
+
+Failed logins are remembered per IP and per (lowercased) email for
+``login_failure_window_seconds``. Once either key reaches its limit, logins
+are refused with 429 before the user is looked up or bcrypt runs, so
+guessing passwords cannot occupy the hashing pool. A successful login clears
+the account's failures. Counts are per worker process.
+"""
+import time
+
+from fastapi import HTTPException, status
+
+from ..cache import TTLCache
+from ..config import get_settings
+
+settings = get_settings()
+MAX_KEYS = 100_000
+
+_by_ip = TTLCache(maxsize=MAX_KEYS, ttl=settings.login_failure_window_seconds)
+_by_account = TTLCache(maxsize=MAX_KEYS, ttl=settings.login_failure_window_seconds)
+
+
+def _recent(cache: TTLCache, key: str, now: float) -> tuple:
+    window = settings.login_failure_window_seconds
+    return tuple(t for t in cache.get(key, ()) if t > now - window)
+
+
+def _retry_after(cache: TTLCache, key: str, limit: int, now: float) -> float:
+    failures = _recent(cache, key, now)
+    if len(failures) < limit:
+        return 0
+    return failures[-limit] + settings.login_failure_window_seconds - now
+
+
+def check(ip: str, email: str) -> None:
+    """429 with ``Retry-After`` while the IP or the account is over its failure limit."""
+    now = time.monotonic()
+    wait = max(_retry_after(_by_ip, ip, settings.login_max_failures_per_ip, now),
+               _retry_after(_by_account, email, settings.login_max_failures_per_account, now))
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(int(wait) + 1)},
+        )
+
+
+def failed(ip: str, email: str) -> None:
+    now = time.monotonic()
+    for cache, key, limit in ((_by_ip, ip, settings.login_max_failures_per_ip),
+                              (_by_account, email, settings.login_max_failures_per_account)):
+        cache.set(key, (_recent(cache, key, now) + (now,))[-limit:])
+
+
+def succeeded(email: str) -> None:
+    _by_account.pop(email)
+
+
+def throttle_stats() -> dict:
+    return {"ips": len(_by_ip), "accounts": len(_by_account)}
@@ -1,25 +1,230 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from contextlib import contextmanager
+
 from .config import get_settings
 
 _settings = get_settings()
 
 
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within db_pool_timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool with bounded waits, health checks and recycling.
+
+    Connections are created lazily up to ``max_size``. A borrowed connection is
+    discarded and replaced if it is closed, older than ``max_age`` seconds, or
+    fails a ``SELECT 1`` ping after sitting idle for longer than
+    ``health_check_idle`` seconds.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=5.0, max_age=1800, health_check_idle=30.0):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_check_idle = health_check_idle
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "connections_failed_check": 0,
+            "borrows": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = False
+        self._count("connections_created")
+        return _PooledConnection(conn)
+
+    def fill(self):
+        """Open connections until min_size are idle (called at startup)."""
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) + self._in_use >= self.min_size:
+                    return
+            pc = self._connect()
+            with self._cond:
+                self._idle.append(pc)
+                self._cond.notify()
+
+    def _is_usable(self, pc):
+        """Runs outside the pool lock: the idle ping is a network round trip."""
+        if pc.conn.closed:
+            return False
+        now = time.monotonic()
+        if self.max_age and now - pc.created_at > self.max_age:
+            self._count("connections_recycled")
+            return False
+        if now - pc.last_used > self.health_check_idle:
+            try:
+                with pc.conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                pc.conn.rollback()
+            except Exception:  # not only psycopg2 errors: any failure retires the connection
+                self._count("connections_failed_check")
+                return False
+        return True
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _discard(pc):
+        try:
+            pc.conn.close()
+        except Exception:
+            pass
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                pc = None
+                if self._idle:
+                    pc = self._idle.pop()
+                elif self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"No database connection available within {self.timeout}s")
+                    self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+                # Reserve the slot before any I/O so concurrent callers cannot
+                # overshoot max_size.
+                self._in_use += 1
+            try:
+                if pc is not None:
+                    if self._is_usable(pc):
+                        self._count("borrows")
+                        return pc
+                    self._discard(pc)
+                    pc = None
+                pc = self._connect()
+            except BaseException:
+                # The slot was reserved above: give it back or the pool shrinks for good
+                if pc is not None:
+                    self._discard(pc)
+                self._release_slot()
+                raise
+            self._count("borrows")
+            return pc
+
+    def putconn(self, pc, discard=False):
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed or pc.conn.closed:
+                self._discard(pc)
+            else:
+                pc.last_used = time.monotonic()
+                self._idle.append(pc)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _settings.database_url,
+                    min_size=_settings.db_pool_min_size,
+                    max_size=_settings.db_pool_max_size,
+                    timeout=_settings.db_pool_timeout,
+                    max_age=_settings.db_pool_max_age,
+                    health_check_idle=_settings.db_pool_health_check_idle,
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
 @contextmanager
-def get_cursor(commit=True):
-    conn = psycopg2.connect(_settings.database_url)
-    conn.autocommit = False
+def get_cursor(commit=True, name=None):
+    """Pooled RealDictCursor; ``name`` makes it a server-side cursor that fetches ``itersize`` rows at a time."""
+    pool = get_pool()
+    pc = pool.getconn()
+    conn = pc.conn
+    broken = False
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor(name=name, cursor_factory=RealDictCursor) as cur:
             yield cur
         if commit:
             conn.commit()
-    except Exception:
-        conn.rollback()
+        else:
+            conn.rollback()
+    except BaseException:
+        # Includes GeneratorExit from an abandoned streaming response
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
         raise
     finally:
-        conn.close()
+        pool.putconn(pc, discard=broken or bool(conn.closed))
 
 
 def fetch_one(cur, query, params=None):
@@ -0,0 +1,92 @@
+"""Async counterpart of db.py for handlers declared with ``async def``.
+
+Uses psycopg 3 so queries keep the same ``%s`` placeholders and dict rows as
+the psycopg2 layer; routers can move between the two without rewriting SQL.
+"""
+from contextlib import asynccontextmanager
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout as _AsyncPoolTimeout
+
+from .config import get_settings
+from .db import PoolTimeout
+
+_settings = get_settings()
+_pool = None
+
+
+def get_async_pool() -> AsyncConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            _settings.database_url,
+            min_size=_settings.db_async_pool_min_size,
+            max_size=_settings.db_async_pool_max_size,
+            timeout=_settings.db_pool_timeout,
+            max_lifetime=_settings.db_pool_max_age,
+            kwargs={"row_factory": dict_row, "autocommit": False},
+            open=False,
+            name="async",
+        )
+    return _pool
+
+
+async def open_async_pool():
+    await get_async_pool().open(wait=False)
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def async_pool_stats():
+    if _pool is None:
+        return None
+    stats = _pool.get_stats()
+    return {
+        "min_size": _pool.min_size,
+        "max_size": _pool.max_size,
+        "idle": stats.get("pool_available", 0),
+        "size": stats.get("pool_size", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "borrows": stats.get("requests_num", 0),
+        "timeouts": stats.get("requests_errors", 0),
+    }
+
+
+@asynccontextmanager
+async def get_async_cursor(commit=True):
+    pool = get_async_pool()
+    try:
+        conn = await pool.getconn()
+    except _AsyncPoolTimeout as e:
+        raise PoolTimeout(str(e)) from e
+    try:
+        async with conn.cursor() as cur:
+            yield cur
+        if commit:
+            await conn.commit()
+        else:
+            await conn.rollback()
+    except BaseException:
+        try:
+            await conn.rollback()
+        except psycopg.Error:
+            pass  # broken connection; putconn() discards it
+        raise
+    finally:
+        await pool.putconn(conn)
+
+
+async def fetch_one(cur, query, params=None):
+    await cur.execute(query, params or ())
+    return await cur.fetchone()
+
+
+async def fetch_all(cur, query, params=None):
+    await cur.execute(query, params or ())
+    return await cur.fetchall()
@@ -0,0 +1,161 @@
+"""Mark-sheet parsing, validation and set-based upsert for exam results.
+
+A sheet is any iterable of ``(row_number, student_ref, marks)`` where
+``student_ref`` is a student number or student id. Validation is pure (no
+DB) against the class roster loaded once per import, then every accepted row
+is written with a single INSERT ... ON CONFLICT.
+"""
+import codecs
+import csv
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from psycopg2.extras import execute_values
+
+STUDENT_COLUMNS = ("student_number", "student number", "student_no", "admission_number", "student_id")
+MARKS_COLUMNS = ("marks", "mark", "score")
+
+
+class SheetError(ValueError):
+    """The sheet as a whole is unreadable (bad header, unsupported format)."""
+
+
+def _find_columns(header):
+    names = [str(h or "").strip().lower() for h in header]
+    student_col = next((names.index(c) for c in STUDENT_COLUMNS if c in names), None)
+    marks_col = next((names.index(c) for c in MARKS_COLUMNS if c in names), None)
+    if student_col is None or marks_col is None:
+        raise SheetError("Sheet needs a student_number column and a marks column")
+    return student_col, marks_col
+
+
+def _rows_from(table):
+    """Yield (row_number, student_ref, marks) from an iterator of cell tuples."""
+    try:
+        header = next(table)
+    except StopIteration:
+        raise SheetError("Sheet is empty")
+    student_col, marks_col = _find_columns(header)
+    width = max(student_col, marks_col) + 1
+    for n, cells in enumerate(table, start=2):
+        if not cells or all(c in (None, "") for c in cells):
+            continue
+        cells = list(cells) + [None] * (width - len(cells))
+        yield n, cells[student_col], cells[marks_col]
+
+
+def read_csv(binary_file):
+    try:
+        return list(_rows_from(csv.reader(codecs.iterdecode(binary_file, "utf-8-sig"))))
+    except UnicodeDecodeError:
+        raise SheetError("CSV is not UTF-8 text; save it as CSV UTF-8")
+    except csv.Error as e:
+        raise SheetError(f"Unreadable CSV: {e}")
+
+
+def read_xlsx(binary_file):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise SheetError("XLSX import needs openpyxl installed; upload CSV instead")
+    try:
+        wb = load_workbook(binary_file, read_only=True, data_only=True)
+        try:
+            return list(_rows_from(wb.active.iter_rows(values_only=True)))
+        finally:
+            wb.close()
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        raise SheetError("File is not a valid .xlsx workbook")
+
+
+def read_sheet(binary_file, filename):
+    """All ``(row_number, student_ref, marks)`` rows, read before any DB work starts."""
+    name = (filename or "").lower()
+    if name.endswith(".xlsx"):
+        return read_xlsx(binary_file)
+    if name.endswith(".csv") or not name:
+        return read_csv(binary_file)
+    raise SheetError("Unsupported file type; upload .csv or .xlsx")
+
+
+def validate_rows(rows, roster, total_marks):
+    """Check every row against the roster and the exam's total marks.
+
+    ``roster`` maps student numbers *and* student ids (as strings) to the
+    student id. Returns ``(accepted, errors)`` where accepted is a list of
+    ``(row_number, student_id, marks)``; a later row for the same student is
+    reported as a duplicate rather than silently winning.
+    """
+    accepted, errors, seen = [], [], {}
+    total = Decimal(str(total_marks))
+    for n, ref, raw in rows:
+        if isinstance(ref, float) and ref.is_integer():
+            ref = int(ref)  # spreadsheet cells hold numeric student numbers as floats
+        ref = str(ref).strip() if ref is not None else ""
+        if not ref:
+            errors.append({"row": n, "student": ref, "error": "Missing student number"})
+            continue
+        student_id = roster.get(ref)
+        if student_id is None:
+            errors.append({"row": n, "student": ref, "error": "Student not found in this class"})
+            continue
+        if raw is None or str(raw).strip() == "":
+            errors.append({"row": n, "student": ref, "error": "Missing marks"})
+            continue
+        try:
+            marks = Decimal(str(raw).strip())
+        except (InvalidOperation, ValueError):
+            errors.append({"row": n, "student": ref, "error": f"Marks '{raw}' is not a number"})
+            continue
+        if not marks.is_finite() or marks < 0 or marks > total:
+            errors.append({"row": n, "student": ref, "error": f"Marks must be between 0 and {total}"})
+            continue
+        if student_id in seen:
+            errors.append({"row": n, "student": ref, "error": f"Duplicate of row {seen[student_id]}"})
+            continue
+        seen[student_id] = n
+        accepted.append((n, student_id, marks))
+    return accepted, errors
+
+
+def load_exam_and_roster(cur, exam_id):
+    cur.execute("SELECT id, class_id, total_marks FROM exams WHERE id = %s", (exam_id,))
+    exam = cur.fetchone()
+    if not exam:
+        return None, None
+    cur.execute("""
+        SELECT s.id, s.student_number
+        FROM student_classes sc
+        JOIN students s ON s.id = sc.student_id
+        WHERE sc.class_id = %s
+    """, (exam["class_id"],))
+    roster = {}
+    for r in cur.fetchall():
+        sid = str(r["id"])
+        roster[sid] = sid
+        if r["student_number"]:
+            roster[str(r["student_number"]).strip()] = sid
+    return exam, roster
+
+
+def upsert_results(cur, exam_id, accepted, teacher_id):
+    """Write all accepted rows in one statement; approved results stay locked.
+
+    Returns ``(inserted, updated, locked_rows)``.
+    """
+    if not accepted:
+        return 0, 0, []
+    rows = execute_values(cur, """
+        INSERT INTO exam_results (exam_id, student_id, marks, entered_by)
+        VALUES %s
+        ON CONFLICT (exam_id, student_id) DO UPDATE
+            SET marks = EXCLUDED.marks, entered_by = EXCLUDED.entered_by, updated_at = NOW()
+            WHERE exam_results.approved_at IS NULL
+        RETURNING student_id, (xmax = 0) AS inserted
+    """, [(exam_id, sid, marks, teacher_id) for _, sid, marks in accepted],
+        template="(%s::uuid, %s::uuid, %s, %s::uuid)", page_size=len(accepted), fetch=True)
+    written = {str(r["student_id"]): r["inserted"] for r in rows}
+    inserted = sum(1 for v in written.values() if v)
+    locked = [n for n, sid, _ in accepted if sid not in written]
+    return inserted, len(written) - inserted, locked
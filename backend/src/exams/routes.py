@@ -1,12 +1,21 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from pydantic import BaseModel
 
-from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles
+from ..db import get_cursor, fetch_all
+from ..auth import require_roles, require_teacher_id
+from ..ids import ids_or_404
+from ..pagination import Keyset, Page, SortKey, optional_page_params, paginate
+from . import marks as marksheet
 
 router = APIRouter(prefix="/exams", tags=["exams"])
 
+NEWEST_FIRST = Keyset(
+    "exams",
+    SortKey("e.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("e.id", "uuid", "id", desc=True),
+)
+
 
 class CreateExamBody(BaseModel):
     term_id: str
@@ -22,10 +31,21 @@ class EnterResultBody(BaseModel):
     marks: float
 
 
+class BatchResultEntry(BaseModel):
+    student_id: Optional[str] = None
+    student_number: Optional[str] = None
+    marks: float
+
+
+class BatchResultsBody(BaseModel):
+    results: list[BatchResultEntry]
+
+
 @router.get("")
 def list_exams(
     term_id: Optional[str] = Query(None),
     class_id: Optional[str] = Query(None),
+    page: Page = Depends(optional_page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
 ):
     with get_cursor() as cur:
@@ -45,9 +65,9 @@ def list_exams(
         if class_id:
             q += " AND e.class_id = %s"
             params.append(class_id)
-        q += " ORDER BY e.created_at DESC"
-        cur.execute(q, params)
-        rows = cur.fetchall()
+        tail, tail_params = NEWEST_FIRST.clause(page)
+        cur.execute(q + tail, params + tail_params)
+        rows = paginate(page, NEWEST_FIRST, cur.fetchall())
         return [dict(r, id=str(r["id"]), term_id=str(r["term_id"]), class_id=str(r["class_id"]), subject_id=str(r["subject_id"])) for r in rows]
 
 
@@ -88,11 +108,10 @@ def get_exam_results(
 def enter_result(
     exam_id: str,
     body: EnterResultBody,
-    current=Depends(require_roles(["TEACHER", "ADMIN_STAFF", "SUPER_ADMIN"])),
+    current=Depends(require_roles(["TEACHER"])),
 ):
-    teacher_id = current.get("teacher_id")
+    tid = require_teacher_id(current)
     with get_cursor() as cur:
-        tid = teacher_id or fetch_one(cur, "SELECT id FROM teachers LIMIT 1")["id"]
         cur.execute("""
             INSERT INTO exam_results (exam_id, student_id, marks, entered_by)
             VALUES (%s, %s, %s, %s)
@@ -101,6 +120,48 @@ def enter_result(
     return {"ok": True}
 
 
+@router.post("/{exam_id}/results/batch")
+def enter_results_batch(
+    exam_id: str,
+    body: BatchResultsBody,
+    current=Depends(require_roles(["TEACHER"])),
+):
+    rows = ((i + 1, e.student_number or e.student_id, e.marks) for i, e in enumerate(body.results))
+    return _import_marks(exam_id, rows, current)
+
+
+@router.post("/{exam_id}/results/import")
+def import_mark_sheet(
+    exam_id: str,
+    file: UploadFile = File(...),
+    current=Depends(require_roles(["TEACHER"])),
+):
+    """Upload a CSV or XLSX sheet with student_number and marks columns."""
+    try:
+        rows = marksheet.read_sheet(file.file, file.filename)
+        return _import_marks(exam_id, rows, current)
+    except marksheet.SheetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _import_marks(exam_id, rows, current):
+    tid = require_teacher_id(current)
+    ids_or_404(exam_id, detail="Exam not found")
+    with get_cursor() as cur:
+        exam, roster = marksheet.load_exam_and_roster(cur, exam_id)
+        if not exam:
+            raise HTTPException(status_code=404, detail="Exam not found")
+        accepted, errors = marksheet.validate_rows(rows, roster, exam["total_marks"])
+        inserted, updated, locked = marksheet.upsert_results(cur, exam_id, accepted, tid)
+    errors.extend({"row": n, "error": "Result already approved; not changed"} for n in locked)
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "ok": not errors,
+        "summary": {"inserted": inserted, "updated": updated, "rejected": len(errors)},
+        "errors": errors,
+    }
+
+
 @router.post("/{exam_id}/results/approve")
 def approve_results(
     exam_id: str,
@@ -0,0 +1,100 @@
+"""Term billing runs: invoice every enrolled student from ``fee_structures``.
+
+A class is charged the fee structure for its form and stream, falling back
+to the form-wide one (``stream_id`` NULL). ``preview`` counts what a run
+would do, per form; ``run`` inserts every missing invoice for the term with
+one INSERT ... SELECT and records the outcome in ``billing_runs``.
+
+A student who already has any invoice for the term is skipped, so running
+a term again only bills students enrolled since. Runs for the same term are
+serialised with an advisory lock, and the unique index from migration 0010
+keeps a second run from double billing even without it.
+"""
+from fastapi import HTTPException
+
+from ..db import fetch_one, fetch_all
+
+# Fee per class of the year: stream-specific structure first, then the form-wide one
+CLASS_FEES = """
+    SELECT c.id AS class_id, c.form_id, fs.amount
+    FROM classes c
+    LEFT JOIN LATERAL (
+        SELECT fs.amount FROM fee_structures fs
+        WHERE fs.academic_year_id = c.academic_year_id AND fs.form_id = c.form_id
+          AND (fs.stream_id = c.stream_id OR fs.stream_id IS NULL)
+        ORDER BY fs.stream_id NULLS LAST
+        LIMIT 1
+    ) fs ON true
+    WHERE c.academic_year_id = %(academic_year_id)s
+"""
+
+
+def candidates_query(form_id) -> str:
+    """Enrolled students with their fee (NULL when unpriced) and whether the term is already billed."""
+    return f"""
+        SELECT sc.student_id, cf.form_id, cf.amount,
+               EXISTS (SELECT 1 FROM invoices i WHERE i.student_id = sc.student_id AND i.term_id = %(term_id)s) AS billed
+        FROM student_classes sc
+        JOIN ({CLASS_FEES}) cf ON cf.class_id = sc.class_id
+        WHERE sc.academic_year_id = %(academic_year_id)s
+        {'AND cf.form_id = %(form_id)s' if form_id else ''}
+    """
+
+
+def get_term(cur, term_id: str) -> dict:
+    term = fetch_one(cur, "SELECT id, academic_year_id, name, start_date FROM terms WHERE id = %s", (term_id,))
+    if not term:
+        raise HTTPException(status_code=404, detail="Term not found")
+    return term
+
+
+def _params(term: dict, form_id, **extra) -> dict:
+    return dict(term_id=term["id"], academic_year_id=term["academic_year_id"], form_id=form_id, **extra)
+
+
+def preview(cur, term: dict, form_id=None) -> dict:
+    rows = fetch_all(cur, f"""
+        SELECT c.form_id, f.name AS form_name,
+               COUNT(*) AS students_total,
+               COUNT(*) FILTER (WHERE NOT c.billed AND c.amount IS NOT NULL) AS to_bill,
+               COUNT(*) FILTER (WHERE c.billed) AS already_billed,
+               COUNT(*) FILTER (WHERE NOT c.billed AND c.amount IS NULL) AS unpriced,
+               COALESCE(SUM(c.amount) FILTER (WHERE NOT c.billed), 0) AS total_amount
+        FROM ({candidates_query(form_id)}) c
+        JOIN forms f ON f.id = c.form_id
+        GROUP BY c.form_id, f.name, f.display_order
+        ORDER BY f.display_order
+    """, _params(term, form_id))
+    forms = [dict(r, form_id=str(r["form_id"])) for r in rows]
+    out = {"academic_year_id": str(term["academic_year_id"]), "term_id": str(term["id"]), "forms": forms}
+    for k in ("students_total", "to_bill", "already_billed", "unpriced", "total_amount"):
+        out[k] = sum(r[k] for r in rows)
+    return out
+
+
+def run(cur, term: dict, form_id, due_date, user_id: str) -> dict:
+    """Bill the term in one statement and return the ``billing_runs`` row."""
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"billing_run:{term['id']}",))
+    counts = preview(cur, term, form_id)
+    row = fetch_one(cur, """
+        INSERT INTO billing_runs (academic_year_id, term_id, form_id, due_date, students_total, already_billed,
+                                  unpriced, created_by)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """, (term["academic_year_id"], term["id"], form_id, due_date, counts["students_total"],
+          counts["already_billed"], counts["unpriced"], user_id))
+    created = fetch_one(cur, f"""
+        WITH inserted AS (
+            INSERT INTO invoices (student_id, academic_year_id, term_id, form_id, amount, due_date, billing_run_id)
+            SELECT c.student_id, %(academic_year_id)s, %(term_id)s, c.form_id, c.amount, %(due_date)s, %(run_id)s
+            FROM ({candidates_query(form_id)}) c
+            WHERE NOT c.billed AND c.amount IS NOT NULL
+            ON CONFLICT (student_id, term_id) WHERE billing_run_id IS NOT NULL DO NOTHING
+            RETURNING amount
+        )
+        SELECT COUNT(*) AS n, COALESCE(SUM(amount), 0) AS total FROM inserted
+    """, _params(term, form_id, due_date=due_date, run_id=row["id"]))
+    return fetch_one(cur, """
+        UPDATE billing_runs SET invoices_created = %s, total_amount = %s WHERE id = %s
+        RETURNING *
+    """, (created["n"], created["total"], row["id"]))
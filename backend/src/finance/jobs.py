@@ -0,0 +1,38 @@
+"""Scheduled finance jobs (see ``src/scheduler.py``)."""
+from ..db_async import get_async_cursor, fetch_one
+from .. import scheduler
+
+OVERDUE_BATCH = 5000
+
+
+@scheduler.job("finance.mark_overdue", "15 0 * * *")
+async def mark_overdue():
+    """Flag unpaid invoices past their due date, a batch per transaction."""
+    total = 0
+    while True:
+        async with get_async_cursor() as cur:
+            row = await fetch_one(cur, """
+                WITH batch AS (
+                    SELECT id FROM invoices
+                    WHERE status IN ('PENDING', 'PARTIAL') AND due_date < CURRENT_DATE AND amount > amount_paid
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ), updated AS (
+                    UPDATE invoices i SET status = 'OVERDUE', updated_at = NOW()
+                    FROM batch WHERE i.id = batch.id
+                    RETURNING 1
+                )
+                SELECT COUNT(*) AS n FROM updated
+            """, (OVERDUE_BATCH,))
+        total += row["n"]
+        if row["n"] < OVERDUE_BATCH:
+            return {"invoices": total}
+
+
+@scheduler.job("finance.refresh_ledger", "30 1 * * *", lease_seconds=3600)
+async def refresh_ledger():
+    """Recompute balances and rollups from invoices and payments, correcting any drift."""
+    async with get_async_cursor() as cur:
+        await cur.execute("SELECT rebuild_finance_ledger()")
+        row = await fetch_one(cur, "SELECT COUNT(*) AS n FROM student_balances")
+    return {"student_balances": row["n"]}
@@ -1,14 +1,32 @@
 from typing import Optional
 from datetime import date
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from pydantic import BaseModel
 
+from .. import refdata
 from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles
+from ..auth import require_roles, ensure_student_access
+from ..exports import FORMATS, export_response
+from ..http_cache import cache_policy, table_version
+from ..ids import ids_or_404
+from ..pagination import Keyset, Page, SortKey, optional_page_params, page_params, paginate
+from . import billing, statements
 
 router = APIRouter(prefix="/finance", tags=["finance"])
 
+INVOICES_NEWEST_FIRST = Keyset(
+    "invoices",
+    SortKey("i.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("i.id", "uuid", "id", desc=True),
+)
+
+BILLING_RUNS_NEWEST_FIRST = Keyset(
+    "billing_runs",
+    SortKey("r.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("r.id", "uuid", "id", desc=True),
+)
+
 
 class CreateInvoiceBody(BaseModel):
     student_id: str
@@ -25,14 +43,21 @@ class RecordPaymentBody(BaseModel):
     reference: Optional[str] = None
 
 
+class BillingRunBody(BaseModel):
+    term_id: str
+    form_id: Optional[str] = None  # bill one form only
+    due_date: Optional[date] = None  # defaults to the term's start date
+    dry_run: bool = False
+
+
 @router.get("/fee-structures")
 def list_fee_structures(
     academic_year_id: Optional[str] = Query(None),
     form_id: Optional[str] = Query(None),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER"])),
 ):
+    ay = academic_year_id or refdata.current_academic_year_id()
     with get_cursor() as cur:
-        ay = academic_year_id or _current_ay_id(cur)
         q = "SELECT id, academic_year_id, form_id, stream_id, amount, description FROM fee_structures WHERE academic_year_id = %s"
         params = [ay]
         if form_id:
@@ -42,26 +67,23 @@ def list_fee_structures(
         return [dict(r, id=str(r["id"]), academic_year_id=str(r["academic_year_id"]), form_id=str(r["form_id"]), stream_id=str(r["stream_id"]) if r.get("stream_id") else None) for r in cur.fetchall()]
 
 
-def _current_ay_id(cur):
-    r = fetch_one(cur, "SELECT id FROM academic_years WHERE is_current = true LIMIT 1")
-    return str(r["id"]) if r else None
-
-
-@router.get("/invoices")
+@router.get("/invoices", dependencies=[cache_policy(
+    version=table_version("invoices", "payments", "students", "academic_years"))])
 def list_invoices(
     student_id: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
+    page: Page = Depends(optional_page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER", "STUDENT", "PARENT"])),
 ):
     if current["role"] == "STUDENT":
         student_id = current.get("student_id")
         if not student_id:
             raise HTTPException(status_code=403)
-    if current["role"] == "PARENT":
-        student_id = None  # could filter by linked students
+    if student_id:
+        ensure_student_access(current, student_id)
     with get_cursor() as cur:
         q = """
-            SELECT i.id, i.student_id, i.academic_year_id, i.term_id, i.amount, i.due_date, i.status, i.created_at,
+            SELECT i.id, i.student_id, i.academic_year_id, i.term_id, i.amount, i.amount_paid, i.due_date, i.status, i.created_at,
                    s.first_name, s.last_name, ay.name AS academic_year_name
             FROM invoices i
             JOIN students s ON s.id = i.student_id
@@ -72,16 +94,20 @@ def list_invoices(
         if student_id:
             q += " AND i.student_id = %s"
             params.append(student_id)
+        elif current["role"] == "PARENT":
+            q += " AND i.student_id = ANY(%s::uuid[])"
+            params.append(list(current["student_ids"]))
         if status:
             q += " AND i.status = %s"
             params.append(status)
-        q += " ORDER BY i.created_at DESC"
-        cur.execute(q, params)
-        rows = cur.fetchall()
+        tail, tail_params = INVOICES_NEWEST_FIRST.clause(page)
+        cur.execute(q + tail, params + tail_params)
+        rows = paginate(page, INVOICES_NEWEST_FIRST, cur.fetchall())
         return [dict(r, id=str(r["id"]), student_id=str(r["student_id"]), academic_year_id=str(r["academic_year_id"]), term_id=str(r["term_id"]) if r.get("term_id") else None) for r in rows]
 
 
-@router.get("/invoices/{invoice_id}")
+@router.get("/invoices/{invoice_id}", dependencies=[cache_policy(
+    version=table_version("invoices", "payments", "students", "academic_years", "terms"))])
 def get_invoice(
     invoice_id: str,
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER", "STUDENT", "PARENT"])),
@@ -97,18 +123,13 @@ def get_invoice(
         """, (invoice_id,))
         if not row:
             raise HTTPException(status_code=404)
-        if current["role"] == "STUDENT" and str(row["student_id"]) != current.get("student_id"):
-            raise HTTPException(status_code=403)
-        if current["role"] == "PARENT":
-            cur.execute("SELECT 1 FROM parent_student_links WHERE parent_id = (SELECT id FROM parents WHERE user_id = %s) AND student_id = %s",
-                        (current["id"], row["student_id"]))
-            if not cur.fetchone():
-                raise HTTPException(status_code=403)
+        ensure_student_access(current, str(row["student_id"]))
         out = dict(row)
         out["id"] = str(out["id"])
         out["student_id"] = str(out["student_id"])
         out["academic_year_id"] = str(out["academic_year_id"])
         out["term_id"] = str(out["term_id"]) if out.get("term_id") else None
+        out["form_id"] = str(out["form_id"]) if out.get("form_id") else None
         cur.execute("SELECT id, amount, payment_date, payment_method, reference FROM payments WHERE invoice_id = %s", (invoice_id,))
         out["payments"] = [dict(p, id=str(p["id"])) for p in cur.fetchall()]
         return out
@@ -136,36 +157,128 @@ def record_payment(
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER"])),
 ):
     with get_cursor() as cur:
+        # amount_paid, status and the ledger are maintained by triggers (migration 0008)
         cur.execute("INSERT INTO payments (invoice_id, amount, payment_date, payment_method, reference, recorded_by) VALUES (%s, %s, %s, %s, %s, %s)",
                     (invoice_id, body.amount, body.payment_date, body.payment_method, body.reference, current["id"]))
-        cur.execute("""
-            WITH tot AS (SELECT COALESCE(SUM(amount), 0) AS paid FROM payments WHERE invoice_id = %s)
-            UPDATE invoices SET status = CASE WHEN (SELECT paid FROM tot) >= amount THEN 'PAID' WHEN (SELECT paid FROM tot) > 0 THEN 'PARTIAL' ELSE status END, updated_at = NOW()
-            WHERE id = %s
-        """, (invoice_id, invoice_id))
-    return {"ok": True}
+        row = fetch_one(cur, "SELECT amount_paid, status FROM invoices WHERE id = %s", (invoice_id,))
+    return {"ok": True, "amount_paid": row["amount_paid"], "status": row["status"]}
+
+
+def _billing_run_out(row):
+    return dict(row, id=str(row["id"]), academic_year_id=str(row["academic_year_id"]), term_id=str(row["term_id"]),
+                form_id=str(row["form_id"]) if row.get("form_id") else None,
+                created_by=str(row["created_by"]) if row.get("created_by") else None)
+
+
+@router.post("/billing-runs")
+def create_billing_run(
+    body: BillingRunBody,
+    current=Depends(require_roles(["SUPER_ADMIN", "FINANCE_OFFICER"])),
+):
+    """Invoice every enrolled student for a term from the fee structures; ``dry_run`` only previews."""
+    with get_cursor(commit=not body.dry_run) as cur:
+        term = billing.get_term(cur, body.term_id)
+        if body.dry_run:
+            return dict(billing.preview(cur, term, body.form_id), dry_run=True)
+        row = billing.run(cur, term, body.form_id, body.due_date or term["start_date"], current["id"])
+    return dict(_billing_run_out(row), dry_run=False)
+
+
+@router.get("/billing-runs")
+def list_billing_runs(
+    term_id: Optional[str] = Query(None),
+    page: Page = Depends(page_params),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER"])),
+):
+    q = "SELECT r.* FROM billing_runs r WHERE 1=1"
+    params = []
+    if term_id:
+        q += " AND r.term_id = %s"
+        params.append(term_id)
+    tail, tail_params = BILLING_RUNS_NEWEST_FIRST.clause(page)
+    with get_cursor(commit=False) as cur:
+        rows = fetch_all(cur, q + tail, params + tail_params)
+    return [_billing_run_out(r) for r in paginate(page, BILLING_RUNS_NEWEST_FIRST, rows)]
+
+
+@router.get("/billing-runs/{run_id}")
+def get_billing_run(
+    run_id: str,
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER"])),
+):
+    ids_or_404(run_id, detail="Billing run not found")
+    with get_cursor(commit=False) as cur:
+        row = fetch_one(cur, "SELECT * FROM billing_runs WHERE id = %s", (run_id,))
+    if not row:
+        raise HTTPException(status_code=404)
+    return _billing_run_out(row)
+
+
+@router.post("/statements/import")
+def import_statement(
+    file: UploadFile = File(...),
+    payment_method: str = Query("BANK_TRANSFER", max_length=50),
+    dry_run: bool = Query(False),
+    current=Depends(require_roles(["SUPER_ADMIN", "FINANCE_OFFICER"])),
+):
+    """Record a bank or EcoCash statement (CSV, OFX or MT940) as payments; unmatched lines are reported."""
+    try:
+        lines = statements.read_statement(file.file, file.filename)
+        with get_cursor(commit=not dry_run) as cur:
+            lines, imported = statements.load_imported(cur, lines)
+            index = statements.load_index(cur)
+            payments, unmatched, skipped = statements.match_lines(lines, index, imported)
+            recorded = statements.insert_payments(cur, payments, payment_method, current["id"])
+    except statements.StatementError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Statement is not UTF-8 text")
+    return {
+        "ok": not unmatched,
+        "dry_run": dry_run,
+        "summary": {
+            "lines": len(lines),
+            "matched": len({p.row for p in payments}),
+            "payments": recorded,
+            "amount": sum((p.amount for p in payments), Decimal(0)),
+            "invoices": len({p.invoice_id for p in payments}),
+            "skipped": skipped,
+            "unmatched": len(unmatched),
+        },
+        "unmatched": unmatched,
+    }
+
+
+DEBTORS_SQL = """
+    SELECT b.student_id, s.first_name, s.last_name,
+           b.invoiced AS total_invoiced, b.paid AS total_paid, b.balance
+    FROM student_balances b
+    JOIN students s ON s.id = b.student_id
+    WHERE b.academic_year_id = %s AND b.balance > 0
+    ORDER BY b.balance DESC
+"""
+
+# Breakdowns of /summary: (output field, key column, label column, join)
+SUMMARY_GROUPS = {
+    "form": ("form_id", "r.form_id", "f.name", "LEFT JOIN forms f ON f.id = r.form_id"),
+    "term": ("term_id", "r.term_id", "t.name", "LEFT JOIN terms t ON t.id = r.term_id"),
+    "status": ("status", "r.status", "r.status", ""),
+}
 
 
 @router.get("/debtors")
 def list_debtors(
     academic_year_id: Optional[str] = Query(None),
+    format: str = Query("json", regex=FORMATS),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER"])),
 ):
+    ay = academic_year_id or refdata.current_academic_year_id()
+    if format != "json":
+        return export_response(format, DEBTORS_SQL, (ay,),
+                               ["student_id", "first_name", "last_name", "total_invoiced", "total_paid", "balance"],
+                               "debtors")
     with get_cursor() as cur:
-        ay = academic_year_id or _current_ay_id(cur)
-        cur.execute("""
-            SELECT i.student_id, s.first_name, s.last_name,
-                   SUM(i.amount) AS total_invoiced,
-                   COALESCE(SUM(p.amount), 0) AS total_paid,
-                   SUM(i.amount) - COALESCE(SUM(p.amount), 0) AS balance
-            FROM invoices i
-            JOIN students s ON s.id = i.student_id
-            LEFT JOIN payments p ON p.invoice_id = i.id
-            WHERE i.academic_year_id = %s
-            GROUP BY i.student_id, s.first_name, s.last_name
-            HAVING SUM(i.amount) > COALESCE(SUM(p.amount), 0)
-            ORDER BY balance DESC
-        """, (ay,))
+        cur.execute(DEBTORS_SQL, (ay,))
         rows = cur.fetchall()
         return [dict(r, student_id=str(r["student_id"])) for r in rows]
 
@@ -173,12 +286,31 @@ def list_debtors(
 @router.get("/summary")
 def financial_summary(
     academic_year_id: Optional[str] = Query(None),
+    by: Optional[str] = Query(None, regex="^(form|term|status)$"),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER"])),
 ):
+    """Year totals from ``finance_rollups``; ``by`` adds a breakdown per form, term or status."""
+    ay = academic_year_id or refdata.current_academic_year_id()
+    field, key, label, join = SUMMARY_GROUPS[by or "status"]
     with get_cursor() as cur:
-        ay = academic_year_id or _current_ay_id(cur)
-        cur.execute("SELECT COALESCE(SUM(amount), 0) AS total_invoiced FROM invoices WHERE academic_year_id = %s", (ay,))
-        inv = cur.fetchone()
-        cur.execute("SELECT COALESCE(SUM(p.amount), 0) AS total_paid FROM payments p JOIN invoices i ON i.id = p.invoice_id WHERE i.academic_year_id = %s", (ay,))
-        paid = cur.fetchone()
-        return {"academic_year_id": ay, "total_invoiced": float(inv["total_invoiced"]), "total_paid": float(paid["total_paid"]), "outstanding": float(inv["total_invoiced"]) - float(paid["total_paid"])}
+        rows = fetch_all(cur, f"""
+            SELECT {key} AS key, {label} AS name, SUM(r.invoiced) AS total_invoiced, SUM(r.paid) AS total_paid,
+                   SUM(r.invoice_count) AS invoice_count
+            FROM finance_rollups r {join}
+            WHERE r.academic_year_id = %s
+            GROUP BY {key}, {label}
+            ORDER BY {label}
+        """, (ay,))
+    total_invoiced = sum(float(r["total_invoiced"]) for r in rows)
+    total_paid = sum(float(r["total_paid"]) for r in rows)
+    out = {"academic_year_id": ay, "total_invoiced": total_invoiced, "total_paid": total_paid, "outstanding": total_invoiced - total_paid}
+    if by:
+        out["groups"] = [{
+            field: str(r["key"]) if r["key"] is not None else None,
+            "name": r["name"],
+            "total_invoiced": float(r["total_invoiced"]),
+            "total_paid": float(r["total_paid"]),
+            "outstanding": float(r["total_invoiced"]) - float(r["total_paid"]),
+            "invoice_count": int(r["invoice_count"]),
+        } for r in rows]
+    return out
@@ -0,0 +1,291 @@
+"""Bank and EcoCash statement parsing and matching for bulk payment imports.
+
+Readers stream a statement file (CSV, OFX or MT940) as ``(row, date,
+amount, reference, description)`` tuples of raw values. Matching is pure
+(no DB) against an ``InvoiceIndex`` of open invoices loaded once per import:
+
+    invoice id      anywhere in the reference or description pays that invoice
+    student number  (or student id) pays the student's open invoices, oldest first
+
+An amount beyond what the student owes stays on their newest invoice as a
+credit. Lines whose bank reference was already imported are skipped, so a
+statement can be uploaded again after a partial import. Every accepted
+payment is then written with one multi-row INSERT; the ledger triggers
+(migration 0008) update ``amount_paid`` and the status of all affected
+invoices in a single UPDATE ... FROM.
+"""
+import codecs
+import csv
+import re
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from psycopg2.extras import execute_values
+
+DATE_COLUMNS = ("date", "transaction date", "value date", "posting date", "completion time", "trans date")
+AMOUNT_COLUMNS = ("amount", "credit", "credit amount", "paid in", "deposit", "deposits")
+REFERENCE_COLUMNS = ("reference", "ref", "receipt no.", "receipt no", "receipt", "transaction id", "transaction reference")
+DESCRIPTION_COLUMNS = ("description", "details", "narrative", "particulars", "memo", "remarks")
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%Y%m%d", "%d %b %Y", "%d-%b-%Y", "%d %B %Y")
+TOKEN = re.compile(r"[A-Za-z0-9][A-Za-z0-9/-]*[A-Za-z0-9]|[A-Za-z0-9]")
+OFX_TAG = re.compile(r"<(/?[A-Za-z0-9.]+)>([^<\r\n]*)")
+MT940_TRANSACTION = re.compile(r"^(\d{6})(\d{4})?(RC|RD|C|D)[A-Z]?(\d+,\d*)[NFS][A-Z0-9]{3}([^/]*)(?://(.*))?")
+MAX_REFERENCE = 100
+
+Line = namedtuple("Line", "row date amount reference description")
+Payment = namedtuple("Payment", "row invoice_id amount date reference")
+
+
+class StatementError(ValueError):
+    """The statement as a whole is unreadable (bad header, unsupported format)."""
+
+
+# ========== Readers ==========
+
+def _column(names, candidates):
+    return next((names.index(c) for c in candidates if c in names), None)
+
+
+def read_csv(binary_file):
+    table = csv.reader(codecs.iterdecode(binary_file, "utf-8-sig"))
+    try:
+        header = next(table)
+    except StopIteration:
+        raise StatementError("Statement is empty")
+    names = [h.strip().lower() for h in header]
+    cols = [_column(names, c) for c in (DATE_COLUMNS, AMOUNT_COLUMNS, REFERENCE_COLUMNS, DESCRIPTION_COLUMNS)]
+    if cols[0] is None or cols[1] is None:
+        raise StatementError("Statement needs a date column and an amount (or credit) column")
+    if cols[2] is None and cols[3] is None:
+        raise StatementError("Statement needs a reference or description column")
+    width = max(c for c in cols if c is not None) + 1
+    for n, cells in enumerate(table, start=2):
+        if not cells or all(not c.strip() for c in cells):
+            continue
+        cells = cells + [""] * (width - len(cells))
+        yield Line(n, cells[cols[0]], cells[cols[1]],
+                   cells[cols[2]] if cols[2] is not None else "",
+                   cells[cols[3]] if cols[3] is not None else "")
+
+
+def read_ofx(binary_file):
+    """OFX 1.x (SGML) or 2.x (XML): one line per ``<STMTTRN>`` block."""
+    block, n = None, 0
+    for text in codecs.iterdecode(binary_file, "utf-8-sig"):
+        for tag, value in OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                block, n = {}, n + 1
+            elif tag == "/STMTTRN" and block is not None:
+                yield Line(n, block.get("DTPOSTED", "")[:8], block.get("TRNAMT", ""),
+                           block.get("FITID", ""), " ".join(filter(None, (block.get("NAME"), block.get("MEMO")))))
+                block = None
+            elif block is not None and not tag.startswith("/"):
+                block[tag] = value.strip()
+
+
+def read_mt940(binary_file):
+    """SWIFT MT940: a ``:61:`` transaction followed by its ``:86:`` narrative."""
+    pending, narrative = None, None
+
+    def flush():
+        if pending is None:
+            return None
+        return pending._replace(description=" ".join(narrative or []))
+
+    for n, raw in enumerate(codecs.iterdecode(binary_file, "utf-8-sig"), start=1):
+        text = raw.rstrip("\r\n")
+        if text.startswith(":61:"):
+            line = flush()
+            if line:
+                yield line
+            m = MT940_TRANSACTION.match(text[4:])
+            if not m:
+                pending, narrative = Line(n, "", "", "", ""), []
+                continue
+            value_date, _, mark, amount, customer_ref, bank_ref = m.groups()
+            amount = amount.replace(",", ".")
+            customer_ref = "" if customer_ref.strip() == "NONREF" else customer_ref
+            pending = Line(n, "20" + value_date, amount if mark in ("C", "RD") else "-" + amount,
+                           (customer_ref or "").strip() or (bank_ref or "").strip(), "")
+            narrative = [(bank_ref or "").strip()] if customer_ref and bank_ref else []
+        elif text.startswith(":86:") and pending is not None:
+            narrative.append(text[4:].strip())
+        elif text.startswith(":") or text.startswith("-"):
+            line = flush()
+            if line:
+                yield line
+            pending, narrative = None, None
+        elif narrative is not None and pending is not None and text.strip():
+            narrative.append(text.strip())  # :86: continuation lines
+    line = flush()
+    if line:
+        yield line
+
+
+def read_statement(binary_file, filename):
+    name = (filename or "").lower()
+    if name.endswith((".ofx", ".qfx")):
+        return read_ofx(binary_file)
+    if name.endswith((".sta", ".mt940", ".940")):
+        return read_mt940(binary_file)
+    if name.endswith(".csv") or not name:
+        return read_csv(binary_file)
+    raise StatementError("Unsupported file type; upload .csv, .ofx or .mt940/.sta")
+
+
+# ========== Parsing ==========
+
+def parse_date(raw):
+    text = str(raw or "").strip()
+    if not text:
+        return None
+    for candidate in (text, text.split(" ")[0], text.split("T")[0]):
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_amount(raw):
+    """``"USD 1,250.00"``, ``"1.250,00"``, ``"(40.00)"`` and ``"40.00-"`` style amounts."""
+    text = str(raw or "").strip()
+    negative = text.startswith("-") or text.endswith("-") or (text.startswith("(") and text.endswith(")"))
+    text = re.sub(r"[^0-9.,]", "", text)
+    # The last separator is the decimal point when one or two digits follow it
+    last = max(text.rfind("."), text.rfind(","))
+    whole, frac = (text[:last], text[last + 1:]) if last >= 0 and len(text) - last - 1 in (1, 2) else (text, "")
+    try:
+        amount = Decimal(re.sub(r"[^0-9]", "", whole) + ("." + frac if frac else ""))
+    except InvalidOperation:
+        return None
+    return -amount if negative else amount
+
+
+def tokens(*texts):
+    return [t.upper() for text in texts for t in TOKEN.findall(text or "")]
+
+
+# ========== Matching ==========
+
+class InvoiceIndex:
+    """Open invoices by id and by student number / student id, oldest first per student."""
+
+    def __init__(self, rows):
+        self.outstanding = {}
+        self.invoices = {}  # student id -> invoice ids, oldest first
+        self.students = {}  # student number or id -> student id
+        for r in rows:
+            inv, sid = str(r["id"]).upper(), str(r["student_id"]).upper()
+            self.outstanding[inv] = Decimal(r["outstanding"])
+            self.invoices.setdefault(sid, []).append(inv)
+            self.students[sid] = sid
+            if r.get("student_number"):
+                self.students[str(r["student_number"]).strip().upper()] = sid
+
+    def named(self, words):
+        """Ids of the distinct students whose number or id appears in ``words``."""
+        return list(dict.fromkeys(self.students[w] for w in words if w in self.students))
+
+    def allocate(self, invoices, amount):
+        """Split ``amount`` over ``invoices`` oldest first; the rest stays on the newest as credit."""
+        parts, left = [], amount
+        for inv in invoices:
+            owed = self.outstanding[inv]
+            if owed <= 0 or left <= 0:
+                continue
+            take = min(owed, left)
+            parts.append((inv, take))
+            self.outstanding[inv] = owed - take
+            left -= take
+        if left > 0:
+            inv = invoices[-1]
+            if parts and parts[-1][0] == inv:
+                parts[-1] = (inv, parts[-1][1] + left)
+            else:
+                parts.append((inv, left))
+            self.outstanding[inv] -= left
+        return parts
+
+
+def match_lines(lines, index, imported_refs):
+    """Turn statement lines into payments against ``index``.
+
+    ``imported_refs`` holds ``(reference, date)`` pairs already recorded as
+    payments. Returns ``(payments, unmatched, skipped)``: unmatched lines
+    carry an error, skipped counts debits and previously imported lines.
+    """
+    payments, unmatched, skipped, seen = [], [], 0, set()
+    for line in lines:
+        reference = (line.reference or "").strip()[:MAX_REFERENCE]
+        report = {"row": line.row, "reference": reference, "description": line.description, "amount": line.amount}
+        day = parse_date(line.date)
+        amount = parse_amount(line.amount)
+        if day is None:
+            unmatched.append(dict(report, error=f"Date '{line.date}' not recognised"))
+            continue
+        if amount is None and not str(line.amount or "").strip():
+            skipped += 1  # blank credit column: a debit line
+            continue
+        if amount is None:
+            unmatched.append(dict(report, error=f"Amount '{line.amount}' is not a number"))
+            continue
+        if amount <= 0:
+            skipped += 1  # debits and charges are not fee payments
+            continue
+        if reference and ((reference, day) in imported_refs or (reference, day) in seen):
+            skipped += 1
+            continue
+        words = tokens(line.reference, line.description)
+        invoice = next((w for w in words if w in index.outstanding), None)
+        if invoice:
+            parts = index.allocate([invoice], amount)
+        else:
+            students = index.named(words)
+            if not students:
+                unmatched.append(dict(report, error="No open invoice or student number found"))
+                continue
+            if len(students) > 1:
+                unmatched.append(dict(report, error="Matches more than one student"))
+                continue
+            parts = index.allocate(index.invoices[students[0]], amount)
+        if reference:
+            seen.add((reference, day))
+        payments.extend(Payment(line.row, inv, part, day, reference or None) for inv, part in parts)
+    return payments, unmatched, skipped
+
+
+# ========== Database ==========
+
+def load_index(cur):
+    cur.execute("""
+        SELECT i.id, i.student_id, s.student_number, i.amount - i.amount_paid AS outstanding
+        FROM invoices i
+        JOIN students s ON s.id = i.student_id
+        WHERE i.amount > i.amount_paid
+        ORDER BY i.student_id, i.due_date NULLS LAST, i.created_at
+    """)
+    return InvoiceIndex(cur.fetchall())
+
+
+def load_imported(cur, lines):
+    """Buffer the statement and look up which of its references are already payments."""
+    lines = list(lines)
+    refs = sorted({(l.reference or "").strip()[:MAX_REFERENCE] for l in lines} - {""})
+    cur.execute("SELECT DISTINCT reference, payment_date FROM payments WHERE reference = ANY(%s)", (refs,))
+    return lines, {(r["reference"], r["payment_date"]) for r in cur.fetchall()}
+
+
+def insert_payments(cur, payments, method, recorded_by):
+    if not payments:
+        return 0
+    execute_values(cur, """
+        INSERT INTO payments (invoice_id, amount, payment_date, payment_method, reference, recorded_by)
+        VALUES %s
+    """, [(p.invoice_id.lower(), p.amount, p.date, method, p.reference, recorded_by) for p in payments],
+        template="(%s::uuid, %s, %s, %s, %s, %s::uuid)", page_size=len(payments))
+    return len(payments)
@@ -0,0 +1,145 @@
+"""Conditional GETs: ETags, 304s and per-role Cache-Control.
+
+Routes opt in with ``dependencies=[cache_policy(...)]``. Without a
+``version`` the middleware hashes the rendered body into a strong ETag, which
+saves bandwidth but not work. With ``version`` (e.g. ``table_version(...)``)
+the ETag is derived before the handler runs and a matching If-None-Match is
+answered with 304 without touching the handler at all.
+
+Anonymous requests to ``public`` routes may be stored by shared caches;
+everything else is ``private`` with ``Vary: Authorization``.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from .db import get_cursor
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return any(c.removeprefix("W/") == etag.removeprefix("W/") for c in candidates)
+
+
+def cache_headers(etag: str, max_age: int, private: bool) -> dict:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"{'private' if private else 'public'}, max-age={max_age}",
+    }
+    if private:
+        headers["Vary"] = "Authorization"
+    return headers
+
+
+def conditional(request: Request, response: Response, etag: str, max_age: int = 60, private: bool = False) -> None:
+    """Set validator headers on ``response``; raise 304 if the client copy is current."""
+    headers = cache_headers(etag, max_age, private)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    max_age: int = 0
+    public: bool = False
+    version: Optional[Callable[[Request], Optional[str]]] = None
+
+    def is_private(self, request: Request) -> bool:
+        return not self.public or "authorization" in request.headers
+
+
+def _strong_etag(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode())
+        h.update(b"\0")
+    return f'"{h.hexdigest()[:32]}"'
+
+
+def cache_policy(max_age: int = 0, public: bool = False, version: Optional[Callable[[Request], Optional[str]]] = None):
+    """Declare how a GET route may be cached; use as ``dependencies=[cache_policy(...)]``.
+
+    ``version(request)`` runs in the threadpool and returns a cheap string
+    that changes whenever the response would (or None to fall back to body
+    hashing). The ETag also covers the URL and the Authorization header, so
+    a validator issued to one user is meaningless to another.
+    """
+    policy = CachePolicy(max_age=max_age, public=public, version=version)
+
+    async def _declare(request: Request) -> None:
+        request.state.cache_policy = policy
+        if policy.version is None or request.method not in ("GET", "HEAD"):
+            return
+        v = await run_in_threadpool(policy.version, request)
+        if v is None:
+            return
+        etag = _strong_etag(request.url.path, request.url.query, request.headers.get("authorization", ""), v)
+        request.state.etag = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=cache_headers(etag, policy.max_age, policy.is_private(request)))
+
+    return Depends(_declare)
+
+
+def table_version(*tables: str) -> Callable[[Request], Optional[str]]:
+    """Version callback reading the trigger-bumped ``table_version_<table>`` sequences (migration 0019).
+
+    List every table the route's queries read. A writer bumps its sequence
+    before committing and holds a shared advisory lock on the table until
+    the commit is visible, so the versions only count once that lock is
+    free: then the handler, querying afterwards, sees at least those rows.
+    While a writer holds it this returns None and the body is hashed.
+    """
+    tables = sorted(tables)
+
+    def _version(request: Request) -> Optional[str]:
+        with get_cursor(commit=False) as cur:
+            cur.execute("""
+                SELECT t AS table_name, COALESCE(pg_sequence_last_value(format('table_version_%%s', t)::regclass), 0) AS version
+                FROM unnest(%s::text[]) t
+            """, (tables,))
+            rows = cur.fetchall()
+            # Only after reading the versions: a free lock means every bump read above is committed
+            cur.execute("""
+                SELECT bool_and(CASE WHEN pg_try_advisory_lock(hashtext('table_version'), hashtext(t))
+                                     THEN pg_advisory_unlock(hashtext('table_version'), hashtext(t))
+                                     ELSE false END) AS settled
+                FROM unnest(%s::text[]) t
+            """, (tables,))
+            settled = cur.fetchone()["settled"]
+        if not rows or not settled:
+            return None
+        return ",".join(f"{r['table_name']}:{r['version']}" for r in rows)
+
+    return _version
+
+
+async def http_cache_middleware(request: Request, call_next):
+    response = await call_next(request)
+    policy = getattr(request.state, "cache_policy", None)
+    if policy is None or request.method not in ("GET", "HEAD") or response.status_code != 200:
+        return response
+    if "etag" in response.headers:
+        # Handler already set validators (e.g. via conditional())
+        return response
+    private = policy.is_private(request)
+    etag = getattr(request.state, "etag", None)
+    if etag is None:
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = _strong_etag(body)
+        response = Response(content=body, status_code=response.status_code,
+                            headers=dict(response.headers), media_type=response.media_type)
+    headers = cache_headers(etag, policy.max_age, private)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,21 @@
+"""Row ids taken from the path or query string.
+
+An id that is not a UUID cannot name a row, but passed to Postgres it fails
+the cast and surfaces as a 500. Routes check their ids up front and answer
+404, the same as for an id that matches nothing.
+"""
+import uuid
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def ids_or_404(*ids: Optional[str], detail: str = "Not found") -> None:
+    """Raise 404 unless every id given (None is skipped) is a UUID."""
+    for value in ids:
+        if value is None:
+            continue
+        try:
+            uuid.UUID(str(value))
+        except ValueError:
+            raise HTTPException(status_code=404, detail=detail)
@@ -2,11 +2,23 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 
-from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles
+from ..db import get_cursor, fetch_all
+from ..auth import require_roles, ensure_student_access, require_teacher_id
+from ..pagination import Keyset, Page, SortKey, optional_page_params, paginate
 
 router = APIRouter(prefix="/learning", tags=["learning"])
 
+MATERIALS_NEWEST_FIRST = Keyset(
+    "learning_materials",
+    SortKey("lm.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("lm.id", "uuid", "id", desc=True),
+)
+LIBRARY_NEWEST_FIRST = Keyset(
+    "library_items",
+    SortKey("created_at", "timestamptz", "created_at", desc=True),
+    SortKey("id", "uuid", "id", desc=True),
+)
+
 
 class CreateMaterialBody(BaseModel):
     class_id: str
@@ -22,12 +34,13 @@ def list_materials(
     class_id: Optional[str] = Query(None),
     subject_id: Optional[str] = Query(None),
     student_id: Optional[str] = Query(None),
+    page: Page = Depends(optional_page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT"])),
 ):
+    tail, tail_params = MATERIALS_NEWEST_FIRST.clause(page)
     with get_cursor() as cur:
         if student_id:
-            if current["role"] == "STUDENT" and current.get("student_id") != student_id:
-                raise HTTPException(status_code=403)
+            ensure_student_access(current, student_id)
             cur.execute("""
                 SELECT lm.id, lm.class_id, lm.subject_id, lm.title, lm.description, lm.file_path, lm.file_name, lm.created_at,
                        sub.name AS subject_name, c.name AS class_name
@@ -36,8 +49,7 @@ def list_materials(
                 JOIN classes c ON c.id = lm.class_id
                 JOIN student_classes sc ON sc.class_id = lm.class_id AND sc.student_id = %s
                 WHERE lm.is_published = true
-                ORDER BY lm.created_at DESC
-            """, (student_id,))
+            """ + tail, [student_id, *tail_params])
         elif class_id:
             cur.execute("""
                 SELECT lm.id, lm.class_id, lm.subject_id, lm.title, lm.description, lm.file_path, lm.file_name, lm.created_at,
@@ -45,8 +57,7 @@ def list_materials(
                 FROM learning_materials lm
                 JOIN subjects sub ON sub.id = lm.subject_id
                 WHERE lm.class_id = %s AND lm.is_published = true
-                ORDER BY lm.created_at DESC
-            """, (class_id,))
+            """ + tail, [class_id, *tail_params])
         else:
             cur.execute("""
                 SELECT lm.id, lm.class_id, lm.subject_id, lm.title, lm.file_name, lm.created_at,
@@ -55,20 +66,18 @@ def list_materials(
                 JOIN subjects sub ON sub.id = lm.subject_id
                 JOIN classes c ON c.id = lm.class_id
                 WHERE lm.is_published = true
-                ORDER BY lm.created_at DESC
-            """)
-        rows = cur.fetchall()
+            """ + tail, tail_params)
+        rows = paginate(page, MATERIALS_NEWEST_FIRST, cur.fetchall())
         return [dict(r, id=str(r["id"]), class_id=str(r["class_id"]), subject_id=str(r["subject_id"])) for r in rows]
 
 
 @router.post("/materials")
 def create_material(
     body: CreateMaterialBody,
-    current=Depends(require_roles(["TEACHER", "ADMIN_STAFF", "SUPER_ADMIN"])),
+    current=Depends(require_roles(["TEACHER"])),
 ):
-    teacher_id = current.get("teacher_id")
+    tid = require_teacher_id(current)
     with get_cursor() as cur:
-        tid = teacher_id or fetch_one(cur, "SELECT id FROM teachers LIMIT 1")["id"]
         cur.execute("""
             INSERT INTO learning_materials (class_id, subject_id, uploaded_by, title, description, file_path, file_name)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
@@ -81,6 +90,7 @@ def create_material(
 @router.get("/library")
 def list_library(
     category: Optional[str] = Query(None),
+    page: Page = Depends(optional_page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT"])),
 ):
     with get_cursor() as cur:
@@ -89,7 +99,7 @@ def list_library(
         if category:
             q += " AND category = %s"
             params.append(category)
-        q += " ORDER BY created_at DESC"
-        cur.execute(q, params)
-        rows = cur.fetchall()
+        tail, tail_params = LIBRARY_NEWEST_FIRST.clause(page)
+        cur.execute(q + tail, params + tail_params)
+        rows = paginate(page, LIBRARY_NEWEST_FIRST, cur.fetchall())
         return [dict(r, id=str(r["id"])) for r in rows]
@@ -1,10 +1,17 @@
+import asyncio
 import logging
 import time
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from .config import get_settings
+from .db import PoolTimeout, close_pool, get_pool, pool_stats
+from .db_async import async_pool_stats, close_async_pool, open_async_pool
+from .http_cache import conditional, http_cache_middleware
+from . import notify, refdata, scheduler
 from .auth.routes import router as auth_router
 from .users.routes import router as users_router
 from .students.routes import router as students_router
@@ -22,6 +29,11 @@ from .reports.routes import router as reports_router
 from .uploads.routes import router as uploads_router
 from .applications.routes import router as applications_router
 from .learning.routes import router as learning_router
+from .reportcards.routes import router as reportcards_router
+from .reportcards import pdf as reportcards_pdf
+from .auth import HashingBusy, password as password_hashing, revocation as token_revocation, throttle as login_throttle
+from .auth.jwt import token_cache_stats
+from .messages import broadcast as message_broadcast, events as message_events
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -47,9 +59,18 @@ async def startup_event():
     logger.info("Verifying Deployment v5: Cleaned Origins (trailing slashes removed)")
     logger.info(f"DEBUG: CORS_ORIGINS = {settings.cors_origins_list}")
     
-    # Verify Database Connection
+    # Connections are opened in the background; a DB outage must not stop startup
+    await open_async_pool()
+    await notify.start()
+    await token_revocation.start()
+    message_broadcast.resume()
+    if settings.scheduler_enabled:
+        scheduler.start()
+
+    # Verify Database Connection (and warm the pool up to db_pool_min_size)
     try:
         from .db import get_cursor
+        await run_in_threadpool(get_pool().fill)
         with get_cursor() as cur:
             cur.execute("SELECT 1")
             cur.fetchone()
@@ -57,6 +78,38 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Database Connection Failed: {e}")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await notify.stop()
+    await token_revocation.stop()
+    await scheduler.shutdown()
+    await message_broadcast.shutdown()
+    await close_async_pool()
+    close_pool()
+    reportcards_pdf.shutdown()
+    password_hashing.shutdown()
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    logger.warning(f"Database pool exhausted: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "2"},
+    )
+
+
+@app.exception_handler(HashingBusy)
+async def hashing_busy_handler(request: Request, exc: HashingBusy):
+    logger.warning(f"Password hashing queue full: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "2"},
+    )
+
 # CORS Configuration
 # Moved before Logging Middleware so Logging is added LAST (runs FIRST)
 origins = settings.cors_origins_list
@@ -69,6 +122,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "Location", "Upload-Offset", "Upload-Length"],
 )
 
 # Manual OPTIONS handler for preflight checks (Fallback)
@@ -77,6 +131,9 @@ async def options_handler(path: str):
     logger.info(f"DEBUG: Handling OPTIONS request for {path}")
     return {}
 
+# ETag / 304 handling for routes declared with http_cache.cache_policy()
+app.middleware("http")(http_cache_middleware)
+
 # Middleware for logging requests
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -116,6 +173,7 @@ app.include_router(reports_router, prefix=API_PREFIX)
 app.include_router(uploads_router, prefix=API_PREFIX)
 app.include_router(applications_router, prefix=API_PREFIX)
 app.include_router(learning_router, prefix=API_PREFIX)
+app.include_router(reportcards_router, prefix=API_PREFIX)
 
 
 @app.get("/")
@@ -123,67 +181,47 @@ def root():
     return {"name": "Ultimate College of Technology ERP API", "docs": "/docs"}
 
 
-@app.get("/api/public/settings")
-def public_settings():
-    from .db import get_cursor, fetch_one
-    with get_cursor() as cur:
-        cur.execute("SELECT key, value FROM institution_settings")
-        rows = cur.fetchall()
-        return {r["key"]: r["value"] for r in rows}
-
-
-@app.get("/api/public/news")
-def public_news():
-    from .db import get_cursor
-    with get_cursor() as cur:
-        cur.execute("SELECT id, title, content, event_date, created_at FROM news_events WHERE is_published = true ORDER BY event_date DESC LIMIT 20")
-        rows = cur.fetchall()
-        return [dict(r, id=str(r["id"])) for r in rows]
+@app.get("/api/health/db")
+def db_health():
+    return {"pool": pool_stats(), "async_pool": async_pool_stats(), "message_streams": message_events.connection_stats(),
+            "password_hashing": password_hashing.hash_pool_stats(), "login_throttle": login_throttle.throttle_stats(),
+            "token_cache": token_cache_stats(), "token_revocations": token_revocation.revocation_stats()}
 
 
-@app.get("/api/public/forms")
-def public_forms():
-    from .db import get_cursor
-    with get_cursor() as cur:
-        cur.execute("SELECT id, name, display_order FROM forms ORDER BY display_order")
-        return [dict(r, id=str(r["id"])) for r in cur.fetchall()]
+@app.get("/api/public/settings")
+def public_settings(request: Request, response: Response):
+    entry = refdata.institution_settings()
+    conditional(request, response, entry.etag, max_age=300)
+    return entry.value
 
 
-@app.get("/api/public/streams")
-def public_streams(form_id: str = None):
-    from .db import get_cursor
-    with get_cursor() as cur:
-        if form_id:
-            cur.execute("SELECT id, name, form_id FROM streams WHERE form_id = %s ORDER BY name", (form_id,))
-        else:
-            cur.execute("SELECT id, name, form_id FROM streams ORDER BY form_id, name")
-        return [dict(r, id=str(r["id"]), form_id=str(r["form_id"])) for r in cur.fetchall()]
+@app.get("/api/public/news")
+def public_news(request: Request, response: Response):
+    entry = refdata.news()
+    conditional(request, response, entry.etag, max_age=60)
+    return entry.value
 
 
 @app.get("/api/public/forms")
-def public_forms():
-    from .db import get_cursor
-    with get_cursor() as cur:
-        cur.execute("SELECT id, name, display_order FROM forms ORDER BY display_order")
-        return [dict(r, id=str(r["id"])) for r in cur.fetchall()]
+def public_forms(request: Request, response: Response):
+    entry = refdata.forms()
+    conditional(request, response, entry.etag, max_age=3600)
+    return entry.value
 
 
 @app.get("/api/public/streams")
-def public_streams(form_id: str = None):
-    from .db import get_cursor
-    with get_cursor() as cur:
-        if form_id:
-            cur.execute("SELECT id, name, form_id FROM streams WHERE form_id = %s ORDER BY name", (form_id,))
-        else:
-            cur.execute("SELECT id, name, form_id FROM streams ORDER BY form_id, name")
-        return [dict(r, id=str(r["id"]), form_id=str(r["form_id"])) for r in cur.fetchall()]
+def public_streams(request: Request, response: Response, form_id: str = None):
+    entry = refdata.streams()
+    conditional(request, response, entry.etag, max_age=3600)
+    if form_id:
+        return [s for s in entry.value if s["form_id"] == form_id]
+    return entry.value
 
 
 # Seed default users (run once after DB schema + seed.sql)
 @app.post("/api/seed/users")
-def seed_users():
-    from .db import get_cursor, fetch_one
-    from .auth import hash_password
+async def seed_users():
+    from .auth import hash_password_async
     defaults = [
         ("superadmin@ultimatecollege.co.zw", "Admin@123", "SUPER_ADMIN"),
         ("admin@ultimatecollege.co.zw", "Admin@123", "ADMIN_STAFF"),
@@ -192,12 +230,20 @@ def seed_users():
         ("parent@ultimatecollege.co.zw", "Parent@123", "PARENT"),
         ("finance@ultimatecollege.co.zw", "Finance@123", "FINANCE_OFFICER"),
     ]
+    # Hash all defaults in parallel in the hashing pool, then write them from a worker thread
+    hashes = await asyncio.gather(*(hash_password_async(password) for _, password, _ in defaults))
+    await run_in_threadpool(_seed_users, [(email, ph, role) for (email, _, role), ph in zip(defaults, hashes)])
+    return {"ok": True, "message": "Default users created or already exist"}
+
+
+def _seed_users(defaults):
+    from .db import get_cursor, fetch_one
+    current_ay = refdata.current_academic_year_id()
     with get_cursor() as cur:
-        for email, password, role in defaults:
+        for email, ph, role in defaults:
             cur.execute("SELECT id FROM users WHERE LOWER(email) = LOWER(%s)", (email,))
             if cur.fetchone():
                 continue
-            ph = hash_password(password)
             cur.execute("INSERT INTO users (email, password_hash, role) VALUES (%s, %s, %s) RETURNING id", (email, ph, role))
             row = cur.fetchone()
             uid = str(row["id"])
@@ -211,13 +257,11 @@ def seed_users():
                     cur.execute("INSERT INTO students (user_id, first_name, last_name, gender) VALUES (%s, 'Default', 'Student', 'Other') RETURNING id", (uid,))
                     sid = cur.fetchone()
                     if sid:
-                        ay = fetch_one(cur, "SELECT id FROM academic_years WHERE is_current = true LIMIT 1")
                         cl = fetch_one(cur, "SELECT id FROM classes LIMIT 1")
-                        if ay and cl:
+                        if current_ay and cl:
                             cur.execute("INSERT INTO student_classes (student_id, class_id, academic_year_id) VALUES (%s, %s, %s)",
-                                        (sid["id"], cl["id"], ay["id"]))
+                                        (sid["id"], cl["id"], current_ay))
             elif role == "PARENT":
                 cur.execute("SELECT id FROM parents WHERE user_id = %s", (uid,))
                 if not cur.fetchone():
                     cur.execute("INSERT INTO parents (user_id, first_name, last_name) VALUES (%s, 'Default', 'Parent')", (uid,))
-    return {"ok": True, "message": "Default users created or already exist"}
@@ -0,0 +1,220 @@
+"""Broadcast messages: resolve a target group in SQL and fan out in batches.
+
+Targets:
+
+    all            every active user
+    role           every active user with ``role``
+    class          students of class ``id``
+    class_parents  parents of the students of class ``id``
+    form           students of form ``id`` in the current academic year
+    form_parents   their parents
+
+``create`` stores a QUEUED ``message_broadcasts`` row and hands it to a
+background task in this worker. The task claims the row, resolves the
+recipients with one query and inserts their ``messages`` rows ``BATCH_SIZE``
+at a time, committing progress with each batch, so ``GET`` on the broadcast
+shows how far it got. Inserts are idempotent per (broadcast, recipient): a
+broadcast left SENDING by a dead worker is re-queued after
+``STALE_SECONDS`` and resumes where it stopped. That check runs at start-up
+and every few minutes from the ``messages.resume_broadcasts`` job, so it
+does not wait for the next restart.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Optional
+
+from fastapi import HTTPException
+
+from ..db_async import get_async_cursor, fetch_one, fetch_all
+from . import events
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+STALE_SECONDS = 300
+ROLES = ("SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT", "FINANCE_OFFICER")
+TARGET_TYPES = ("all", "role", "class", "class_parents", "form", "form_parents")
+
+_CLASS_STUDENT_IDS = "SELECT sc.student_id FROM student_classes sc WHERE sc.class_id = %(target_id)s"
+_FORM_STUDENT_IDS = """
+    SELECT sc.student_id FROM classes c
+    JOIN academic_years ay ON ay.id = c.academic_year_id AND ay.is_current
+    JOIN student_classes sc ON sc.class_id = c.id
+    WHERE c.form_id = %(target_id)s
+"""
+
+
+def _students(student_ids):
+    return f"SELECT s.user_id FROM students s WHERE s.id IN ({student_ids}) AND s.user_id IS NOT NULL"
+
+
+def _parents(student_ids):
+    return f"""
+        SELECT p.user_id FROM parent_student_links psl
+        JOIN parents p ON p.id = psl.parent_id
+        WHERE psl.student_id IN ({student_ids})
+    """
+
+
+RECIPIENTS = {
+    "all": "SELECT u.id AS user_id FROM users u",
+    "role": "SELECT u.id AS user_id FROM users u WHERE u.role = %(target_role)s",
+    "class": _students(_CLASS_STUDENT_IDS),
+    "class_parents": _parents(_CLASS_STUDENT_IDS),
+    "form": _students(_FORM_STUDENT_IDS),
+    "form_parents": _parents(_FORM_STUDENT_IDS),
+}
+
+_tasks = set()
+
+
+def validate_target(target_type: str, target_id: Optional[str], target_role: Optional[str]) -> None:
+    if target_type not in TARGET_TYPES:
+        raise HTTPException(status_code=400, detail=f"target_type must be one of {', '.join(TARGET_TYPES)}")
+    if target_type == "role" and target_role not in ROLES:
+        raise HTTPException(status_code=400, detail=f"target_role must be one of {', '.join(ROLES)}")
+    if target_type in ("class", "class_parents", "form", "form_parents") and not target_id:
+        raise HTTPException(status_code=400, detail="target_id is required for this target")
+    if target_id:
+        # Checked here, not by Postgres: the fan-out runs later in a background task
+        try:
+            uuid.UUID(target_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="target_id must be a UUID")
+
+
+async def authorize(current: dict, target_type: str, target_id: Optional[str]) -> None:
+    """Staff may broadcast to anyone; teachers only to classes they take this year."""
+    if current["role"] in ("SUPER_ADMIN", "ADMIN_STAFF"):
+        return
+    if (current["role"] == "TEACHER" and target_type in ("class", "class_parents")
+            and str(target_id) in current.get("class_ids", ())):
+        return
+    raise HTTPException(status_code=403, detail="Not allowed to broadcast to this group")
+
+
+def recipients_query(target_type: str) -> str:
+    """Distinct active recipient user ids for a target (sender excluded)."""
+    return f"""
+        SELECT DISTINCT r.user_id FROM ({RECIPIENTS[target_type]}) r
+        JOIN users u2 ON u2.id = r.user_id
+        WHERE u2.is_active AND r.user_id <> %(sender_id)s
+        ORDER BY r.user_id
+    """
+
+
+async def count_recipients(sender_id: str, target_type: str, target_id=None, target_role=None) -> int:
+    async with get_async_cursor(commit=False) as cur:
+        row = await fetch_one(cur, f"SELECT COUNT(*) AS n FROM ({recipients_query(target_type)}) x", {
+            "sender_id": sender_id, "target_id": target_id, "target_role": target_role,
+        })
+    return row["n"]
+
+
+async def create(current: dict, target_type: str, target_id: Optional[str], target_role: Optional[str],
+                 subject: Optional[str], body: str) -> dict:
+    async with get_async_cursor() as cur:
+        row = await fetch_one(cur, """
+            INSERT INTO message_broadcasts (sender_id, target_type, target_id, target_role, subject, body)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING *
+        """, (current["id"], target_type, target_id, target_role, subject, body))
+    start(str(row["id"]))
+    return row
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def start(broadcast_id: str) -> None:
+    _spawn(run(broadcast_id))
+
+
+async def run(broadcast_id: str) -> None:
+    async with get_async_cursor() as cur:
+        b = await fetch_one(cur, """
+            UPDATE message_broadcasts SET status = 'SENDING', started_at = COALESCE(started_at, NOW()), updated_at = NOW()
+            WHERE id = %s AND status = 'QUEUED'
+            RETURNING *
+        """, (broadcast_id,))
+    if not b:
+        return  # another worker claimed it
+    try:
+        await _fan_out(b)
+    except asyncio.CancelledError:
+        async with get_async_cursor() as cur:
+            await cur.execute("UPDATE message_broadcasts SET status = 'QUEUED', updated_at = NOW() WHERE id = %s",
+                              (broadcast_id,))
+        raise
+    except Exception as e:
+        logger.exception(f"Broadcast {broadcast_id} failed")
+        async with get_async_cursor() as cur:
+            await cur.execute("""
+                UPDATE message_broadcasts SET status = 'FAILED', error = %s, updated_at = NOW(), finished_at = NOW()
+                WHERE id = %s
+            """, (str(e)[:500], broadcast_id))
+
+
+async def _fan_out(b: dict) -> None:
+    params = {"sender_id": b["sender_id"], "target_id": b["target_id"], "target_role": b["target_role"]}
+    async with get_async_cursor(commit=False) as cur:
+        recipients = [r["user_id"] for r in await fetch_all(cur, recipients_query(b["target_type"]), params)]
+    async with get_async_cursor() as cur:
+        await cur.execute("UPDATE message_broadcasts SET recipients_total = %s, updated_at = NOW() WHERE id = %s",
+                          (len(recipients), b["id"]))
+    sent = 0
+    for i in range(0, len(recipients), BATCH_SIZE):
+        batch = recipients[i:i + BATCH_SIZE]
+        async with get_async_cursor() as cur:
+            rows = await fetch_all(cur, """
+                INSERT INTO messages (sender_id, recipient_id, subject, body, broadcast_id)
+                SELECT %s, r, %s, %s, %s FROM unnest(%s::uuid[]) AS r
+                ON CONFLICT (broadcast_id, recipient_id) WHERE broadcast_id IS NOT NULL DO NOTHING
+                RETURNING id, sender_id, recipient_id, is_read, created_at
+            """, (b["sender_id"], b["subject"], b["body"], b["id"], batch))
+            sent += len(batch)
+            await cur.execute("UPDATE message_broadcasts SET recipients_sent = %s, updated_at = NOW() WHERE id = %s",
+                              (sent, b["id"]))
+        for r in rows:
+            await events.publish(events.message_event("message", r))
+    async with get_async_cursor() as cur:
+        await cur.execute("""
+            UPDATE message_broadcasts SET status = 'DONE', recipients_sent = %s, updated_at = NOW(), finished_at = NOW()
+            WHERE id = %s
+        """, (sent, b["id"]))
+    logger.info(f"Broadcast {b['id']} delivered to {sent} recipients")
+
+
+def resume() -> None:
+    """Pick up, in the background, broadcasts queued before a restart or abandoned by a dead worker."""
+    _spawn(_resume())
+
+
+async def _resume() -> None:
+    try:
+        await resume_pending()
+    except Exception as e:
+        logger.warning(f"Could not resume queued broadcasts: {e}")
+
+
+async def resume_pending() -> int:
+    """Re-queue stale SENDING broadcasts and start every queued one; ``run`` lets one worker claim each."""
+    async with get_async_cursor() as cur:
+        await cur.execute("""
+            UPDATE message_broadcasts SET status = 'QUEUED'
+            WHERE status = 'SENDING' AND updated_at < NOW() - make_interval(secs => %s)
+        """, (STALE_SECONDS,))
+        rows = await fetch_all(cur, "SELECT id FROM message_broadcasts WHERE status = 'QUEUED' ORDER BY created_at")
+    for r in rows:
+        start(str(r["id"]))
+    return len(rows)
+
+
+async def shutdown() -> None:
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
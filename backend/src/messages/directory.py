@@ -0,0 +1,288 @@
+"""Message recipient search over ``user_directory`` (migration 0003).
+
+Who may message whom:
+
+    SUPER_ADMIN, ADMIN_STAFF  everyone
+    TEACHER   staff and teachers, plus students (and their parents) in classes they take this year
+    PARENT    office staff, plus the teachers of their children's current classes
+    STUDENT   office staff, plus their current teachers
+
+A scope is a set of roles visible to everyone of that role plus an explicit
+contact list, cached per user like the principal. SQL search ranks name
+prefixes first, then word prefixes, then trigram similarity; queries under
+three characters only match the start of the name or email, which the
+btree prefix indexes serve.
+
+With ``directory_index`` enabled each worker answers from an in-process
+word-prefix index instead. It is loaded once, applies changed rows
+incrementally (on ``user_directory_changed`` notifications, or by
+``updated_at`` every ``directory_refresh_seconds`` without LISTEN) and is
+rebuilt every ``directory_reload_seconds``.
+"""
+import asyncio
+import logging
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from ..cache import TTLCache
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_one, fetch_all
+from .. import notify
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CHANNEL = "user_directory_changed"
+DEFAULT_LIMIT = 50
+MIN_TRIGRAM_LENGTH = 3
+# Rows from transactions that committed after a later-stamped one are re-read
+REFRESH_OVERLAP_SECONDS = 5
+
+OFFICE = ("SUPER_ADMIN", "ADMIN_STAFF", "FINANCE_OFFICER")
+OPEN_ROLES = {
+    "SUPER_ADMIN": None,
+    "ADMIN_STAFF": None,
+    "TEACHER": OFFICE + ("TEACHER",),
+    "PARENT": OFFICE,
+    "STUDENT": ("SUPER_ADMIN", "ADMIN_STAFF"),
+}
+
+TEACHER_CONTACTS = """
+    SELECT s.user_id FROM class_teachers ct
+    JOIN academic_years ay ON ay.id = ct.academic_year_id AND ay.is_current
+    JOIN student_classes sc ON sc.class_id = ct.class_id
+    JOIN students s ON s.id = sc.student_id
+    WHERE ct.teacher_id = %s AND s.user_id IS NOT NULL
+    UNION
+    SELECT p.user_id FROM class_teachers ct
+    JOIN academic_years ay ON ay.id = ct.academic_year_id AND ay.is_current
+    JOIN student_classes sc ON sc.class_id = ct.class_id
+    JOIN parent_student_links psl ON psl.student_id = sc.student_id
+    JOIN parents p ON p.id = psl.parent_id
+    WHERE ct.teacher_id = %s
+"""
+
+STUDENT_TEACHERS = """
+    SELECT DISTINCT t.user_id FROM student_classes sc
+    JOIN academic_years ay ON ay.id = sc.academic_year_id AND ay.is_current
+    JOIN class_teachers ct ON ct.class_id = sc.class_id
+    JOIN teachers t ON t.id = ct.teacher_id
+    WHERE sc.student_id = ANY(%s::uuid[])
+"""
+
+Scope = namedtuple("Scope", "roles contacts")  # roles None = everyone
+Entry = namedtuple("Entry", "id email role display_name is_active tokens")
+
+_scopes = TTLCache(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+
+
+async def scope_for(current: dict) -> Scope:
+    role = current["role"]
+    if OPEN_ROLES.get(role, ()) is None:
+        return Scope(None, frozenset())
+    scope = _scopes.get(current["id"])
+    if scope is not None:
+        return scope
+    rows = []
+    async with get_async_cursor(commit=False) as cur:
+        if role == "TEACHER" and current.get("teacher_id"):
+            rows = await fetch_all(cur, TEACHER_CONTACTS, (current["teacher_id"], current["teacher_id"]))
+        elif role in ("PARENT", "STUDENT") and current.get("student_ids"):
+            rows = await fetch_all(cur, STUDENT_TEACHERS, (list(current["student_ids"]),))
+    scope = Scope(frozenset(OPEN_ROLES.get(role, ())), frozenset(str(r["user_id"]) for r in rows))
+    _scopes.set(current["id"], scope)
+    return scope
+
+
+def invalidate_scopes() -> None:
+    """Drop cached contact lists, e.g. after class or teacher assignments change."""
+    _scopes.clear()
+
+
+def visible(scope: Scope, role: str, user_id: str) -> bool:
+    return scope.roles is None or role in scope.roles or user_id in scope.contacts
+
+
+async def recipient_visible(current: dict, user_id: str):
+    """Whether ``current`` may message ``user_id``; None when there is no such user."""
+    async with get_async_cursor(commit=False) as cur:
+        row = await fetch_one(cur, "SELECT role, is_active FROM user_directory WHERE user_id = %s", (user_id,))
+    if not row:
+        return None
+    return row["is_active"] and visible(await scope_for(current), row["role"], str(user_id))
+
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_sql(current: dict, q: str, limit: int = DEFAULT_LIMIT) -> list:
+    scope = await scope_for(current)
+    q = " ".join(q.lower().split())
+    params = {"me": current["id"], "limit": limit, "q": q,
+              "prefix": _like_escape(q) + "%", "word": "% " + _like_escape(q) + "%"}
+    where = ["d.is_active", "d.user_id <> %(me)s"]
+    if scope.roles is not None:
+        where.append("(d.role = ANY(%(roles)s::text[]) OR d.user_id = ANY(%(contacts)s::uuid[]))")
+        params.update(roles=list(scope.roles), contacts=list(scope.contacts))
+    rank = ""
+    if len(q) >= MIN_TRIGRAM_LENGTH:
+        params["contains"] = "%" + _like_escape(q) + "%"
+        where.append("(d.search LIKE %(contains)s OR d.search %% %(q)s)")
+        rank = ("d.search LIKE %(prefix)s DESC, d.search LIKE %(word)s DESC, "
+                "similarity(d.search, %(q)s) DESC, ")
+    elif q:
+        where.append("(d.search LIKE %(prefix)s OR LOWER(d.email) LIKE %(prefix)s)")
+    async with get_async_cursor(commit=False) as cur:
+        rows = await fetch_all(cur, f"""
+            SELECT d.user_id AS id, d.email, d.role, d.display_name
+            FROM user_directory d
+            WHERE {' AND '.join(where)}
+            ORDER BY {rank}d.display_name, d.user_id
+            LIMIT %(limit)s
+        """, params)
+    return [dict(r, id=str(r["id"])) for r in rows]
+
+
+def _tokens(display_name: str, email: str) -> frozenset:
+    email = email.lower()
+    return frozenset(display_name.lower().split()) | {email, email.split("@", 1)[0]}
+
+
+class DirectoryIndex:
+    """Sorted ``(token, user_id)`` pairs answer word-prefix queries with a bisect."""
+
+    def __init__(self):
+        self.entries = {}
+        self.keys = []
+        self.by_name = None
+        self.watermark = None
+        self.loaded_at = None
+        self.checked_at = 0.0
+        self.dirty = set()
+        self.lock = asyncio.Lock()
+
+    def _put(self, row):
+        uid = str(row["user_id"])
+        self._remove(uid)
+        entry = Entry(uid, row["email"], row["role"], row["display_name"], row["is_active"],
+                      _tokens(row["display_name"], row["email"]))
+        self.entries[uid] = entry
+        for t in entry.tokens:
+            insort(self.keys, (t, uid))
+
+    def _remove(self, uid):
+        entry = self.entries.pop(uid, None)
+        if entry is None:
+            return
+        for t in entry.tokens:
+            i = bisect_left(self.keys, (t, uid))
+            if i < len(self.keys) and self.keys[i] == (t, uid):
+                del self.keys[i]
+
+    async def _load(self, cur, where="", params=()):
+        return await fetch_all(cur, f"""
+            SELECT user_id, email, role, display_name, is_active, updated_at
+            FROM user_directory {where}
+        """, params)
+
+    async def reload(self):
+        async with get_async_cursor(commit=False) as cur:
+            rows = await self._load(cur)
+        self.entries = {}
+        for r in rows:
+            uid = str(r["user_id"])
+            self.entries[uid] = Entry(uid, r["email"], r["role"], r["display_name"], r["is_active"],
+                                      _tokens(r["display_name"], r["email"]))
+        self.keys = sorted((t, e.id) for e in self.entries.values() for t in e.tokens)
+        self.by_name = None
+        self.watermark = max((r["updated_at"] for r in rows), default=None)
+        self.loaded_at = self.checked_at = time.monotonic()
+        self.dirty.clear()
+        logger.info(f"Directory index loaded: {len(self.entries)} users, {len(self.keys)} tokens")
+
+    async def refresh(self):
+        dirty, self.dirty = self.dirty, set()
+        async with get_async_cursor(commit=False) as cur:
+            if self.watermark is None:
+                rows = await self._load(cur, "WHERE user_id = ANY(%s::uuid[])", (list(dirty),))
+            else:
+                rows = await self._load(
+                    cur, "WHERE updated_at > %s - make_interval(secs => %s) OR user_id = ANY(%s::uuid[])",
+                    (self.watermark, REFRESH_OVERLAP_SECONDS, list(dirty)))
+        found = set()
+        for r in rows:
+            found.add(str(r["user_id"]))
+            self._put(r)
+            if self.watermark is None or r["updated_at"] > self.watermark:
+                self.watermark = r["updated_at"]
+        for uid in dirty - found:
+            self._remove(uid)  # deleted users
+        if rows or dirty:
+            self.by_name = None
+        self.checked_at = time.monotonic()
+
+    def _due(self):
+        now = time.monotonic()
+        if self.loaded_at is None or now - self.loaded_at > settings.directory_reload_seconds:
+            return self.reload
+        if self.dirty or (not notify.is_enabled() and now - self.checked_at > settings.directory_refresh_seconds):
+            return self.refresh
+        return None
+
+    async def ensure_fresh(self):
+        if self._due() is None:
+            return
+        async with self.lock:
+            step = self._due()  # another request may have refreshed while we waited
+            if step is not None:
+                await step()
+
+    def _matching(self, word):
+        out = set()
+        i = bisect_left(self.keys, (word,))
+        while i < len(self.keys) and self.keys[i][0].startswith(word):
+            out.add(self.keys[i][1])
+            i += 1
+        return out
+
+    def search(self, scope: Scope, me: str, q: str, limit: int = DEFAULT_LIMIT) -> list:
+        q = " ".join(q.lower().split())
+        if q:
+            ids = None
+            for word in q.split():
+                ids = self._matching(word) if ids is None else ids & self._matching(word)
+                if not ids:
+                    return []
+            candidates = [self.entries[i] for i in ids]
+        else:
+            if self.by_name is None:
+                self.by_name = sorted(self.entries.values(), key=lambda e: (e.display_name, e.id))
+            candidates = self.by_name
+        hits = [e for e in candidates if e.is_active and e.id != me and visible(scope, e.role, e.id)]
+        if q:
+            hits.sort(key=lambda e: (not e.display_name.lower().startswith(q), e.display_name, e.id))
+        return [{"id": e.id, "email": e.email, "role": e.role, "display_name": e.display_name}
+                for e in hits[:limit]]
+
+
+_index = DirectoryIndex()
+
+
+def _on_notify(payload: str) -> None:
+    if payload:
+        _index.dirty.add(payload)
+
+
+if settings.directory_index:
+    notify.subscribe(CHANNEL, _on_notify)
+
+
+async def search(current: dict, q: str, limit: int = DEFAULT_LIMIT) -> list:
+    """Ranked recipients visible to ``current`` matching ``q`` (all of them when empty)."""
+    if not settings.directory_index:
+        return await search_sql(current, q, limit)
+    scope = await scope_for(current)
+    await _index.ensure_fresh()
+    return _index.search(scope, current["id"], q, limit)
@@ -0,0 +1,180 @@
+"""Real-time message events and cached unread counters.
+
+A trigger on ``messages`` (migration 0004) NOTIFYs ``message_events`` for
+every new message, read/unread flip and delete. Each worker LISTENs (see
+notify.py), adjusts its cached unread counters and pushes the event to the
+WebSocket/SSE subscribers of both users involved:
+
+    message   new message; the recipient's counter goes up
+    read      recipient opened it (a read receipt for the sender)
+    unread    marked unread again
+    deleted   message removed
+
+Every pushed event carries the receiving user's ``unread`` count, so idle
+clients never poll. Without ``db_listen`` routes dispatch their own events
+in-process via ``publish`` and counters are only trusted for
+``UNREAD_TTL_WITHOUT_LISTEN`` seconds, since other workers' writes go unseen.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Optional
+
+from ..auth import decode_token, user_from_payload
+from ..cache import TTLCache
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_one
+from .. import notify
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CHANNEL = "message_events"
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 25
+UNREAD_TTL_WITHOUT_LISTEN = 10
+
+_unread = TTLCache(maxsize=settings.principal_cache_size, ttl=settings.unread_cache_ttl)
+# Bumped on every event for a user, so a count loaded concurrently with one is not stored
+_versions = TTLCache(maxsize=settings.principal_cache_size, ttl=settings.unread_cache_ttl)
+_subscribers = defaultdict(set)
+
+
+def _ttl() -> int:
+    return settings.unread_cache_ttl if notify.is_enabled() else min(settings.unread_cache_ttl, UNREAD_TTL_WITHOUT_LISTEN)
+
+
+async def unread_count(user_id: str) -> int:
+    n = _unread.get(user_id)
+    if n is not None:
+        return n
+    version = _versions.get(user_id, 0)
+    async with get_async_cursor(commit=False) as cur:
+        row = await fetch_one(cur, "SELECT COUNT(*) AS n FROM messages WHERE recipient_id = %s AND NOT is_read", (user_id,))
+    n = row["n"]
+    if _versions.get(user_id, 0) == version:
+        _unread.set(user_id, n, ttl=_ttl())
+    return n
+
+
+def _adjust(user_id: str, delta: int) -> None:
+    _versions.set(user_id, _versions.get(user_id, 0) + 1)
+    n = _unread.get(user_id)
+    if n is not None:
+        _unread.set(user_id, max(0, n + delta), ttl=_ttl())
+
+
+class Subscriber:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.lagged = False
+
+    def push(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def next(self, timeout: float) -> dict:
+        if self.lagged:
+            # Events were dropped for a slow client; it must refetch instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagged = False
+            return {"type": "resync", "unread": await unread_count(self.user_id)}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return {"type": "ping"}
+
+
+def dispatch(event: dict) -> None:
+    """Apply one event to the counters and queue it for connected users."""
+    sender, recipient = event.get("sender_id"), event.get("recipient_id")
+    kind = event.get("type")
+    if kind == "message" and not event.get("is_read"):
+        _adjust(recipient, +1)
+    elif kind == "read":
+        _adjust(recipient, -1)
+    elif kind == "unread":
+        _adjust(recipient, +1)
+    elif kind == "deleted" and not event.get("is_read"):
+        _adjust(recipient, -1)
+    for user_id in {sender, recipient}:
+        subs = _subscribers.get(user_id)
+        if not subs:
+            continue
+        out = dict(event, unread=_unread.get(user_id))
+        for sub in subs:
+            sub.push(out)
+
+
+def message_event(kind: str, row: dict) -> dict:
+    """The payload the trigger would send for ``row`` (for in-process dispatch)."""
+    event = {"type": kind, "id": str(row["id"]), "sender_id": str(row["sender_id"]),
+             "recipient_id": str(row["recipient_id"])}
+    if kind in ("message", "deleted"):
+        event["is_read"] = bool(row.get("is_read"))
+    if kind == "message" and row.get("created_at") is not None:
+        event["created_at"] = row["created_at"].isoformat()
+    return event
+
+
+async def publish(event: dict) -> None:
+    """Dispatch a committed change locally when no LISTEN connection will."""
+    if not notify.is_enabled():
+        dispatch(event)
+
+
+def _on_notify(payload: str) -> None:
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning(f"Ignoring malformed {CHANNEL} payload: {payload[:100]}")
+        return
+    dispatch(event)
+
+
+notify.subscribe(CHANNEL, _on_notify)
+
+
+def authenticate(token: Optional[str]):
+    """``(current, expires_at)`` for a bearer token, or ``(None, None)``."""
+    payload = decode_token(token) if token else None
+    current = user_from_payload(payload, token)
+    if current is None:
+        return None, None
+    return current, payload.get("exp")
+
+
+async def stream(user_id: str, expires_at: Optional[float] = None):
+    """Yield ``hello``, then this user's events, ``ping`` when idle and ``expired`` at token expiry."""
+    sub = Subscriber(user_id)
+    _subscribers[user_id].add(sub)
+    try:
+        yield {"type": "hello", "unread": await unread_count(user_id)}
+        while True:
+            remaining = expires_at - time.time() if expires_at else HEARTBEAT_SECONDS
+            if remaining <= 0:
+                yield {"type": "expired"}
+                return
+            event = await sub.next(min(HEARTBEAT_SECONDS, remaining))
+            if event["type"] == "ping":
+                # Keeps this user's counter cached, so pushed events carry it
+                event["unread"] = await unread_count(user_id)
+            yield event
+    finally:
+        _subscribers[user_id].discard(sub)
+        if not _subscribers[user_id]:
+            del _subscribers[user_id]
+
+
+def sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def connection_stats() -> dict:
+    return {"users": len(_subscribers), "connections": sum(len(s) for s in _subscribers.values())}
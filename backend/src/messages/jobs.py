@@ -0,0 +1,9 @@
+"""Scheduled messaging jobs (see ``src/scheduler.py``)."""
+from .. import scheduler
+from . import broadcast
+
+
+@scheduler.job("messages.resume_broadcasts", "*/5 * * * *")
+async def resume_broadcasts():
+    """Restart broadcasts abandoned by a dead worker, or queued while none was running."""
+    return {"started": await broadcast.resume_pending()}
@@ -1,100 +1,266 @@
+import asyncio
+import uuid
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
 
-from ..db import get_cursor, fetch_one, fetch_all
+from ..db_async import get_async_cursor, fetch_one, fetch_all
 from ..auth import require_roles
+from ..http_cache import cache_policy
+from ..ids import ids_or_404
+from ..pagination import Keyset, Page, SortKey, page_params, paginate
+from . import broadcast, directory, events
 
 router = APIRouter(prefix="/messages", tags=["messages"])
+http_bearer = HTTPBearer(auto_error=False)
+AUTH_TIMEOUT_SECONDS = 10
+
+NEWEST_FIRST = Keyset(
+    "messages",
+    SortKey("m.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("m.id", "uuid", "id", desc=True),
+)
+
+
+BROADCASTS_NEWEST_FIRST = Keyset(
+    "message_broadcasts",
+    SortKey("b.created_at", "timestamptz", "created_at", desc=True),
+    SortKey("b.id", "uuid", "id", desc=True),
+)
 
 
 class SendMessageBody(BaseModel):
-    recipient_id: str
+    recipient_id: uuid.UUID
+    subject: Optional[str] = None
+    body: str
+
+
+class BroadcastBody(BaseModel):
+    target_type: str  # all | role | class | class_parents | form | form_parents
+    target_id: Optional[str] = None  # class or form id
+    target_role: Optional[str] = None
     subject: Optional[str] = None
     body: str
 
 
-@router.get("")
-def list_messages(
+@router.get("", dependencies=[cache_policy()])
+async def list_messages(
     folder: str = Query("inbox", regex="^(inbox|sent)$"),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    page: Page = Depends(page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
 ):
-    with get_cursor() as cur:
+    tail, tail_params = NEWEST_FIRST.clause(page)
+    async with get_async_cursor() as cur:
         if folder == "inbox":
-            cur.execute("""
+            await cur.execute("""
                 SELECT m.id, m.sender_id, m.subject, m.body, m.is_read, m.created_at,
                        u.email AS sender_email
                 FROM messages m
                 JOIN users u ON u.id = m.sender_id
                 WHERE m.recipient_id = %s
-                ORDER BY m.created_at DESC
-                LIMIT %s OFFSET %s
-            """, (current["id"], limit, skip))
+            """ + tail, [current["id"], *tail_params])
         else:
-            cur.execute("""
+            await cur.execute("""
                 SELECT m.id, m.recipient_id, m.subject, m.body, m.is_read, m.created_at,
                        u.email AS recipient_email
                 FROM messages m
                 JOIN users u ON u.id = m.recipient_id
                 WHERE m.sender_id = %s
-                ORDER BY m.created_at DESC
-                LIMIT %s OFFSET %s
-            """, (current["id"], limit, skip))
-        rows = cur.fetchall()
+            """ + tail, [current["id"], *tail_params])
+        rows = paginate(page, NEWEST_FIRST, await cur.fetchall())
         return [dict(r, id=str(r["id"]), sender_id=str(r.get("sender_id") or r.get("sender_id")), recipient_id=str(r.get("recipient_id")) if r.get("recipient_id") else None) for r in rows]
 
 
 @router.post("")
-def send_message(
+async def send_message(
     body: SendMessageBody,
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
 ):
-    with get_cursor() as cur:
-        cur.execute("""
+    # The same scope as the recipient search, so a known id cannot get around it
+    allowed = await directory.recipient_visible(current, body.recipient_id)
+    if allowed is None:
+        raise HTTPException(status_code=404, detail="Recipient not found")
+    if not allowed:
+        raise HTTPException(status_code=403, detail="You cannot message this user")
+    async with get_async_cursor() as cur:
+        await cur.execute("""
             INSERT INTO messages (sender_id, recipient_id, subject, body)
             VALUES (%s, %s, %s, %s)
-            RETURNING id, recipient_id, subject, created_at
+            RETURNING id, sender_id, recipient_id, subject, is_read, created_at
         """, (current["id"], body.recipient_id, body.subject, body.body))
-        row = cur.fetchone()
-        return dict(row, id=str(row["id"]), recipient_id=str(row["recipient_id"]))
+        row = await cur.fetchone()
+    await events.publish(events.message_event("message", row))
+    return {"id": str(row["id"]), "recipient_id": str(row["recipient_id"]), "subject": row["subject"],
+            "created_at": row["created_at"]}
+
+
+def _broadcast_out(row):
+    return dict(row, id=str(row["id"]), sender_id=str(row["sender_id"]),
+                target_id=str(row["target_id"]) if row.get("target_id") else None)
+
+
+@router.post("/broadcasts", status_code=202)
+async def create_broadcast(
+    body: BroadcastBody,
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
+):
+    """Queue one message to every member of a group; poll ``GET /broadcasts/{id}`` for progress."""
+    broadcast.validate_target(body.target_type, body.target_id, body.target_role)
+    await broadcast.authorize(current, body.target_type, body.target_id)
+    row = await broadcast.create(current, body.target_type, body.target_id, body.target_role, body.subject, body.body)
+    return _broadcast_out(row)
+
+
+@router.get("/broadcasts/preview")
+async def preview_broadcast(
+    target_type: str = Query(...),
+    target_id: Optional[str] = Query(None),
+    target_role: Optional[str] = Query(None),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
+):
+    """How many users a broadcast to this group would reach."""
+    broadcast.validate_target(target_type, target_id, target_role)
+    await broadcast.authorize(current, target_type, target_id)
+    return {"recipients": await broadcast.count_recipients(current["id"], target_type, target_id, target_role)}
+
+
+@router.get("/broadcasts")
+async def list_broadcasts(
+    page: Page = Depends(page_params),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
+):
+    tail, tail_params = BROADCASTS_NEWEST_FIRST.clause(page)
+    q = """
+        SELECT b.id, b.sender_id, b.target_type, b.target_id, b.target_role, b.subject, b.status,
+               b.recipients_total, b.recipients_sent, b.error, b.created_at, b.finished_at
+        FROM message_broadcasts b WHERE 1=1
+    """
+    params = []
+    if current["role"] == "TEACHER":
+        q += " AND b.sender_id = %s"
+        params.append(current["id"])
+    async with get_async_cursor(commit=False) as cur:
+        rows = await fetch_all(cur, q + tail, params + tail_params)
+    return [_broadcast_out(r) for r in paginate(page, BROADCASTS_NEWEST_FIRST, rows)]
+
+
+@router.get("/broadcasts/{broadcast_id}")
+async def get_broadcast(
+    broadcast_id: str,
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
+):
+    ids_or_404(broadcast_id, detail="Broadcast not found")
+    async with get_async_cursor(commit=False) as cur:
+        row = await fetch_one(cur, "SELECT * FROM message_broadcasts WHERE id = %s", (broadcast_id,))
+    if not row:
+        raise HTTPException(status_code=404)
+    if current["role"] == "TEACHER" and str(row["sender_id"]) != current["id"]:
+        raise HTTPException(status_code=403)
+    return _broadcast_out(row)
 
 
 @router.get("/users")
-def list_users_for_message(
-    q: Optional[str] = Query(None),
+async def list_users_for_message(
+    q: Optional[str] = Query(None, max_length=100),
+    limit: int = Query(directory.DEFAULT_LIMIT, ge=1, le=directory.DEFAULT_LIMIT),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
 ):
-    with get_cursor() as cur:
-        cur.execute("""
-            SELECT u.id, u.email, u.role,
-                   COALESCE(t.first_name || ' ' || t.last_name, s.first_name || ' ' || s.last_name, p.first_name || ' ' || p.last_name, u.email) AS display_name
-            FROM users u
-            LEFT JOIN teachers t ON t.user_id = u.id
-            LEFT JOIN students s ON s.user_id = u.id
-            LEFT JOIN parents p ON p.user_id = u.id
-            WHERE u.id != %s AND u.is_active = true
-            ORDER BY display_name
-        """, (current["id"],))
-        rows = cur.fetchall()
-        if q:
-            ql = q.lower()
-            rows = [r for r in rows if ql in (r.get("email") or "").lower() or ql in (r.get("display_name") or "").lower()]
-        return [dict(r, id=str(r["id"])) for r in rows[:50]]
+    """Recipients the caller may message, best matches for ``q`` first."""
+    return await directory.search(current, q or "", limit)
+
+
+@router.get("/unread-count")
+async def unread_count(
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
+):
+    return {"unread": await events.unread_count(current["id"])}
+
+
+@router.get("/stream")
+async def message_stream(
+    request: Request,
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer),
+):
+    """Server-sent events for the caller (see ``events``).
+
+    ``EventSource`` cannot set headers, so the JWT may also be passed as
+    ``?token=``. The stream ends with an ``expired`` event when the token does.
+    """
+    current, expires_at = events.authenticate(credentials.credentials if credentials else token)
+    if current is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    async def body():
+        yield f"retry: {events.HEARTBEAT_SECONDS * 1000}\n\n"
+        async for event in events.stream(current["id"], expires_at):
+            if await request.is_disconnected():
+                break
+            yield events.sse(event)
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/ws")
+async def message_socket(websocket: WebSocket):
+    """WebSocket carrying the same events as ``/stream``.
+
+    Authenticate with an ``Authorization: Bearer`` header or, from browsers,
+    a first frame ``{"type": "auth", "token": "..."}``. Closes with 4401 for
+    a bad token and 4001 when it expires, after which the client reconnects
+    with a fresh one.
+    """
+    await websocket.accept()
+    header = websocket.headers.get("authorization", "")
+    token = header[7:] if header.lower().startswith("bearer ") else None
+    try:
+        if token is None:
+            frame = await asyncio.wait_for(websocket.receive_json(), AUTH_TIMEOUT_SECONDS)
+            token = frame.get("token") if isinstance(frame, dict) and frame.get("type") == "auth" else None
+    except (asyncio.TimeoutError, ValueError, WebSocketDisconnect):
+        token = None
+    current, expires_at = events.authenticate(token)
+    if current is None:
+        await websocket.close(code=4401)
+        return
+
+    async def pump():
+        async for event in events.stream(current["id"], expires_at):
+            await websocket.send_json(event)
+        await websocket.close(code=4001)
+
+    async def drain():
+        # Client frames carry nothing yet; reading them notices a disconnect promptly
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 @router.get("/{message_id}")
-def get_message(
+async def get_message(
     message_id: str,
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
 ):
-    with get_cursor() as cur:
-        row = fetch_one(cur, "SELECT * FROM messages WHERE id = %s", (message_id,))
+    async with get_async_cursor() as cur:
+        row = await fetch_one(cur, "SELECT * FROM messages WHERE id = %s", (message_id,))
         if not row:
             raise HTTPException(status_code=404)
         if str(row["recipient_id"]) != current["id"] and str(row["sender_id"]) != current["id"]:
             raise HTTPException(status_code=403)
-        if str(row["recipient_id"]) == current["id"]:
-            cur.execute("UPDATE messages SET is_read = true WHERE id = %s", (message_id,))
-        return dict(row, id=str(row["id"]), sender_id=str(row["sender_id"]), recipient_id=str(row["recipient_id"]))
+        opened = str(row["recipient_id"]) == current["id"] and not row["is_read"]
+        if opened:
+            await cur.execute("UPDATE messages SET is_read = true WHERE id = %s", (message_id,))
+    if opened:
+        await events.publish(events.message_event("read", row))
+        row["is_read"] = True
+    return dict(row, id=str(row["id"]), sender_id=str(row["sender_id"]), recipient_id=str(row["recipient_id"]))
@@ -0,0 +1,167 @@
+"""Versioned SQL migrations from ``database/migrations``.
+
+    python -m src.migrate            # apply pending migrations
+    python -m src.migrate --status   # show applied and pending versions
+
+Files are named ``NNNN_description.sql`` and applied in order, each in its
+own transaction together with its ``schema_migrations`` row. A file whose
+first line is ``-- migrate: no-transaction`` (e.g. ``CREATE INDEX
+CONCURRENTLY``) runs statement by statement in autocommit instead, so its
+statements must be idempotent and must not contain ``$$`` bodies.
+
+A session advisory lock serialises concurrent runners, so every instance
+may run this on start-up. schema.sql still creates a fresh database; run
+the migrations after it.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "database", "migrations")
+ADVISORY_LOCK_KEY = 4_021_733_011
+NO_TRANSACTION = "-- migrate: no-transaction"
+
+Migration = namedtuple("Migration", "version name path sql checksum transactional")
+
+_FILENAME = re.compile(r"^(\d{4})_([\w-]+)\.sql$")
+_CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.I)
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    out = []
+    for name in sorted(os.listdir(directory)):
+        m = _FILENAME.match(name)
+        if not m:
+            continue
+        path = os.path.join(directory, name)
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        out.append(Migration(
+            version=m.group(1),
+            name=m.group(2),
+            path=path,
+            sql=sql,
+            checksum=hashlib.sha256(sql.encode()).hexdigest(),
+            transactional=not sql.lstrip().startswith(NO_TRANSACTION),
+        ))
+    versions = [m.version for m in out]
+    if len(set(versions)) != len(versions):
+        raise MigrationError("Duplicate migration version in " + directory)
+    return out
+
+
+def _statements(sql):
+    """Split a no-transaction file on statement-ending semicolons."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [s.strip() for s in re.split(r";\s*$", "\n".join(lines), flags=re.M) if s.strip()]
+
+
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """)
+
+
+def _applied(cur):
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {r["version"]: r for r in cur.fetchall()}
+
+
+def _drop_invalid_index(cur, name):
+    # An interrupted CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS would keep
+    cur.execute("""
+        SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (name,))
+    if cur.fetchone():
+        logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def _apply(conn, m):
+    if m.transactional:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(m.sql)
+                cur.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                            (m.version, m.name, m.checksum))
+        return
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for stmt in _statements(m.sql):
+                idx = _CONCURRENT_INDEX.search(stmt)
+                if idx:
+                    _drop_invalid_index(cur, idx.group(1))
+                cur.execute(stmt)
+            cur.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (m.version, m.name, m.checksum))
+    finally:
+        conn.autocommit = False
+
+
+def migrate(dsn=None, status_only=False, directory=MIGRATIONS_DIR):
+    """Apply pending migrations; returns the versions applied (or pending, with ``status_only``)."""
+    migrations = discover(directory)
+    conn = psycopg2.connect(dsn or get_settings().database_url, cursor_factory=RealDictCursor)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+            _ensure_table(cur)
+            applied = _applied(cur)
+        conn.autocommit = False
+        for m in migrations:
+            if m.version in applied and applied[m.version]["checksum"] != m.checksum:
+                raise MigrationError(f"Migration {m.version}_{m.name} was edited after being applied; add a new migration instead")
+        pending = [m for m in migrations if m.version not in applied]
+        if status_only:
+            for m in migrations:
+                row = applied.get(m.version)
+                print(f"{m.version}  {m.name:<45} {'applied ' + str(row['applied_at']) if row else 'pending'}")
+            return [m.version for m in pending]
+        for m in pending:
+            logger.info(f"Applying migration {m.version}_{m.name}")
+            _apply(conn, m)
+        return [m.version for m in pending]
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--status", action="store_true", help="list migrations without applying anything")
+    p.add_argument("--database-url", default=None)
+    args = p.parse_args()
+    try:
+        done = migrate(args.database_url, status_only=args.status)
+    except MigrationError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    if not args.status:
+        logger.info(f"Applied {len(done)} migration(s)" if done else "Database is up to date")
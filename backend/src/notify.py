@@ -0,0 +1,81 @@
+"""Postgres LISTEN/NOTIFY fan-out shared by every in-process subscriber.
+
+Modules register handlers with ``subscribe(channel, handler)`` at import
+time; ``start()`` opens one dedicated autocommit connection that LISTENs on
+all registered channels and dispatches payloads, reconnecting on failure.
+LISTEN needs a session-level connection, so this is disabled when
+``db_listen`` is off (e.g. behind a transaction-mode PgBouncer).
+"""
+import asyncio
+import inspect
+import logging
+from collections import defaultdict
+
+import psycopg
+from psycopg import sql
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+_handlers = defaultdict(list)
+_task = None
+
+RECONNECT_DELAY = 5
+
+
+def is_enabled() -> bool:
+    return _settings.db_listen
+
+
+def subscribe(channel: str, handler) -> None:
+    """Register ``handler(payload: str)``; may be sync or async."""
+    _handlers[channel].append(handler)
+
+
+def publish(cur, channel: str, payload: str = "") -> None:
+    """Queue a notification on ``cur``'s transaction (delivered on commit)."""
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+async def _dispatch(channel, payload):
+    for handler in _handlers.get(channel, ()):
+        try:
+            result = handler(payload)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception("NOTIFY handler for %s failed", channel)
+
+
+async def _listen_forever():
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(_settings.database_url, autocommit=True) as conn:
+                for channel in list(_handlers):
+                    await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                logger.info("Listening for notifications on %s", ", ".join(_handlers))
+                async for n in conn.notifies():
+                    await _dispatch(n.channel, n.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"NOTIFY listener disconnected ({e}); retrying in {RECONNECT_DELAY}s")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+async def start():
+    global _task
+    if _settings.db_listen and _handlers and _task is None:
+        _task = asyncio.create_task(_listen_forever())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,146 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+A route declares its sort order as a ``Keyset`` ending in a unique column,
+takes ``page: Page = Depends(page_params)``, appends ``keyset.clause(page)``
+to its WHERE conditions and passes the fetched rows through ``paginate``.
+One extra row is fetched to learn whether another page exists; if so the
+response carries ``X-Next-Cursor`` and ``Link: <...>; rel="next"``. Bodies
+stay plain lists so existing clients keep working.
+
+Lists that were never paged (attendance registers, invoices, exams,
+assignments, learning materials) take ``optional_page_params`` instead:
+they return every row unless the client passes ``limit`` or ``cursor``.
+
+Cursors are signed base64url JSON of the last row's sort values, bound to
+the keyset, so clients cannot forge comparison values or replay a cursor
+against a different listing.
+"""
+import base64
+import hashlib
+import hmac
+import json
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, Query, Request, Response
+
+from .config import get_settings
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_secret = get_settings().jwt_secret.encode()
+
+
+class SortKey(NamedTuple):
+    expr: str  # SQL expression, e.g. "s.last_name"
+    type: str  # cast applied to the cursor value: text, uuid, date, timestamptz
+    field: str  # key of the value in each fetched row
+    desc: bool = False
+    null: Optional[str] = None  # value standing in for NULL; expr must COALESCE to it
+
+
+class Page(NamedTuple):
+    limit: Optional[int]  # None: unbounded (see optional_page_params)
+    cursor: Optional[str]
+    request: Request
+    response: Response
+
+
+def page_params(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+) -> Page:
+    return Page(limit, cursor, request, response)
+
+
+def optional_page_params(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+) -> Page:
+    """Like ``page_params``, but without ``limit`` or ``cursor`` the whole list comes back."""
+    if limit is None and cursor:
+        limit = DEFAULT_PAGE_SIZE
+    return Page(limit, cursor, request, response)
+
+
+def _sign(name: str, payload: bytes) -> str:
+    digest = hmac.new(_secret, name.encode() + b"\0" + payload, hashlib.sha256).digest()[:12]
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def _b64decode(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+class Keyset:
+    def __init__(self, name: str, *keys: SortKey):
+        self.name = name
+        self.keys = keys
+
+    def order_by(self) -> str:
+        return ", ".join(f"{k.expr} {'DESC' if k.desc else 'ASC'}" for k in self.keys)
+
+    def encode(self, row) -> str:
+        values = []
+        for k in self.keys:
+            v = row[k.field]
+            values.append(k.null if v is None else str(v))
+        payload = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=") + "." + _sign(self.name, payload)
+
+    def decode(self, cursor: str) -> list:
+        try:
+            body, sig = cursor.split(".", 1)
+            payload = _b64decode(body)
+            if not hmac.compare_digest(sig, _sign(self.name, payload)):
+                raise ValueError("bad signature")
+            values = json.loads(payload)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return values
+
+    def _after(self, values):
+        if len({k.desc for k in self.keys}) == 1:
+            # Uniform direction: one row comparison, which an index on the keys can serve
+            op = "<" if self.keys[0].desc else ">"
+            lhs = ", ".join(k.expr for k in self.keys)
+            rhs = ", ".join(f"%s::{k.type}" for k in self.keys)
+            return f"({lhs}) {op} ({rhs})", list(values)
+        # Mixed directions: (a > x) OR (a = x AND b < y) OR ...
+        terms, params = [], []
+        for i, k in enumerate(self.keys):
+            parts = []
+            for prev, v in zip(self.keys[:i], values):
+                parts.append(f"{prev.expr} = %s::{prev.type}")
+                params.append(v)
+            parts.append(f"{k.expr} {'<' if k.desc else '>'} %s::{k.type}")
+            params.append(values[i])
+            terms.append("(" + " AND ".join(parts) + ")")
+        return "(" + " OR ".join(terms) + ")", params
+
+    def clause(self, page: Page):
+        """``(sql, params)`` to append after the WHERE conditions: cursor filter, ORDER BY and LIMIT."""
+        sql, params = "", []
+        if page.cursor:
+            cond, params = self._after(self.decode(page.cursor))
+            sql = f" AND {cond}"
+        if page.limit is None:
+            return f"{sql} ORDER BY {self.order_by()}", params
+        return f"{sql} ORDER BY {self.order_by()} LIMIT %s", params + [page.limit + 1]
+
+
+def paginate(page: Page, keyset: Keyset, rows: list) -> list:
+    """Trim the look-ahead row and advertise the next cursor, if any."""
+    if page.limit is None or len(rows) <= page.limit:
+        return rows
+    rows = rows[:page.limit]
+    cursor = keyset.encode(rows[-1])
+    page.response.headers["X-Next-Cursor"] = cursor
+    page.response.headers["Link"] = f'<{page.request.url.include_query_params(cursor=cursor)}>; rel="next"'
+    return rows
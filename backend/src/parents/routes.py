@@ -1,12 +1,31 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
 
 from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles
+from ..auth import require_roles, invalidate_parent
+from ..http_cache import cache_policy
+from ..ids import ids_or_404
+from ..pagination import Keyset, Page, SortKey, page_params, paginate
+from ..messages.directory import invalidate_scopes
 
 router = APIRouter(prefix="/parents", tags=["parents"])
 
+BY_NAME = Keyset(
+    "parents",
+    SortKey("last_name", "text", "last_name"),
+    SortKey("first_name", "text", "first_name"),
+    SortKey("id", "uuid", "id"),
+)
 
-@router.get("/me")
+
+class LinkStudentBody(BaseModel):
+    student_id: str
+    relationship: Optional[str] = None
+    is_primary: bool = False
+
+
+@router.get("/me", dependencies=[cache_policy()])
 def get_my_profile(current=Depends(require_roles(["PARENT"]))):
     with get_cursor() as cur:
         p = fetch_one(cur, "SELECT * FROM parents WHERE user_id = %s", (current["id"],))
@@ -27,11 +46,47 @@ def get_my_profile(current=Depends(require_roles(["PARENT"]))):
 
 @router.get("")
 def list_parents(
-    skip: int = 0,
-    limit: int = 50,
+    page: Page = Depends(page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF"])),
 ):
+    tail, tail_params = BY_NAME.clause(page)
     with get_cursor() as cur:
-        cur.execute("SELECT id, user_id, first_name, last_name, phone FROM parents ORDER BY last_name LIMIT %s OFFSET %s", (limit, skip))
-        rows = cur.fetchall()
+        cur.execute("SELECT id, user_id, first_name, last_name, phone FROM parents WHERE 1=1" + tail, tail_params)
+        rows = paginate(page, BY_NAME, cur.fetchall())
         return [dict(r, id=str(r["id"]), user_id=str(r["user_id"])) for r in rows]
+
+
+@router.post("/{parent_id}/students")
+def link_student(
+    parent_id: str,
+    body: LinkStudentBody,
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF"])),
+):
+    ids_or_404(parent_id, detail="Parent not found")
+    with get_cursor() as cur:
+        cur.execute("""
+            INSERT INTO parent_student_links (parent_id, student_id, relationship, is_primary)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (parent_id, student_id) DO UPDATE SET relationship = EXCLUDED.relationship, is_primary = EXCLUDED.is_primary
+            RETURNING id
+        """, (parent_id, body.student_id, body.relationship, body.is_primary))
+        row = cur.fetchone()
+    invalidate_parent(parent_id)
+    invalidate_scopes()
+    return {"ok": True, "id": str(row["id"])}
+
+
+@router.delete("/{parent_id}/students/{student_id}")
+def unlink_student(
+    parent_id: str,
+    student_id: str,
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF"])),
+):
+    ids_or_404(parent_id, student_id)
+    with get_cursor() as cur:
+        cur.execute("DELETE FROM parent_student_links WHERE parent_id = %s AND student_id = %s", (parent_id, student_id))
+        if not cur.rowcount:
+            raise HTTPException(status_code=404)
+    invalidate_parent(parent_id)
+    invalidate_scopes()
+    return {"ok": True}
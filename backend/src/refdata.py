@@ -0,0 +1,203 @@
+"""In-process cache for slow-changing reference data.
+
+Entities are named after their table. Each has its own TTL and a version
+counter; ``invalidate(table)`` bumps the version and drops cached entries so
+a load that raced with the change is never stored. Tables carry a
+``refdata_changed`` trigger (see schema.sql), so with ``db_listen`` enabled
+every worker also drops its copy when any writer, including psql, commits a
+change.
+"""
+import hashlib
+import json
+import threading
+from collections import namedtuple
+from typing import Optional
+
+from .cache import TTLCache
+from .db import get_cursor
+from . import notify
+
+CHANNEL = "refdata_changed"
+
+TTL = {
+    "academic_years": 300,
+    "terms": 600,
+    "forms": 3600,
+    "streams": 3600,
+    "classes": 300,
+    "subjects": 600,
+    "institution_settings": 300,
+    "news_events": 60,
+}
+
+# Cached rows that embed another table's columns (e.g. class lists carry
+# form and stream names) must be dropped along with it.
+DEPENDENTS = {
+    "academic_years": ("classes", "terms"),
+    "forms": ("streams", "classes"),
+    "streams": ("classes",),
+}
+
+Entry = namedtuple("Entry", "table value etag")
+
+_cache = TTLCache(maxsize=512, ttl=300)
+_versions = {t: 0 for t in TTL}
+_lock = threading.Lock()
+
+
+def _etag(table, value):
+    digest = hashlib.sha1(json.dumps(value, default=str, sort_keys=True).encode()).hexdigest()[:20]
+    return f'"{table}-{digest}"'
+
+
+def _str_ids(row, *keys):
+    out = dict(row)
+    for k in keys:
+        if out.get(k) is not None:
+            out[k] = str(out[k])
+    return out
+
+
+def _load_academic_years(cur):
+    cur.execute("SELECT id, name, start_date, end_date, is_current FROM academic_years ORDER BY start_date DESC")
+    return [_str_ids(r, "id") for r in cur.fetchall()]
+
+
+def _load_terms(cur, academic_year_id):
+    cur.execute("SELECT id, name, start_date, end_date FROM terms WHERE academic_year_id = %s ORDER BY start_date", (academic_year_id,))
+    return [_str_ids(r, "id") for r in cur.fetchall()]
+
+
+def _load_forms(cur):
+    cur.execute("SELECT id, name, display_order FROM forms ORDER BY display_order")
+    return [_str_ids(r, "id") for r in cur.fetchall()]
+
+
+def _load_streams(cur):
+    cur.execute("SELECT id, name, form_id FROM streams ORDER BY form_id, name")
+    return [_str_ids(r, "id", "form_id") for r in cur.fetchall()]
+
+
+def _load_classes(cur, academic_year_id):
+    cur.execute("""
+        SELECT c.id, c.name, c.form_id, c.stream_id, f.name AS form_name, s.name AS stream_name
+        FROM classes c
+        JOIN forms f ON f.id = c.form_id
+        JOIN streams s ON s.id = c.stream_id
+        WHERE c.academic_year_id = %s
+        ORDER BY f.display_order, s.name
+    """, (academic_year_id,))
+    return [_str_ids(r, "id", "form_id", "stream_id") for r in cur.fetchall()]
+
+
+def _load_class(cur, class_id):
+    cur.execute("""
+        SELECT c.*, f.name AS form_name, s.name AS stream_name, ay.name AS academic_year_name
+        FROM classes c
+        JOIN forms f ON f.id = c.form_id
+        JOIN streams s ON s.id = c.stream_id
+        JOIN academic_years ay ON ay.id = c.academic_year_id
+        WHERE c.id = %s
+    """, (class_id,))
+    row = cur.fetchone()
+    return _str_ids(row, "id", "form_id", "stream_id", "academic_year_id") if row else None
+
+
+def _load_subjects(cur):
+    cur.execute("SELECT id, name, code, is_examinable FROM subjects ORDER BY name")
+    return [_str_ids(r, "id") for r in cur.fetchall()]
+
+
+def _load_settings(cur):
+    cur.execute("SELECT key, value FROM institution_settings")
+    return {r["key"]: r["value"] for r in cur.fetchall()}
+
+
+def _load_news(cur):
+    cur.execute("SELECT id, title, content, event_date, created_at FROM news_events WHERE is_published = true ORDER BY event_date DESC LIMIT 20")
+    return [_str_ids(r, "id") for r in cur.fetchall()]
+
+
+def _get(table, loader, *args) -> Entry:
+    key = (loader.__name__,) + args
+    entry = _cache.get(key)
+    if entry is not None:
+        return entry
+    with _lock:
+        version = _versions[table]
+    with get_cursor(commit=False) as cur:
+        value = loader(cur, *args)
+    entry = Entry(table, value, _etag(table, value))
+    with _lock:
+        # Only store if no invalidation happened while we were loading
+        if _versions[table] == version:
+            _cache.set(key, entry, ttl=TTL[table])
+    return entry
+
+
+def academic_years() -> Entry:
+    return _get("academic_years", _load_academic_years)
+
+
+def current_academic_year_id() -> Optional[str]:
+    for ay in academic_years().value:
+        if ay["is_current"]:
+            return ay["id"]
+    return None
+
+
+def terms(academic_year_id: str) -> Entry:
+    return _get("terms", _load_terms, str(academic_year_id))
+
+
+def forms() -> Entry:
+    return _get("forms", _load_forms)
+
+
+def streams() -> Entry:
+    return _get("streams", _load_streams)
+
+
+def classes(academic_year_id: str) -> Entry:
+    return _get("classes", _load_classes, str(academic_year_id))
+
+
+def class_detail(class_id: str) -> Entry:
+    return _get("classes", _load_class, str(class_id))
+
+
+def subjects() -> Entry:
+    return _get("subjects", _load_subjects)
+
+
+def institution_settings() -> Entry:
+    return _get("institution_settings", _load_settings)
+
+
+def news() -> Entry:
+    return _get("news_events", _load_news)
+
+
+def invalidate(table: Optional[str] = None, publish: bool = True) -> None:
+    """Drop cached entries for ``table`` (and its dependents), or everything.
+
+    With ``publish`` the change is also broadcast to other workers; the
+    schema triggers already do this for SQL writes, so pass ``publish=False``
+    when reacting to a notification.
+    """
+    tables = set(TTL) if table is None else {table, *DEPENDENTS.get(table, ())}
+    tables &= set(TTL)
+    with _lock:
+        for t in tables:
+            _versions[t] += 1
+        _cache.pop_where(lambda e: e.table in tables)
+    if publish and notify.is_enabled():
+        with get_cursor() as cur:
+            notify.publish(cur, CHANNEL, table or "")
+
+
+def _on_notify(payload: str) -> None:
+    invalidate(payload or None, publish=False)
+
+
+notify.subscribe(CHANNEL, _on_notify)
@@ -0,0 +1,236 @@
+"""Term report-card computation for a whole class in one SQL pass.
+
+Each subject score is the weighted mean of the student's average percentage
+per exam_type (CONTINUOUS, TEST, ...), normalised over the categories that
+actually have marks, so a subject without a TEST still scores out of 100.
+Subject positions and the overall class position use RANK(), so ties
+share a position.
+"""
+import hashlib
+
+EXAM_TYPE_WEIGHTS = {
+    "CONTINUOUS": 20,
+    "TEST": 20,
+    "TERM": 60,
+    "FINAL": 60,
+    "ZIMSEC": 100,
+}
+
+# ZIMSEC O-Level symbols: (minimum percentage, symbol, remark)
+GRADE_BANDS = (
+    (75, "A", "Distinction"),
+    (65, "B", "Merit"),
+    (50, "C", "Credit"),
+    (40, "D", "Satisfactory"),
+    (35, "E", "Weak"),
+    (0, "U", "Ungraded"),
+)
+
+# Lowest score counted as a pass (symbol C or better)
+PASS_MARK = 50
+
+ENGINE_VERSION = "1"
+
+
+def grade_for(score):
+    if score is None:
+        return None, None
+    for floor, symbol, remark in GRADE_BANDS:
+        if score >= floor:
+            return symbol, remark
+    return "U", "Ungraded"
+
+
+# Shared CTEs: one weighted score per (student, subject) for the class roster
+_SCORES = """
+    WITH roster AS (
+        SELECT s.id AS student_id, s.first_name, s.last_name, s.student_number
+        FROM student_classes sc
+        JOIN students s ON s.id = sc.student_id
+        WHERE sc.class_id = %(class_id)s
+    ), weights AS (
+        SELECT * FROM unnest(%(types)s::text[], %(weights)s::numeric[]) AS w(exam_type, weight)
+    ), per_type AS (
+        SELECT er.student_id, e.subject_id, e.exam_type,
+               AVG(er.marks / NULLIF(e.total_marks, 0) * 100) AS pct
+        FROM exams e
+        JOIN exam_results er ON er.exam_id = e.id
+        WHERE e.class_id = %(class_id)s AND e.term_id = %(term_id)s
+        GROUP BY er.student_id, e.subject_id, e.exam_type
+    ), per_subject AS (
+        SELECT p.student_id, p.subject_id, SUM(p.pct * w.weight) / SUM(w.weight) AS score
+        FROM per_type p
+        JOIN weights w USING (exam_type)
+        JOIN roster r USING (student_id)
+        GROUP BY p.student_id, p.subject_id
+    )"""
+
+HEADER_QUERY = """
+    SELECT c.id, c.name, f.name AS form_name, t.id AS term_id, t.name AS term_name, ay.name AS academic_year_name
+    FROM classes c
+    JOIN forms f ON f.id = c.form_id
+    JOIN terms t ON t.id = %(term_id)s
+    JOIN academic_years ay ON ay.id = t.academic_year_id
+    WHERE c.id = %(class_id)s
+"""
+
+CLASS_QUERY = _SCORES + """, ranked AS (
+        SELECT ps.*,
+               RANK() OVER (PARTITION BY ps.subject_id ORDER BY ps.score DESC) AS subject_position,
+               COUNT(*) OVER (PARTITION BY ps.subject_id) AS subject_candidates,
+               AVG(ps.score) OVER (PARTITION BY ps.subject_id) AS subject_class_average
+        FROM per_subject ps
+    ), overall AS (
+        SELECT student_id, SUM(score) AS total, AVG(score) AS average, COUNT(*) AS subjects,
+               RANK() OVER (ORDER BY AVG(score) DESC) AS position
+        FROM per_subject
+        GROUP BY student_id
+    )
+    SELECT r.student_id, r.first_name, r.last_name, r.student_number,
+           k.subject_id, sub.name AS subject_name, k.score, k.subject_position,
+           k.subject_candidates, k.subject_class_average,
+           o.total, o.average, o.subjects, o.position
+    FROM roster r
+    LEFT JOIN ranked k ON k.student_id = r.student_id
+    LEFT JOIN subjects sub ON sub.id = k.subject_id
+    LEFT JOIN overall o ON o.student_id = r.student_id
+    ORDER BY o.position NULLS LAST, r.last_name, r.first_name, sub.name
+"""
+
+SUBJECT_STATS_QUERY = _SCORES + """
+    SELECT ps.subject_id, sub.name AS subject_name, sub.code AS subject_code,
+           COUNT(*) AS candidates, AVG(ps.score) AS mean,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY ps.score) AS median,
+           stddev_pop(ps.score) AS stddev, MIN(ps.score) AS min, MAX(ps.score) AS max,
+           AVG((ps.score >= %(pass_mark)s)::int) * 100 AS pass_rate
+    FROM per_subject ps
+    JOIN subjects sub ON sub.id = ps.subject_id
+    GROUP BY ps.subject_id, sub.name, sub.code
+    ORDER BY sub.name
+"""
+
+
+def query_params(class_id, term_id):
+    types = list(EXAM_TYPE_WEIGHTS)
+    return {
+        "class_id": class_id,
+        "term_id": term_id,
+        "types": types,
+        "weights": [EXAM_TYPE_WEIGHTS[t] for t in types],
+        "pass_mark": PASS_MARK,
+    }
+
+
+def rounded(v, places=1):
+    return round(float(v), places) if v is not None else None
+
+
+def result_version(cur, class_id, term_id):
+    """Cheap fingerprint of everything a class's report cards depend on.
+
+    Besides the marks, that is every name the card prints: subjects, class,
+    form, term and year have no ``updated_at``, and a student's may not be
+    touched by a direct edit, so their text is hashed in SQL instead.
+    """
+    cur.execute("""
+        SELECT COUNT(er.id) AS n, MAX(er.updated_at) AS last_update, MAX(er.approved_at) AS last_approval,
+               COUNT(DISTINCT e.id) AS exams, MAX(e.created_at) AS last_exam,
+               (SELECT COUNT(*) FROM student_classes WHERE class_id = %(class_id)s) AS enrolled,
+               (SELECT md5(string_agg(concat_ws('|', s.id, s.first_name, s.last_name, s.student_number, s.updated_at),
+                                      ',' ORDER BY s.id))
+                FROM student_classes sc JOIN students s ON s.id = sc.student_id
+                WHERE sc.class_id = %(class_id)s) AS students,
+               (SELECT md5(string_agg(DISTINCT concat_ws('|', sub.id, sub.name, sub.code), ','))
+                FROM exams se JOIN subjects sub ON sub.id = se.subject_id
+                WHERE se.class_id = %(class_id)s AND se.term_id = %(term_id)s) AS subjects,
+               (SELECT md5(concat_ws('|', c.name, f.name, t.name, ay.name))
+                FROM classes c JOIN forms f ON f.id = c.form_id, terms t
+                JOIN academic_years ay ON ay.id = t.academic_year_id
+                WHERE c.id = %(class_id)s AND t.id = %(term_id)s) AS names
+        FROM exams e
+        LEFT JOIN exam_results er ON er.exam_id = e.id
+        WHERE e.class_id = %(class_id)s AND e.term_id = %(term_id)s
+    """, {"class_id": class_id, "term_id": term_id})
+    r = cur.fetchone()
+    weights = sorted(EXAM_TYPE_WEIGHTS.items())
+    raw = (f"{ENGINE_VERSION}|{weights}|{r['n']}|{r['last_update']}|{r['last_approval']}|{r['exams']}|{r['last_exam']}"
+           f"|{r['enrolled']}|{r['students']}|{r['subjects']}|{r['names']}")
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def build_report(header, rows):
+    """Assemble CLASS_QUERY rows into ``{class, term, candidates, students: [card, ...]}``."""
+    students, by_id = [], {}
+    for row in rows:
+        sid = str(row["student_id"])
+        card = by_id.get(sid)
+        if card is None:
+            symbol, _ = grade_for(row["average"])
+            card = by_id[sid] = {
+                "student_id": sid,
+                "student_number": row["student_number"],
+                "first_name": row["first_name"],
+                "last_name": row["last_name"],
+                "total": rounded(row["total"]),
+                "average": rounded(row["average"]),
+                "grade": symbol,
+                "position": row["position"],
+                "subjects_taken": row["subjects"] or 0,
+                "subjects": [],
+            }
+            students.append(card)
+        if row["subject_id"] is not None:
+            score = rounded(row["score"])
+            symbol, remark = grade_for(score)
+            card["subjects"].append({
+                "subject_id": str(row["subject_id"]),
+                "subject_name": row["subject_name"],
+                "score": score,
+                "grade": symbol,
+                "remark": remark,
+                "position": row["subject_position"],
+                "candidates": row["subject_candidates"],
+                "class_average": rounded(row["subject_class_average"]),
+            })
+    return {
+        "class_id": str(header["id"]),
+        "class_name": header["name"],
+        "form_name": header["form_name"],
+        "term_id": str(header["term_id"]),
+        "term_name": header["term_name"],
+        "academic_year_name": header["academic_year_name"],
+        "candidates": sum(1 for s in students if s["position"] is not None),
+        "weights": EXAM_TYPE_WEIGHTS,
+        "students": students,
+    }
+
+
+def compute_class(cur, class_id, term_id):
+    """Return the class report (see ``build_report``) or None if class/term is unknown."""
+    params = query_params(class_id, term_id)
+    cur.execute(HEADER_QUERY, params)
+    header = cur.fetchone()
+    if not header:
+        return None
+    cur.execute(CLASS_QUERY, params)
+    return build_report(header, cur.fetchall())
+
+
+def class_for_student(cur, student_id, term_id):
+    cur.execute("""
+        SELECT sc.class_id
+        FROM student_classes sc
+        JOIN terms t ON t.academic_year_id = sc.academic_year_id
+        WHERE sc.student_id = %s AND t.id = %s
+    """, (student_id, term_id))
+    row = cur.fetchone()
+    return str(row["class_id"]) if row else None
+
+
+def classes_for_term(cur, term_id):
+    cur.execute("""
+        SELECT c.id FROM classes c
+        JOIN terms t ON t.academic_year_id = c.academic_year_id
+        WHERE t.id = %s
+    """, (term_id,))
+    return [str(r["id"]) for r in cur.fetchall()]
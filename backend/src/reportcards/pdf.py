@@ -0,0 +1,118 @@
+"""Report-card PDF rendering with reportlab.
+
+Rendering is CPU-bound, so whole classes are rendered in a process pool in
+chunks of cards. This module must stay free of DB and app imports: worker
+processes are spawned and only need reportlab and plain dicts.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+CHUNK_SIZE = 25
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_card(school, meta, card, path):
+    """Write one student's report card to ``path`` (atomically)."""
+    styles = getSampleStyleSheet()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    doc = SimpleDocTemplate(tmp, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm,
+                            topMargin=15 * mm, bottomMargin=15 * mm,
+                            title=f"Report card - {card['first_name']} {card['last_name']}")
+    story = [
+        # Paragraph text is markup: names with & or < must be escaped
+        Paragraph(escape(school.get("name") or "School"), styles["Title"]),
+        Paragraph(escape(school.get("address") or ""), styles["Normal"]),
+        Spacer(1, 6 * mm),
+        Paragraph(f"{escape(meta['term_name'])} Report &mdash; {escape(meta['academic_year_name'])}", styles["Heading2"]),
+    ]
+    position = f"{card['position']} of {meta['candidates']}" if card["position"] else "-"
+    details = [
+        ["Student", f"{card['first_name']} {card['last_name']}", "Student No.", card["student_number"] or "-"],
+        ["Class", meta["class_name"], "Position", position],
+        ["Average", _fmt(card["average"]), "Overall grade", card["grade"] or "-"],
+    ]
+    t = Table(details, colWidths=[28 * mm, 60 * mm, 30 * mm, 56 * mm])
+    t.setStyle(TableStyle([
+        ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+        ("FONTNAME", (2, 0), (2, -1), "Helvetica-Bold"),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ]))
+    story += [t, Spacer(1, 6 * mm)]
+
+    rows = [["Subject", "Score %", "Grade", "Position", "Class avg", "Remark"]]
+    for s in card["subjects"]:
+        rows.append([s["subject_name"], _fmt(s["score"]), s["grade"] or "-",
+                     f"{s['position']}/{s['candidates']}", _fmt(s["class_average"]), s["remark"] or ""])
+    if len(rows) == 1:
+        rows.append(["No results recorded for this term", "", "", "", "", ""])
+    t = Table(rows, colWidths=[52 * mm, 20 * mm, 16 * mm, 22 * mm, 22 * mm, 42 * mm], repeatRows=1)
+    t.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1e3a5f")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f2f5f9")]),
+        ("ALIGN", (1, 1), (4, -1), "CENTER"),
+    ]))
+    story += [t, Spacer(1, 8 * mm)]
+    bands = "A 75-100 &middot; B 65-74 &middot; C 50-64 &middot; D 40-49 &middot; E 35-39 &middot; U 0-34"
+    story.append(Paragraph(f"Grading: {bands}", styles["Italic"]))
+    doc.build(story)
+    os.replace(tmp, path)
+    return path
+
+
+def _fmt(v):
+    return "-" if v is None else f"{v:.1f}"
+
+
+def _render_chunk(school, meta, cards, out_dir):
+    return [render_card(school, meta, card, os.path.join(out_dir, f"{card['student_id']}.pdf")) for card in cards]
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the parent holds DB pools and threads
+            _executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def render_reports(school, jobs, workers=0):
+    """Render ``[(report, out_dir), ...]``; returns the number of files written.
+
+    Cards from every report are chunked together, so a term-wide run keeps
+    all workers busy instead of waiting on one class at a time.
+    """
+    tasks = []
+    for report, out_dir in jobs:
+        os.makedirs(out_dir, exist_ok=True)
+        meta = {k: v for k, v in report.items() if k != "students"}
+        cards = report["students"]
+        tasks += [(meta, cards[i:i + CHUNK_SIZE], out_dir) for i in range(0, len(cards), CHUNK_SIZE)]
+    if len(tasks) <= 1:
+        return sum(len(_render_chunk(school, *t)) for t in tasks)
+    executor = _get_executor(workers)
+    futures = [executor.submit(_render_chunk, school, *t) for t in tasks]
+    return sum(len(f.result()) for f in futures)
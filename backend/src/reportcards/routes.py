@@ -0,0 +1,87 @@
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from ..db import get_cursor
+from ..auth import require_roles, ensure_student_access
+from ..http_cache import cache_policy
+from ..ids import ids_or_404
+from . import engine, store
+
+router = APIRouter(prefix="/report-cards", tags=["report-cards"])
+
+
+@router.get("/class/{class_id}", dependencies=[cache_policy()])
+def class_report(
+    class_id: str,
+    term_id: str = Query(...),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
+):
+    ids_or_404(class_id, term_id, detail="Class or term not found")
+    with get_cursor(commit=False) as cur:
+        report = engine.compute_class(cur, class_id, term_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Class or term not found")
+    return report
+
+
+def _student_class(student_id, term_id):
+    ids_or_404(student_id, term_id, detail="Student or term not found")
+    with get_cursor(commit=False) as cur:
+        class_id = engine.class_for_student(cur, student_id, term_id)
+    if not class_id:
+        raise HTTPException(status_code=404, detail="Student is not enrolled in a class for this term")
+    return class_id
+
+
+@router.get("/student/{student_id}", dependencies=[cache_policy()])
+def student_report(
+    student_id: str,
+    term_id: str = Query(...),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
+):
+    ensure_student_access(current, student_id)
+    class_id = _student_class(student_id, term_id)
+    with get_cursor(commit=False) as cur:
+        report = engine.compute_class(cur, class_id, term_id)
+    card = next((c for c in report["students"] if c["student_id"] == student_id), None)
+    if card is None:
+        raise HTTPException(status_code=404, detail="Report card not found")
+    meta = {k: v for k, v in report.items() if k != "students"}
+    return dict(meta, card=card)
+
+
+@router.get("/student/{student_id}/pdf")
+def student_report_pdf(
+    student_id: str,
+    term_id: str = Query(...),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
+):
+    ensure_student_access(current, student_id)
+    class_id = _student_class(student_id, term_id)
+    path = store.student_card_path(term_id, class_id, student_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Report card not found")
+    return FileResponse(path, media_type="application/pdf", filename=f"report-card-{student_id}.pdf")
+
+
+@router.post("/render")
+def render_report_cards(
+    term_id: str = Query(...),
+    class_id: Optional[str] = Query(None),
+    force: bool = Query(False),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF"])),
+):
+    """Pre-render PDFs for one class or every class in the term's academic year."""
+    ids_or_404(class_id, term_id, detail="Class or term not found")
+    started = time.perf_counter()
+    if class_id:
+        class_ids = [class_id]
+    else:
+        with get_cursor(commit=False) as cur:
+            class_ids = engine.classes_for_term(cur, term_id)
+    if not class_ids:
+        raise HTTPException(status_code=404, detail="No classes found for this term")
+    summary = store.render_classes(term_id, class_ids, force=force)
+    return dict(summary, ok=True, term_id=term_id, seconds=round(time.perf_counter() - started, 2))
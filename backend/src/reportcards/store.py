@@ -0,0 +1,79 @@
+"""Rendered report cards on disk, keyed by result version.
+
+Layout: ``<upload_dir>/report_cards/<term_id>/<class_id>/<version>/<student_id>.pdf``.
+A version directory holding a ``.complete`` marker has every card of the
+class; older version directories are removed once a newer one completes.
+Changing any mark, approval, exam or enrolment changes the version, so a
+stale card is never served.
+"""
+import os
+import shutil
+
+from ..config import get_settings
+from ..db import get_cursor
+from .. import refdata
+from . import engine, pdf
+
+settings = get_settings()
+
+MARKER = ".complete"
+
+
+def _class_root(term_id, class_id):
+    return os.path.join(settings.upload_dir, "report_cards", str(term_id), str(class_id))
+
+
+def _school():
+    s = refdata.institution_settings().value
+    return {"name": s.get("name"), "address": s.get("address")}
+
+
+def _prune(root, keep):
+    for name in os.listdir(root):
+        if name != keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def render_classes(term_id, class_ids, force=False):
+    """Make sure every listed class has a complete, current set of PDFs.
+
+    Returns ``{"classes", "cards", "rendered", "cached"}``; all classes that
+    need work are rendered together in the process pool.
+    """
+    school = _school()
+    jobs, cards, cached = [], 0, 0
+    with get_cursor(commit=False) as cur:
+        for class_id in class_ids:
+            version = engine.result_version(cur, class_id, term_id)
+            out_dir = os.path.join(_class_root(term_id, class_id), version)
+            if not force and os.path.exists(os.path.join(out_dir, MARKER)):
+                cached += sum(1 for n in os.listdir(out_dir) if n.endswith(".pdf"))
+                continue
+            report = engine.compute_class(cur, class_id, term_id)
+            if report is None:
+                continue
+            jobs.append((report, out_dir, version))
+            cards += len(report["students"])
+    rendered = pdf.render_reports(school, [(r, d) for r, d, _ in jobs], settings.report_card_workers)
+    for report, out_dir, version in jobs:
+        open(os.path.join(out_dir, MARKER), "w").close()
+        _prune(os.path.dirname(out_dir), version)
+    return {"classes": len(class_ids), "cards": cards + cached, "rendered": rendered, "cached": cached}
+
+
+def student_card_path(term_id, class_id, student_id):
+    """Path to an up-to-date PDF for one student, rendering just that card if needed."""
+    school = _school()
+    with get_cursor(commit=False) as cur:
+        version = engine.result_version(cur, class_id, term_id)
+        out_dir = os.path.join(_class_root(term_id, class_id), version)
+        path = os.path.join(out_dir, f"{student_id}.pdf")
+        if os.path.exists(path):
+            return path
+        report = engine.compute_class(cur, class_id, term_id)
+    card = next((c for c in (report or {}).get("students", []) if c["student_id"] == str(student_id)), None)
+    if card is None:
+        return None
+    os.makedirs(out_dir, exist_ok=True)
+    meta = {k: v for k, v in report.items() if k != "students"}
+    return pdf.render_card(school, meta, card, path)
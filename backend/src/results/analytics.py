@@ -0,0 +1,75 @@
+"""Class result analytics: a students x subjects score matrix plus per-subject statistics.
+
+Scores, ranks and statistics all come from SQL (see reportcards.engine);
+this module only pivots the ranked rows into a matrix and optionally
+re-encodes it column-wise, which is several times smaller than a list of
+objects for a full class.
+"""
+from ..reportcards.engine import grade_for, rounded
+
+
+def build(report, stats_rows):
+    subjects = [{
+        "subject_id": str(r["subject_id"]),
+        "subject_name": r["subject_name"],
+        "subject_code": r["subject_code"],
+        "candidates": r["candidates"],
+        "mean": rounded(r["mean"]),
+        "median": rounded(r["median"]),
+        "stddev": rounded(r["stddev"], 2),
+        "min": rounded(r["min"]),
+        "max": rounded(r["max"]),
+        "pass_rate": rounded(r["pass_rate"]),
+        "grade": grade_for(r["mean"])[0],
+    } for r in stats_rows]
+    column = {s["subject_id"]: i for i, s in enumerate(subjects)}
+    students = []
+    for card in report["students"]:
+        scores = [None] * len(subjects)
+        positions = [None] * len(subjects)
+        for s in card["subjects"]:
+            i = column[s["subject_id"]]
+            scores[i] = s["score"]
+            positions[i] = s["position"]
+        students.append({
+            "student_id": card["student_id"],
+            "student_number": card["student_number"],
+            "first_name": card["first_name"],
+            "last_name": card["last_name"],
+            "scores": scores,
+            "subject_positions": positions,
+            "total": card["total"],
+            "average": card["average"],
+            "grade": card["grade"],
+            "position": card["position"],
+        })
+    averages = [s["average"] for s in students if s["average"] is not None]
+    meta = {k: v for k, v in report.items() if k != "students"}
+    return dict(
+        meta,
+        class_average=rounded(sum(averages) / len(averages)) if averages else None,
+        subjects=subjects,
+        students=students,
+    )
+
+
+def columnar(analytics):
+    """Re-encode ``subjects`` and ``students`` as ``{field: [values...]}``.
+
+    ``scores`` becomes one list per subject (column-major), aligned with
+    the student columns.
+    """
+    def _columns(rows, skip=()):
+        keys = [k for k in (rows[0] if rows else {}) if k not in skip]
+        return {k: [r[k] for r in rows] for k in keys}
+
+    students = analytics["students"]
+    n = len(analytics["subjects"])
+    return dict(
+        analytics,
+        format="columnar",
+        subjects=_columns(analytics["subjects"]),
+        students=_columns(students, skip=("scores", "subject_positions")),
+        scores=[[s["scores"][i] for s in students] for i in range(n)],
+        subject_positions=[[s["subject_positions"][i] for s in students] for i in range(n)],
+    )
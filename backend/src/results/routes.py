@@ -1,28 +1,27 @@
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 
-from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles
+from ..db_async import get_async_cursor, fetch_one, fetch_all
+from ..auth import require_roles, ensure_student_access
+from ..exports import FORMATS, export_response
+from ..http_cache import cache_policy, table_version
+from ..ids import ids_or_404
+from ..reportcards import engine
+from . import analytics
 
 router = APIRouter(prefix="/results", tags=["results"])
 
 
-@router.get("/student/{student_id}")
-def get_student_results(
+@router.get("/student/{student_id}", dependencies=[cache_policy(
+    version=table_version("exams", "exam_results", "terms", "subjects"))])
+async def get_student_results(
     student_id: str,
     term_id: Optional[str] = Query(None),
     academic_year_id: Optional[str] = Query(None),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
 ):
-    if current["role"] == "STUDENT" and current.get("student_id") != student_id:
-        raise HTTPException(status_code=403)
-    if current["role"] == "PARENT":
-        with get_cursor() as cur:
-            cur.execute("SELECT 1 FROM parent_student_links WHERE parent_id = (SELECT id FROM parents WHERE user_id = %s) AND student_id = %s",
-                        (current["id"], student_id))
-            if not cur.fetchone():
-                raise HTTPException(status_code=403)
-    with get_cursor() as cur:
+    ensure_student_access(current, student_id)
+    async with get_async_cursor() as cur:
         q = """
             SELECT er.id, er.marks, er.approved_at, e.name AS exam_name, e.exam_type, e.total_marks,
                    sub.name AS subject_name, t.name AS term_name
@@ -40,31 +39,58 @@ def get_student_results(
             q += " AND t.academic_year_id = %s"
             params.append(academic_year_id)
         q += " ORDER BY t.start_date, sub.name"
-        cur.execute(q, params)
-        rows = cur.fetchall()
+        await cur.execute(q, params)
+        rows = await cur.fetchall()
         return [dict(r, id=str(r["id"])) for r in rows]
 
 
-@router.get("/class/{class_id}")
-def get_class_results(
+@router.get("/class/{class_id}", dependencies=[cache_policy(
+    version=table_version("exams", "exam_results", "students", "student_classes", "subjects"))])
+async def get_class_results(
     class_id: str,
     term_id: Optional[str] = Query(None),
+    format: str = Query("json", regex=FORMATS),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
 ):
-    with get_cursor() as cur:
-        q = """
-            SELECT er.student_id, s.first_name, s.last_name, er.marks, e.name AS exam_name, sub.name AS subject_name
-            FROM exam_results er
-            JOIN exams e ON e.id = er.exam_id
-            JOIN students s ON s.id = er.student_id
-            JOIN subjects sub ON sub.id = e.subject_id
-            JOIN student_classes sc ON sc.student_id = s.id AND sc.class_id = %s
-            WHERE e.class_id = %s
-        """
-        params = [class_id, class_id]
-        if term_id:
-            q += " AND e.term_id = %s"
-            params.append(term_id)
-        cur.execute(q, params)
-        rows = cur.fetchall()
+    q = """
+        SELECT er.student_id, s.first_name, s.last_name, er.marks, e.name AS exam_name, sub.name AS subject_name
+        FROM exam_results er
+        JOIN exams e ON e.id = er.exam_id
+        JOIN students s ON s.id = er.student_id
+        JOIN subjects sub ON sub.id = e.subject_id
+        JOIN student_classes sc ON sc.student_id = s.id AND sc.class_id = %s
+        WHERE e.class_id = %s
+    """
+    params = [class_id, class_id]
+    if term_id:
+        q += " AND e.term_id = %s"
+        params.append(term_id)
+    if format != "json":
+        return export_response(format, q + " ORDER BY s.last_name, s.first_name, er.student_id, sub.name, e.name", params,
+                               ["student_id", "last_name", "first_name", "subject_name", "exam_name", "marks"],
+                               "class_results")
+    async with get_async_cursor() as cur:
+        await cur.execute(q, params)
+        rows = await cur.fetchall()
         return [dict(r, student_id=str(r["student_id"])) for r in rows]
+
+
+@router.get("/class/{class_id}/analytics", dependencies=[cache_policy(version=table_version(
+    "exams", "exam_results", "students", "student_classes", "subjects", "classes", "forms", "terms", "academic_years"))])
+async def get_class_analytics(
+    class_id: str,
+    term_id: str = Query(...),
+    format: str = Query("rows", regex="^(rows|columnar)$"),
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
+):
+    """Students x subjects matrix with totals, ranks and per-subject statistics."""
+    ids_or_404(class_id, term_id, detail="Class or term not found")
+    params = engine.query_params(class_id, term_id)
+    async with get_async_cursor(commit=False) as cur:
+        header = await fetch_one(cur, engine.HEADER_QUERY, params)
+        if not header:
+            raise HTTPException(status_code=404, detail="Class or term not found")
+        rows = await fetch_all(cur, engine.CLASS_QUERY, params)
+        stats = await fetch_all(cur, engine.SUBJECT_STATS_QUERY, params)
+    data = analytics.build(engine.build_report(header, rows), stats)
+    return analytics.columnar(data) if format == "columnar" else data
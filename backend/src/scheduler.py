@@ -0,0 +1,333 @@
+"""Cron-style background jobs, leased through the ``scheduled_jobs`` table.
+
+Modules declare jobs at import time (see ``JOB_MODULES``)::
+
+    @scheduler.job("finance.mark_overdue", "15 0 * * *")
+    async def mark_overdue():
+        ...
+        return {"invoices": n}  # stored as last_result
+
+Schedules are five-field cron expressions (minute hour day month weekday;
+``*``, lists, ranges and ``/step``) read in ``scheduler_timezone``: a time
+skipped when clocks go forward runs an hour later, and one repeated when
+they go back runs once, unless the hour field is a wildcard. Each job
+has a ``scheduled_jobs`` row (migration 0012) holding its next due time.
+Every worker polls the table and claims one due job at a time with ``FOR
+UPDATE SKIP LOCKED``, setting a lease of ``lease_seconds`` under a token of
+its own. While the job runs the lease is renewed every third of that, so a
+job may run longer than its lease; after the run the next due time is
+computed from now and the lease released. Both are fenced on the token. A
+worker that dies mid-run stops renewing, so the lease expires and the job is
+picked up again elsewhere; a worker that finds its lease gone (it stalled
+past expiry) cancels its run. Any number of API workers and standalone
+workers can run the loop without running a job twice at once.
+
+    python -m src.scheduler              # standalone worker
+    python -m src.scheduler --list       # jobs, schedules and last results
+    python -m src.scheduler --run NAME   # run one job now, in this process
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from .config import get_settings
+from .db_async import close_async_pool, fetch_all, fetch_one, get_async_cursor, open_async_pool
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JOB_MODULES = (".auth.jobs", ".finance.jobs", ".attendance.jobs", ".uploads.jobs", ".messages.jobs")
+DEFAULT_LEASE_SECONDS = 900
+RETRY_DELAY = 60
+
+Job = namedtuple("Job", "name cron func lease_seconds")
+
+_jobs = {}
+_task = None
+_worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ========== Cron expressions ==========
+
+def _field(text: str, lo: int, hi: int) -> frozenset:
+    values = set()
+    for part in text.split(","):
+        rng, _, step = part.partition("/")
+        if rng == "*":
+            start, end = lo, hi
+        elif "-" in rng:
+            start, end = (int(x) for x in rng.split("-", 1))
+        else:
+            start = end = int(rng)
+            if step:
+                end = hi
+        if not (lo <= start <= end <= hi):
+            raise ValueError(f"'{part}' is out of range {lo}-{hi}")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return frozenset(values)
+
+
+class Cron:
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs five fields: '{expr}'")
+        self.expr = expr
+        self.minute, self.hour, self.day, self.month, weekday = (
+            _field(p, lo, hi) for p, (lo, hi) in zip(parts, self.FIELDS))
+        self.weekday = frozenset(d % 7 for d in weekday)  # 0 and 7 are both Sunday
+        self.any_day, self.any_weekday = parts[2] == "*", parts[4] == "*"
+        self.any_hour = parts[1].startswith("*")
+
+    def _day_matches(self, t: datetime) -> bool:
+        dom, dow = t.day in self.day, t.isoweekday() % 7 in self.weekday
+        if self.any_day or self.any_weekday:
+            return dom and dow
+        return dom or dow  # both restricted: either may match, as in cron
+
+    def next_after(self, t: datetime) -> datetime:
+        """First matching minute strictly after ``t`` (in ``t``'s time zone)."""
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.month:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hour:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minute:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression never matches: '{self.expr}'")
+
+
+def _zone():
+    try:
+        return ZoneInfo(settings.scheduler_timezone)
+    except ZoneInfoNotFoundError:
+        logger.warning(f"Unknown scheduler_timezone {settings.scheduler_timezone!r}; using UTC")
+        return timezone.utc
+
+
+def next_run(job: Job, after: datetime = None) -> datetime:
+    after = after or datetime.now(timezone.utc)
+    local = after.astimezone(_zone())
+    # Clocks going back repeat an hour of wall time, the second pass with fold=1.
+    # As in cron, jobs not pinned to an hour run in both passes, fixed-time ones once.
+    repeat = job.cron.any_hour
+    t, found = (local - timedelta(hours=1) if repeat else local), []
+    while True:
+        t = job.cron.next_after(t)
+        second = t.replace(fold=1)
+        if repeat and second.utcoffset() < t.utcoffset() and second > after:
+            found.append(second.astimezone(timezone.utc))
+        if t > after:
+            return min(found + [t.astimezone(timezone.utc)])
+
+
+# ========== Registry ==========
+
+def job(name: str, schedule: str, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+    """Register ``async def func() -> Optional[dict]`` to run on ``schedule``."""
+    cron = Cron(schedule)
+
+    def register(func):
+        _jobs[name] = Job(name, cron, func, lease_seconds)
+        return func
+
+    return register
+
+
+def load_jobs() -> dict:
+    for module in JOB_MODULES:
+        importlib.import_module(module, __package__)
+    return _jobs
+
+
+# ========== Leasing ==========
+
+async def sync() -> None:
+    """Create rows for new jobs; a changed schedule takes effect from now."""
+    async with get_async_cursor() as cur:
+        for j in _jobs.values():
+            await cur.execute("""
+                INSERT INTO scheduled_jobs AS s (name, schedule, lease_seconds, next_run_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (name) DO UPDATE SET
+                    schedule = EXCLUDED.schedule,
+                    lease_seconds = EXCLUDED.lease_seconds,
+                    next_run_at = CASE WHEN s.schedule = EXCLUDED.schedule THEN s.next_run_at ELSE EXCLUDED.next_run_at END
+            """, (j.name, j.cron.expr, j.lease_seconds, next_run(j)))
+
+
+async def claim():
+    """Lease the most overdue job this worker knows: ``(job, lease token)``, or None."""
+    token = f"{_worker_id}:{uuid.uuid4().hex[:12]}"
+    async with get_async_cursor() as cur:
+        row = await fetch_one(cur, """
+            UPDATE scheduled_jobs s SET
+                locked_by = %s,
+                locked_until = NOW() + make_interval(secs => s.lease_seconds),
+                last_started_at = NOW()
+            FROM (
+                SELECT name FROM scheduled_jobs
+                WHERE enabled AND name = ANY(%s) AND next_run_at <= NOW()
+                  AND (locked_until IS NULL OR locked_until < NOW())
+                ORDER BY next_run_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            ) due
+            WHERE s.name = due.name
+            RETURNING s.name
+        """, (token, list(_jobs)))
+    return (_jobs[row["name"]], token) if row else None
+
+
+async def _heartbeat(j: Job, token: str, run: asyncio.Future) -> None:
+    """Keep renewing the lease while ``run`` goes on; cancel it if the lease was lost."""
+    while True:
+        await asyncio.sleep(max(j.lease_seconds / 3, 1))
+        try:
+            async with get_async_cursor() as cur:
+                await cur.execute("""
+                    UPDATE scheduled_jobs SET locked_until = NOW() + make_interval(secs => lease_seconds)
+                    WHERE name = %s AND locked_by = %s
+                """, (j.name, token))
+                renewed = cur.rowcount
+        except Exception as e:
+            logger.warning(f"Could not renew the lease of job {j.name}, retrying: {e}")
+            continue
+        if not renewed:
+            logger.error(f"Job {j.name} lost its lease; cancelling this run")
+            run.cancel()
+            return
+
+
+async def _finish(j: Job, token: str, status: str, started: float, result=None, error=None) -> None:
+    async with get_async_cursor() as cur:
+        await cur.execute("""
+            UPDATE scheduled_jobs SET
+                next_run_at = %s, locked_by = NULL, locked_until = NULL, last_finished_at = NOW(),
+                last_status = %s, last_error = %s, last_result = %s::jsonb, last_duration_ms = %s,
+                run_count = run_count + 1
+            WHERE name = %s AND locked_by = %s
+        """, (next_run(j), status, error, json.dumps(result, default=str) if result is not None else None,
+              int((time.monotonic() - started) * 1000), j.name, token))
+
+
+async def _release(j: Job, token: str) -> None:
+    async with get_async_cursor() as cur:
+        await cur.execute("UPDATE scheduled_jobs SET locked_by = NULL, locked_until = NULL WHERE name = %s AND locked_by = %s",
+                          (j.name, token))
+
+
+async def run_due() -> bool:
+    """Claim and run one due job; False when nothing is due."""
+    lease = await claim()
+    if lease is None:
+        return False
+    j, token = lease
+    started = time.monotonic()
+    logger.info(f"Job {j.name} started")
+    run = asyncio.ensure_future(j.func())
+    beat = asyncio.create_task(_heartbeat(j, token, run))
+    try:
+        result = await run
+    except asyncio.CancelledError:
+        if beat.done():
+            return True  # lease lost: the job is someone else's now
+        await _release(j, token)  # due again straight away for the next worker
+        raise
+    except Exception as e:
+        logger.exception(f"Job {j.name} failed")
+        await _finish(j, token, "FAILED", started, error=str(e)[:2000])
+        return True
+    finally:
+        beat.cancel()
+    await _finish(j, token, "OK", started, result=result)
+    logger.info(f"Job {j.name} finished in {time.monotonic() - started:.1f}s: {result}")
+    return True
+
+
+async def _loop() -> None:
+    synced = False
+    while True:
+        try:
+            if not synced:
+                await sync()
+                synced = True
+            while await run_due():
+                pass
+            await asyncio.sleep(settings.scheduler_poll_seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Scheduler poll failed, retrying in {RETRY_DELAY}s: {e}")
+            await asyncio.sleep(RETRY_DELAY)
+
+
+def start() -> None:
+    global _task
+    load_jobs()
+    if _task is None and _jobs:
+        _task = asyncio.create_task(_loop())
+
+
+async def shutdown() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+async def status() -> list:
+    async with get_async_cursor(commit=False) as cur:
+        return await fetch_all(cur, "SELECT * FROM scheduled_jobs ORDER BY name")
+
+
+# ========== Standalone worker ==========
+
+async def _main(args) -> None:
+    load_jobs()
+    await open_async_pool()
+    try:
+        if args.list:
+            await sync()
+            for r in await status():
+                print(f"{r['name']:<32} {r['schedule']:<16} {'on ' if r['enabled'] else 'off'} "
+                      f"next {r['next_run_at']:%Y-%m-%d %H:%M}  last {r['last_status'] or '-'} {r['last_result'] or ''}")
+        elif args.run:
+            if args.run not in _jobs:
+                sys.exit(f"Unknown job {args.run}; known: {', '.join(sorted(_jobs))}")
+            print(await _jobs[args.run].func())
+        else:
+            logger.info(f"Scheduler worker {_worker_id} running {', '.join(sorted(_jobs))}")
+            await _loop()
+    finally:
+        await close_async_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--list", action="store_true", help="show jobs and their last results")
+    p.add_argument("--run", metavar="NAME", help="run one job immediately, ignoring its schedule and lease")
+    try:
+        asyncio.run(_main(p.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -2,21 +2,31 @@ from typing import Optional
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 
+from .. import refdata
 from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import get_current_user, require_roles
+from ..auth import get_current_user, require_roles, ensure_student_access
+from ..http_cache import cache_policy
+from ..pagination import Keyset, Page, SortKey, page_params, paginate
 
 router = APIRouter(prefix="/students", tags=["students"])
 
+BY_NAME = Keyset(
+    "students",
+    SortKey("s.last_name", "text", "last_name"),
+    SortKey("s.first_name", "text", "first_name"),
+    SortKey("s.id", "uuid", "id"),
+)
+
 
 @router.get("")
 def list_students(
     form_id: Optional[str] = Query(None),
     class_id: Optional[str] = Query(None),
     academic_year_id: Optional[str] = Query(None),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=200),
+    page: Page = Depends(page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER"])),
 ):
+    tail, tail_params = BY_NAME.clause(page)
     with get_cursor() as cur:
         if class_id:
             cur.execute("""
@@ -27,9 +37,7 @@ def list_students(
                 JOIN classes c ON c.id = sc.class_id
                 JOIN forms f ON f.id = c.form_id
                 WHERE sc.class_id = %s
-                ORDER BY s.last_name, s.first_name
-                LIMIT %s OFFSET %s
-            """, (class_id, limit, skip))
+            """ + tail, [class_id, *tail_params])
         elif form_id and academic_year_id:
             cur.execute("""
                 SELECT s.id, s.first_name, s.last_name, s.gender, s.enrollment_status, c.name AS class_name
@@ -37,20 +45,19 @@ def list_students(
                 JOIN student_classes sc ON sc.student_id = s.id
                 JOIN classes c ON c.id = sc.class_id
                 WHERE c.form_id = %s AND sc.academic_year_id = %s
-                ORDER BY s.last_name
-                LIMIT %s OFFSET %s
-            """, (form_id, academic_year_id, limit, skip))
+            """ + tail, [form_id, academic_year_id, *tail_params])
         else:
             cur.execute("""
-                SELECT id, user_id, first_name, last_name, date_of_birth, gender, phone, enrollment_status, created_at
-                FROM students ORDER BY last_name, first_name LIMIT %s OFFSET %s
-            """, (limit, skip))
-        rows = cur.fetchall()
+                SELECT s.id, s.user_id, s.first_name, s.last_name, s.date_of_birth, s.gender, s.phone, s.enrollment_status, s.created_at
+                FROM students s WHERE 1=1
+            """ + tail, tail_params)
+        rows = paginate(page, BY_NAME, cur.fetchall())
         return [dict(r, id=str(r["id"]), user_id=str(r["user_id"]) if r.get("user_id") else None) for r in rows]
 
 
-@router.get("/me")
+@router.get("/me", dependencies=[cache_policy()])
 def get_my_profile(current=Depends(require_roles(["STUDENT"]))):
+    current_ay = refdata.current_academic_year_id()
     with get_cursor() as cur:
         s = fetch_one(cur, "SELECT * FROM students WHERE user_id = %s", (current["id"],))
         if not s:
@@ -64,8 +71,8 @@ def get_my_profile(current=Depends(require_roles(["STUDENT"]))):
             JOIN classes c ON c.id = sc.class_id
             JOIN forms f ON f.id = c.form_id
             JOIN streams s2 ON s2.id = c.stream_id
-            WHERE sc.student_id = %s AND sc.academic_year_id = (SELECT id FROM academic_years WHERE is_current = true LIMIT 1)
-        """, (out["id"],))
+            WHERE sc.student_id = %s AND sc.academic_year_id = %s
+        """, (out["id"], current_ay))
         cls = cur.fetchone()
         if cls:
             out["class_id"] = str(cls["class_id"])
@@ -80,15 +87,11 @@ def get_student(
     student_id: str,
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "PARENT"])),
 ):
+    ensure_student_access(current, student_id)
     with get_cursor() as cur:
         s = fetch_one(cur, "SELECT * FROM students WHERE id = %s", (student_id,))
         if not s:
             raise HTTPException(status_code=404)
-        if current["role"] == "PARENT":
-            cur.execute("SELECT 1 FROM parent_student_links WHERE parent_id = (SELECT id FROM parents WHERE user_id = %s) AND student_id = %s",
-                        (current["id"], student_id))
-            if not cur.fetchone():
-                raise HTTPException(status_code=403, detail="Not linked to this student")
         out = dict(s)
         out["id"] = str(out["id"])
         out["user_id"] = str(out["user_id"]) if out.get("user_id") else None
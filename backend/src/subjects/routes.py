@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 
-from ..db import get_cursor
+from .. import refdata
 from ..auth import require_roles
+from ..http_cache import conditional
 
 router = APIRouter(prefix="/subjects", tags=["subjects"])
 
 
 @router.get("")
-def list_subjects(current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT"]))):
-    with get_cursor() as cur:
-        cur.execute("SELECT id, name, code, is_examinable FROM subjects ORDER BY name")
-        return [dict(r, id=str(r["id"])) for r in cur.fetchall()]
+def list_subjects(
+    request: Request,
+    response: Response,
+    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT"])),
+):
+    entry = refdata.subjects()
+    conditional(request, response, entry.etag, max_age=600, private=True)
+    return entry.value
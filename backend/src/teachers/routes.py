@@ -1,29 +1,40 @@
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 
+from .. import refdata
 from ..db import get_cursor, fetch_one, fetch_all
 from ..auth import require_roles
+from ..http_cache import cache_policy
+from ..pagination import Keyset, Page, SortKey, page_params, paginate
 
 router = APIRouter(prefix="/teachers", tags=["teachers"])
 
+BY_NAME = Keyset(
+    "teachers",
+    SortKey("t.last_name", "text", "last_name"),
+    SortKey("t.first_name", "text", "first_name"),
+    SortKey("t.id", "uuid", "id"),
+)
+
 
 @router.get("")
 def list_teachers(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=200),
+    page: Page = Depends(page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF"])),
 ):
+    tail, tail_params = BY_NAME.clause(page)
     with get_cursor() as cur:
         cur.execute("""
             SELECT t.id, t.user_id, t.first_name, t.last_name, t.title, t.phone, t.employee_number
-            FROM teachers t ORDER BY t.last_name, t.first_name LIMIT %s OFFSET %s
-        """, (limit, skip))
-        rows = cur.fetchall()
+            FROM teachers t WHERE 1=1
+        """ + tail, tail_params)
+        rows = paginate(page, BY_NAME, cur.fetchall())
         return [dict(r, id=str(r["id"]), user_id=str(r["user_id"])) for r in rows]
 
 
-@router.get("/me")
+@router.get("/me", dependencies=[cache_policy()])
 def get_my_profile(current=Depends(require_roles(["TEACHER"]))):
+    current_ay = refdata.current_academic_year_id()
     with get_cursor() as cur:
         t = fetch_one(cur, "SELECT * FROM teachers WHERE user_id = %s", (current["id"],))
         if not t:
@@ -36,8 +47,8 @@ def get_my_profile(current=Depends(require_roles(["TEACHER"]))):
             FROM class_teachers ct
             JOIN classes c ON c.id = ct.class_id
             JOIN subjects sub ON sub.id = ct.subject_id
-            WHERE ct.teacher_id = %s AND ct.academic_year_id = (SELECT id FROM academic_years WHERE is_current = true LIMIT 1)
-        """, (out["id"],))
+            WHERE ct.teacher_id = %s AND ct.academic_year_id = %s
+        """, (out["id"], current_ay))
         out["classes"] = [dict(r, class_id=str(r["class_id"]), subject_id=str(r["subject_id"])) for r in cur.fetchall()]
         return out
 
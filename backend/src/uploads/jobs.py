@@ -0,0 +1,56 @@
+"""Scheduled upload jobs (see ``src/scheduler.py``)."""
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_all
+from .. import scheduler
+from .storage import get_storage
+from .store import partial_dir
+
+settings = get_settings()
+BATCH = 200
+
+
+def _sweep_partials(max_age: float) -> int:
+    """Delete staged files untouched for ``max_age`` seconds; appending a chunk touches them."""
+    cutoff, removed = time.time() - max_age, 0
+    with os.scandir(partial_dir()) as entries:
+        for e in entries:
+            if e.is_file() and e.stat().st_mtime < cutoff:
+                try:
+                    os.remove(e.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    return removed
+
+
+@scheduler.job("uploads.collect_garbage", "40 * * * *")
+async def collect_garbage():
+    """Drop abandoned resumable uploads, and the objects no upload refers to any more."""
+    async with get_async_cursor() as cur:
+        await cur.execute("DELETE FROM file_uploads WHERE status = 'PENDING' AND expires_at < NOW()")
+        abandoned = cur.rowcount
+    staged = await run_in_threadpool(_sweep_partials, settings.upload_resume_hours * 3600)
+    storage, blobs = get_storage(), 0
+    while True:
+        async with get_async_cursor() as cur:
+            rows = await fetch_all(cur, """
+                DELETE FROM file_blobs WHERE sha256 IN (
+                    SELECT sha256 FROM file_blobs WHERE ref_count = 0
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING sha256
+            """, (BATCH,))
+            # Objects go before the rows commit: an upload of the same bytes waits on
+            # these row locks, then finds no blob and stores its own copy
+            for r in rows:
+                await run_in_threadpool(storage.delete, r["sha256"])
+        blobs += len(rows)
+        if len(rows) < BATCH:
+            break
+    return {"abandoned_uploads": abandoned, "staged_files": staged, "blobs": blobs}
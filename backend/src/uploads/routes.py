@@ -1,15 +1,30 @@
 import os
 import uuid
-import aiofiles
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, UploadFile, File
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 from ..config import get_settings
 from ..auth import require_roles
+from ..ids import ids_or_404
+from . import store
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 settings = get_settings()
 
+ALL_ROLES = ["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"]
+ADMIN_ROLES = ("SUPER_ADMIN", "ADMIN_STAFF")
+READ_CHUNK = 64 * 1024
+
+
+class ResumableBody(BaseModel):
+    file_name: Optional[str] = Field(None, max_length=255)
+    content_type: Optional[str] = Field(None, max_length=100)
+    length: int = Field(..., gt=0)
+
 
 def _upload_dir() -> str:
     d = settings.upload_dir
@@ -17,32 +32,122 @@ def _upload_dir() -> str:
     return d
 
 
+def _file_out(row: dict) -> dict:
+    url = f"/api/uploads/{row['id']}"
+    return {
+        "id": str(row["id"]),
+        "file_name": row["file_name"],
+        "content_type": row["content_type"],
+        "size": row["length"],
+        "sha256": row["sha256"],
+        "url": url,
+        "path": url,
+        "saved_as": str(row["id"]),
+    }
+
+
+def _upload_out(row: dict) -> dict:
+    out = {"id": str(row["id"]), "offset": row["received"], "length": row["length"], "status": row["status"]}
+    if row["status"] == "COMPLETE":
+        out["file"] = _file_out(row)
+    return out
+
+
+async def _get_upload(upload_id: str, current: dict, any_owner: bool = False) -> dict:
+    """The upload, if the caller owns it (or, with ``any_owner``, is staff); 404 otherwise."""
+    ids_or_404(upload_id, detail="Upload not found")
+    row = await store.get(upload_id)
+    if not row or (str(row["owner_id"]) != current["id"] and not (any_owner and current["role"] in ADMIN_ROLES)):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return row
+
+
+async def _file_chunks(file: UploadFile):
+    while chunk := await file.read(READ_CHUNK):
+        yield chunk
+
+
 @router.post("")
 async def upload_file(
     file: UploadFile = File(...),
-    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
+    current=Depends(require_roles(ALL_ROLES)),
 ):
-    ext = os.path.splitext(file.filename or "")[1] or ".bin"
-    name = f"{uuid.uuid4()}{ext}"
-    path = os.path.join(_upload_dir(), name)
-    size = 0
-    max_bytes = settings.max_upload_mb * 1024 * 1024
-    async with aiofiles.open(path, "wb") as f:
-        while chunk := await file.read(8192):
-            size += len(chunk)
-            if size > max_bytes:
-                os.remove(path)
-                raise HTTPException(status_code=413, detail="File too large")
-            await f.write(chunk)
-    return {"path": path, "file_name": file.filename, "saved_as": name}
+    row = await store.save(current["id"], file.filename, file.content_type, _file_chunks(file))
+    return _file_out(row)
+
+
+@router.post("/resumable", status_code=201)
+async def create_resumable(
+    body: ResumableBody,
+    response: Response,
+    current=Depends(require_roles(ALL_ROLES)),
+):
+    """Start an upload sent in chunks with ``PATCH``; a dropped connection resumes from ``HEAD``'s offset."""
+    row = await store.create(current["id"], body.file_name, body.content_type, body.length)
+    response.headers["Location"] = f"/api/uploads/resumable/{row['id']}"
+    return _upload_out(row)
+
+
+@router.head("/resumable/{upload_id}")
+async def resumable_offset(upload_id: str, current=Depends(require_roles(ALL_ROLES))):
+    row = await _get_upload(upload_id, current)
+    return Response(headers={"Upload-Offset": str(row["received"]), "Upload-Length": str(row["length"]),
+                             "Cache-Control": "no-store"})
+
+
+@router.get("/resumable/{upload_id}")
+async def resumable_status(upload_id: str, current=Depends(require_roles(ALL_ROLES))):
+    return _upload_out(await _get_upload(upload_id, current))
+
+
+@router.patch("/resumable/{upload_id}")
+async def append_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    current=Depends(require_roles(ALL_ROLES)),
+):
+    """Append the request body at ``Upload-Offset``: 204 with the new offset, or 200 with the file after the last chunk.
+
+    409 (with the server's ``Upload-Offset``) when the offset is stale; resume from there.
+    """
+    row = await store.append(await _get_upload(upload_id, current), upload_offset, request.stream())
+    headers = {"Upload-Offset": str(row["received"])}
+    if row["status"] == "COMPLETE":
+        return JSONResponse(_file_out(row), headers=headers)
+    return Response(status_code=204, headers=headers)
+
+
+@router.delete("/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str, current=Depends(require_roles(ALL_ROLES))):
+    """Delete a file or abandon an unfinished upload (owner or staff)."""
+    await store.delete(await _get_upload(upload_id, current, any_owner=True))
 
 
 @router.get("/{filename}")
-def download_file(
+async def download_file(
     filename: str,
-    current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT"])),
+    current=Depends(require_roles(ALL_ROLES)),
 ):
-    path = os.path.join(_upload_dir(), filename)
-    if not os.path.isfile(path):
+    try:
+        uuid.UUID(filename)
+    except ValueError:
+        # Files saved before content-addressed storage: <uuid>.<ext> in upload_dir
+        path = os.path.join(_upload_dir(), os.path.basename(filename))
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404)
+        return FileResponse(path, filename=filename)
+    row = await store.get(filename)
+    if not row or row["status"] != "COMPLETE":
         raise HTTPException(status_code=404)
-    return FileResponse(path, filename=filename)
+    # An id's content never changes
+    headers = {"Cache-Control": "private, max-age=86400", "ETag": f'"{row["sha256"]}"'}
+    name = row["file_name"] or str(row["id"])
+    path, chunks = store.open_object(row)
+    if path is not None:
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404)
+        return FileResponse(path, media_type=row["content_type"], filename=name, headers=headers)
+    headers["Content-Length"] = str(row["length"])
+    headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(name)}"
+    return StreamingResponse(chunks, media_type=row["content_type"] or "application/octet-stream", headers=headers)
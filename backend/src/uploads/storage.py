@@ -0,0 +1,142 @@
+"""Content-addressed object storage for uploaded files.
+
+Objects are keyed by the SHA-256 of their bytes and sharded by its first
+two byte pairs (``ab/cd/abcd...``), so identical uploads share one object
+and no directory grows past a few hundred entries. ``upload_storage``
+selects the backend:
+
+- ``local``: ``<upload_dir>/objects/``; downloads are served with sendfile.
+- ``s3``: a bucket on AWS or any S3-compatible server (``upload_s3_endpoint``,
+  e.g. a MinIO container). Needs ``boto3``; credentials come from the usual
+  ``AWS_*`` environment variables.
+
+Backends only store and fetch bytes. Which objects are still referenced is
+tracked in ``file_blobs`` (see ``src/uploads/store.py``).
+"""
+import os
+import shutil
+import uuid
+from functools import lru_cache
+from typing import Iterator, Optional
+
+from ..config import get_settings
+
+settings = get_settings()
+
+READ_CHUNK = 64 * 1024
+
+
+def shard(digest: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+class Storage:
+    """What a backend provides; all methods block, so call them from a worker thread."""
+
+    name = ""
+
+    def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def put(self, digest: str, src_path: str) -> None:
+        """Store a copy of the file at ``src_path`` under ``digest``; the caller still removes the file."""
+        raise NotImplementedError
+
+    def delete(self, digest: str) -> None:
+        raise NotImplementedError
+
+    def read(self, digest: str) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """A filesystem path to serve directly, or None when the object is remote."""
+        return None
+
+
+class LocalStorage(Storage):
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, *shard(digest).split("/"))
+
+    def exists(self, digest: str) -> bool:
+        return os.path.isfile(self._path(digest))
+
+    def put(self, digest: str, src_path: str) -> None:
+        dest = self._path(digest)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(src_path, dest)  # same filesystem as the staging directory: no copy, and atomic
+        except FileExistsError:
+            pass
+        except OSError:
+            tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(src_path, tmp)
+            os.replace(tmp, dest)
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def read(self, digest: str) -> Iterator[bytes]:
+        with open(self._path(digest), "rb") as f:
+            while chunk := f.read(READ_CHUNK):
+                yield chunk
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self._path(digest)
+
+
+class S3Storage(Storage):
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix: str = "objects/"):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("upload_storage=s3 needs boto3 installed")
+        if not bucket:
+            raise RuntimeError("upload_storage=s3 needs upload_s3_bucket")
+        self._client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self._missing = ClientError
+        self.bucket, self.prefix = bucket, prefix
+
+    def _key(self, digest: str) -> str:
+        return self.prefix + shard(digest)
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._key(digest))
+        except self._missing as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def put(self, digest: str, src_path: str) -> None:
+        self._client.upload_file(src_path, self.bucket, self._key(digest))
+
+    def delete(self, digest: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=self._key(digest))
+
+    def read(self, digest: str) -> Iterator[bytes]:
+        body = self._client.get_object(Bucket=self.bucket, Key=self._key(digest))["Body"]
+        try:
+            yield from body.iter_chunks(READ_CHUNK)
+        finally:
+            body.close()
+
+
+@lru_cache()
+def get_storage() -> Storage:
+    if settings.upload_storage == "local":
+        return LocalStorage(os.path.join(settings.upload_dir, "objects"))
+    if settings.upload_storage == "s3":
+        return S3Storage(settings.upload_s3_bucket, settings.upload_s3_endpoint)
+    raise ValueError(f"Unknown upload_storage {settings.upload_storage!r}; use 'local' or 's3'")
@@ -0,0 +1,268 @@
+"""Uploaded files: staging, resumable chunks and deduplicated storage.
+
+An upload is a ``file_uploads`` row (migration 0017). A plain ``POST
+/uploads`` streams to a staging file while hashing and stores it in one go.
+A resumable upload is created with its length, then sent in chunks, each
+tagged with the byte offset it starts at (as in tus). A chunk is first
+written to its own temp file, off the DB connection, then appended under
+the row lock only if the offset still matches, so a retried or duplicated
+chunk can never be applied twice. The last chunk is instead copied after
+the staged bytes into a new file, hashed on the way, and stored; only then
+is the row locked to mark the upload complete.
+
+Storing is deduplicated and kept out of the final transaction. A blob row
+for the hash is registered first (unreferenced, in its own short
+transaction, so ``uploads.collect_garbage`` cleans up the object if the
+upload never completes) and the object is written to the backend if it is
+not already there. The final transaction only upserts the blob row (taking
+its row lock) and points the upload at it; a trigger keeps the blob's
+reference count. The collector deletes objects of unreferenced blobs under
+the same row locks, so after taking the lock the object is checked once
+more and written again in the rare case the collector removed it between
+the two steps.
+
+Staged bytes live under ``<upload_dir>/partial``, which must be shared by
+every API worker that may receive a chunk.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from typing import AsyncIterator, Optional
+
+import aiofiles
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import get_settings
+from ..db_async import get_async_cursor, fetch_one
+from .storage import get_storage
+
+settings = get_settings()
+
+HASH_CHUNK = 1024 * 1024
+FILE_COLUMNS = "id, owner_id, file_name, content_type, length, received, sha256, status, created_at"
+
+
+def partial_dir() -> str:
+    d = os.path.join(settings.upload_dir, "partial")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def partial_path(upload_id) -> str:
+    return os.path.join(partial_dir(), str(upload_id))
+
+
+def _max_bytes() -> int:
+    return settings.max_upload_mb * 1024 * 1024
+
+
+def _too_large():
+    return HTTPException(status_code=413, detail="File too large")
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _put(digest: str, size: int, staged: str) -> None:
+    """Write the object for ``digest`` unless it is stored already; holds no connection while copying."""
+    async with get_async_cursor() as cur:
+        await cur.execute("INSERT INTO file_blobs (sha256, size) VALUES (%s, %s) ON CONFLICT (sha256) DO NOTHING",
+                          (digest, size))
+    storage = get_storage()
+    if not await run_in_threadpool(storage.exists, digest):
+        await run_in_threadpool(storage.put, digest, staged)
+
+
+async def _claim(cur, digest: str, size: int, staged: str) -> None:
+    """Lock blob ``digest`` until the caller commits; it was stored by ``_put``."""
+    await cur.execute("""
+        INSERT INTO file_blobs (sha256, size) VALUES (%s, %s)
+        ON CONFLICT (sha256) DO UPDATE SET size = EXCLUDED.size
+    """, (digest, size))
+    storage = get_storage()
+    if not await run_in_threadpool(storage.exists, digest):
+        # The garbage collector removed it after _put; the row lock now keeps it out
+        await run_in_threadpool(storage.put, digest, staged)
+
+
+async def save(owner_id: str, file_name: Optional[str], content_type: Optional[str],
+               chunks: AsyncIterator[bytes]) -> dict:
+    """Store a complete file in one request."""
+    staged = partial_path(uuid.uuid4())
+    h, size = hashlib.sha256(), 0
+    try:
+        async with aiofiles.open(staged, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > _max_bytes():
+                    raise _too_large()
+                h.update(chunk)
+                await f.write(chunk)
+        digest = h.hexdigest()
+        await _put(digest, size, staged)
+        async with get_async_cursor() as cur:
+            await _claim(cur, digest, size, staged)
+            return await fetch_one(cur, f"""
+                INSERT INTO file_uploads (owner_id, file_name, content_type, length, received, sha256, status)
+                VALUES (%s, %s, %s, %s, %s, %s, 'COMPLETE')
+                RETURNING {FILE_COLUMNS}
+            """, (owner_id, file_name, content_type, size, size, digest))
+    finally:
+        _remove(staged)
+
+
+async def create(owner_id: str, file_name: Optional[str], content_type: Optional[str], length: int) -> dict:
+    """Start a resumable upload of ``length`` bytes."""
+    if length > _max_bytes():
+        raise _too_large()
+    async with get_async_cursor() as cur:
+        return await fetch_one(cur, f"""
+            INSERT INTO file_uploads (owner_id, file_name, content_type, length, expires_at)
+            VALUES (%s, %s, %s, %s, NOW() + make_interval(hours => %s))
+            RETURNING {FILE_COLUMNS}
+        """, (owner_id, file_name, content_type, length, settings.upload_resume_hours))
+
+
+async def get(upload_id: str) -> Optional[dict]:
+    async with get_async_cursor(commit=False) as cur:
+        return await fetch_one(cur, f"SELECT {FILE_COLUMNS} FROM file_uploads WHERE id = %s", (upload_id,))
+
+
+def _offset_conflict(received: int):
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload-Offset does not match",
+                         headers={"Upload-Offset": str(received)})
+
+
+def _staged_size(partial: str) -> int:
+    return os.path.getsize(partial) if os.path.exists(partial) else 0
+
+
+def _append(partial: str, chunk_path: str, offset: int) -> int:
+    """Append a chunk at ``offset``; returns the staged size instead when bytes before it are missing."""
+    staged = _staged_size(partial)
+    if staged < offset:
+        return staged
+    with open(partial, "ab") as out:
+        out.truncate(offset)  # bytes of a chunk whose commit never happened
+        with open(chunk_path, "rb") as src:
+            shutil.copyfileobj(src, out)
+    return offset
+
+
+def _assemble(partial: str, chunk_path: str, offset: int, dest: str) -> Optional[str]:
+    """Write the staged bytes up to ``offset`` and then the last chunk to ``dest``; returns their SHA-256.
+
+    None when bytes before ``offset`` are missing. Bytes below the committed
+    offset never change, so this needs no lock.
+    """
+    if _staged_size(partial) < offset:
+        return None
+    h = hashlib.sha256()
+    with open(dest, "wb") as out:
+        with open(partial, "rb") as src:
+            left = offset
+            while left and (data := src.read(min(HASH_CHUNK, left))):
+                h.update(data)
+                out.write(data)
+                left -= len(data)
+        if left:
+            return None
+        with open(chunk_path, "rb") as src:
+            while data := src.read(HASH_CHUNK):
+                h.update(data)
+                out.write(data)
+    return h.hexdigest()
+
+
+async def append(upload: dict, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+    """Add the bytes from ``offset``; the returned row is COMPLETE after the last chunk."""
+    if upload["status"] != "PENDING":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already complete")
+    if offset != upload["received"]:
+        raise _offset_conflict(upload["received"])
+    upload_id, length = str(upload["id"]), upload["length"]
+    partial = partial_path(upload_id)
+    chunk_path = f"{partial}.{uuid.uuid4().hex}"
+    complete, digest, n = None, None, 0
+    try:
+        # Receive the chunk before touching the row: a slow client holds no connection or lock
+        async with aiofiles.open(chunk_path, "wb") as f:
+            async for data in chunks:
+                n += len(data)
+                if offset + n > length:
+                    raise HTTPException(status_code=413, detail="More bytes than the upload's length")
+                await f.write(data)
+        last = offset + n == length
+        if last:
+            # Build, hash and store the whole file before locking anything
+            complete = f"{chunk_path}.complete"
+            digest = await run_in_threadpool(_assemble, partial, chunk_path, offset, complete)
+            if digest is not None:
+                await _put(digest, length, complete)
+        async with get_async_cursor() as cur:
+            row = await fetch_one(cur, "SELECT received FROM file_uploads WHERE id = %s AND status = 'PENDING' FOR UPDATE",
+                                  (upload_id,))
+            if row is None:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already complete")
+            if row["received"] != offset:
+                raise _offset_conflict(row["received"])
+            if digest is not None:
+                staged = offset
+            elif last:
+                staged = await run_in_threadpool(_staged_size, partial)
+            else:
+                staged = await run_in_threadpool(_append, partial, chunk_path, offset)
+            if staged < offset:
+                # Staged bytes were lost (another host, or cleaned up): resume from what is there
+                await cur.execute("UPDATE file_uploads SET received = %s, updated_at = NOW() WHERE id = %s",
+                                  (staged, upload_id))
+                conflict = staged
+            elif not last:
+                conflict = None
+                upload = await fetch_one(cur, f"""
+                    UPDATE file_uploads SET received = %s, updated_at = NOW(),
+                        expires_at = NOW() + make_interval(hours => %s)
+                    WHERE id = %s
+                    RETURNING {FILE_COLUMNS}
+                """, (offset + n, settings.upload_resume_hours, upload_id))
+            else:
+                conflict = None
+                await _claim(cur, digest, length, complete)
+                upload = await fetch_one(cur, f"""
+                    UPDATE file_uploads SET received = length, sha256 = %s, status = 'COMPLETE',
+                        updated_at = NOW(), expires_at = NULL
+                    WHERE id = %s
+                    RETURNING {FILE_COLUMNS}
+                """, (digest, upload_id))
+        if conflict is not None:
+            raise _offset_conflict(conflict)
+        if upload["status"] == "COMPLETE":
+            _remove(partial)
+        return upload
+    finally:
+        _remove(chunk_path)
+        if complete is not None:
+            _remove(complete)
+
+
+async def delete(upload: dict) -> None:
+    """Remove an upload; its object goes once no other upload refers to it."""
+    async with get_async_cursor() as cur:
+        await cur.execute("DELETE FROM file_uploads WHERE id = %s", (upload["id"],))
+    if upload["status"] == "PENDING":
+        _remove(partial_path(upload["id"]))
+
+
+def open_object(upload: dict):
+    """``(local path, None)`` to send a stored file, or ``(None, chunk iterator)`` for a remote one."""
+    storage = get_storage()
+    path = storage.local_path(upload["sha256"])
+    if path is not None:
+        return path, None
+    return None, storage.read(upload["sha256"])
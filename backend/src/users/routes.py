@@ -2,11 +2,20 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from pydantic import BaseModel, EmailStr
 
-from ..db import get_cursor, fetch_one, fetch_all
-from ..auth import require_roles, hash_password
+from ..db import get_cursor
+from ..db_async import get_async_cursor, fetch_one
+from ..auth import require_roles, hash_password_async
+from ..ids import ids_or_404
+from ..pagination import Keyset, Page, SortKey, page_params, paginate
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+NEWEST_FIRST = Keyset(
+    "users",
+    SortKey("created_at", "timestamptz", "created_at", desc=True),
+    SortKey("id", "uuid", "id", desc=True),
+)
+
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -21,41 +30,67 @@ class UserUpdate(BaseModel):
 @router.get("")
 def list_users(
     role: Optional[str] = Query(None),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    page: Page = Depends(page_params),
     current=Depends(require_roles(["SUPER_ADMIN", "ADMIN_STAFF"])),
 ):
     with get_cursor() as cur:
+        q = "SELECT id, email, role, is_active, created_at FROM users WHERE 1=1"
+        params = []
         if role:
-            cur.execute(
-                "SELECT id, email, role, is_active, created_at FROM users WHERE role = %s ORDER BY created_at DESC LIMIT %s OFFSET %s",
-                (role, limit, skip),
-            )
-        else:
-            cur.execute(
-                "SELECT id, email, role, is_active, created_at FROM users ORDER BY created_at DESC LIMIT %s OFFSET %s",
-                (limit, skip),
-            )
-        rows = cur.fetchall()
+            q += " AND role = %s"
+            params.append(role)
+        tail, tail_params = NEWEST_FIRST.clause(page)
+        cur.execute(q + tail, params + tail_params)
+        rows = paginate(page, NEWEST_FIRST, cur.fetchall())
         return [dict(r, id=str(r["id"])) for r in rows]
 
 
 @router.post("")
-def create_user(
+async def create_user(
     data: UserCreate,
     current=Depends(require_roles(["SUPER_ADMIN"])),
 ):
     allowed = ["SUPER_ADMIN", "ADMIN_STAFF", "TEACHER", "STUDENT", "PARENT", "FINANCE_OFFICER"]
     if data.role not in allowed:
         raise HTTPException(status_code=400, detail="Invalid role")
-    with get_cursor() as cur:
-        cur.execute("SELECT id FROM users WHERE LOWER(email) = LOWER(%s)", (data.email,))
-        if cur.fetchone():
+    async with get_async_cursor(commit=False) as cur:
+        if await fetch_one(cur, "SELECT id FROM users WHERE LOWER(email) = LOWER(%s)", (data.email,)):
             raise HTTPException(status_code=400, detail="Email already registered")
-        ph = hash_password(data.password)
-        cur.execute(
-            "INSERT INTO users (email, password_hash, role) VALUES (%s, %s, %s) RETURNING id, email, role",
+    # Hash in the hashing pool, between transactions
+    ph = await hash_password_async(data.password)
+    async with get_async_cursor() as cur:
+        row = await fetch_one(
+            cur,
+            """
+            INSERT INTO users (email, password_hash, role) VALUES (%s, %s, %s)
+            ON CONFLICT (email) DO NOTHING
+            RETURNING id, email, role
+            """,
             (data.email, ph, data.role),
         )
-        row = cur.fetchone()
-        return dict(row, id=str(row["id"]))
+    if not row:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return dict(row, id=str(row["id"]))
+
+
+@router.patch("/{user_id}")
+async def update_user(
+    user_id: str,
+    data: UserUpdate,
+    current=Depends(require_roles(["SUPER_ADMIN"])),
+):
+    """Deactivating a user also revokes their tokens (trigger from migration 0014)."""
+    ids_or_404(user_id, detail="User not found")
+    if data.is_active is False and user_id == current["id"]:
+        raise HTTPException(status_code=400, detail="You cannot deactivate your own account")
+    async with get_async_cursor() as cur:
+        if data.is_active is not None:
+            row = await fetch_one(cur, """
+                UPDATE users SET is_active = %s, updated_at = NOW() WHERE id = %s
+                RETURNING id, email, role, is_active, created_at
+            """, (data.is_active, user_id))
+        else:
+            row = await fetch_one(cur, "SELECT id, email, role, is_active, created_at FROM users WHERE id = %s", (user_id,))
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    return dict(row, id=str(row["id"]))
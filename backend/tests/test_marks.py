@@ -0,0 +1,68 @@
+import io
+from decimal import Decimal
+
+import pytest
+
+from src.exams import marks
+from src.exams.marks import validate_rows
+
+ALICE = "5f0c6a1e-0000-4000-8000-000000000001"
+BOB = "5f0c6a1e-0000-4000-8000-000000000002"
+ROSTER = {"1001": ALICE, ALICE: ALICE, "UC-2": BOB, BOB: BOB}
+
+
+def errors_of(rows, total=100):
+    return [(e["row"], e["error"]) for e in validate_rows(rows, ROSTER, total)[1]]
+
+
+def test_accepts_numbers_ids_and_strings():
+    accepted, errors = validate_rows([(2, "1001", "45"), (3, f" {BOB} ", 60.5)], ROSTER, 100)
+    assert accepted == [(2, ALICE, Decimal("45")), (3, BOB, Decimal("60.5"))]
+    assert errors == []
+
+
+def test_float_student_numbers_from_spreadsheets():
+    accepted, errors = validate_rows([(2, 1001.0, 70)], ROSTER, 100)
+    assert accepted == [(2, ALICE, Decimal("70"))]
+    assert errors == []
+
+
+def test_fractional_float_is_not_truncated():
+    assert errors_of([(2, 1001.5, 70)]) == [(2, "Student not found in this class")]
+
+
+def test_later_row_for_same_student_is_a_duplicate():
+    accepted, errors = validate_rows([(2, "1001", 40), (3, ALICE, 90), (4, 1001.0, 95)], ROSTER, 100)
+    assert accepted == [(2, ALICE, Decimal("40"))]
+    assert [(e["row"], e["error"]) for e in errors] == [(3, "Duplicate of row 2"), (4, "Duplicate of row 2")]
+
+
+def test_rejected_row_does_not_block_a_later_valid_one():
+    accepted, errors = validate_rows([(2, "1001", "abc"), (3, "1001", 50)], ROSTER, 100)
+    assert accepted == [(3, ALICE, Decimal("50"))]
+    assert [e["row"] for e in errors] == [2]
+
+
+@pytest.mark.parametrize("ref, raw, error", [
+    (None, 50, "Missing student number"),
+    ("  ", 50, "Missing student number"),
+    ("9999", 50, "Student not found in this class"),
+    ("1001", None, "Missing marks"),
+    ("1001", " ", "Missing marks"),
+    ("1001", "abc", "Marks 'abc' is not a number"),
+    ("1001", "NaN", "Marks must be between 0 and 50"),
+    ("1001", -1, "Marks must be between 0 and 50"),
+    ("1001", "50.5", "Marks must be between 0 and 50"),
+])
+def test_row_errors(ref, raw, error):
+    assert errors_of([(7, ref, raw)], total=50) == [(7, error)]
+
+
+def test_read_csv_finds_columns_and_skips_blank_rows():
+    data = b"\xef\xbb\xbfName,Student Number,Marks\nAlice,1001,45\n,,\nBob,UC-2\n"
+    assert marks.read_csv(io.BytesIO(data)) == [(2, "1001", "45"), (4, "UC-2", None)]
+
+
+def test_read_csv_needs_student_and_marks_columns():
+    with pytest.raises(marks.SheetError):
+        marks.read_csv(io.BytesIO(b"name,score\nAlice,10\n"))
@@ -0,0 +1,173 @@
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src import scheduler
+from src.scheduler import Cron, Job
+
+UTC = timezone.utc
+LONDON = ZoneInfo("Europe/London")
+
+
+def runs(expr, start, n):
+    out, t = [], start
+    for _ in range(n):
+        t = Cron(expr).next_after(t)
+        out.append(t)
+    return out
+
+
+def utc_runs(expr, start, n, monkeypatch):
+    monkeypatch.setattr(scheduler, "_zone", lambda: LONDON)
+    j, out, t = Job("test", Cron(expr), None, 60), [], start
+    for _ in range(n):
+        t = scheduler.next_run(j, t)
+        out.append(t)
+    return out
+
+
+# ========== Cron.next_after ==========
+
+def test_strictly_after():
+    assert Cron("0 9 * * *").next_after(datetime(2026, 1, 5, 9, 0)) == datetime(2026, 1, 6, 9, 0)
+    assert Cron("* * * * *").next_after(datetime(2026, 1, 5, 9, 0, 59)) == datetime(2026, 1, 5, 9, 1)
+
+
+def test_steps():
+    assert runs("*/15 * * * *", datetime(2026, 1, 5, 10, 7), 3) == [
+        datetime(2026, 1, 5, 10, 15), datetime(2026, 1, 5, 10, 30), datetime(2026, 1, 5, 10, 45)]
+    assert runs("5/20 * * * *", datetime(2026, 1, 5, 10, 0), 4) == [
+        datetime(2026, 1, 5, 10, 5), datetime(2026, 1, 5, 10, 25), datetime(2026, 1, 5, 10, 45),
+        datetime(2026, 1, 5, 11, 5)]
+    assert runs("0 8-18/5 * * *", datetime(2026, 1, 5, 9, 0), 3) == [
+        datetime(2026, 1, 5, 13, 0), datetime(2026, 1, 5, 18, 0), datetime(2026, 1, 6, 8, 0)]
+
+
+def test_weekday_range_and_sunday_as_7():
+    # 2026-01-09 is a Friday
+    assert Cron("0 9 * * 1-5").next_after(datetime(2026, 1, 9, 10, 0)) == datetime(2026, 1, 12, 9, 0)
+    assert Cron("0 0 * * 7").next_after(datetime(2026, 1, 9)) == datetime(2026, 1, 11)
+    assert Cron("0 0 * * 0").next_after(datetime(2026, 1, 9)) == datetime(2026, 1, 11)
+
+
+def test_day_and_weekday_either_matches():
+    # The 13th or any Friday; 2026-10-01 is a Thursday, the 13th a Tuesday
+    assert runs("0 0 13 * 5", datetime(2026, 10, 1), 4) == [
+        datetime(2026, 10, 2), datetime(2026, 10, 9), datetime(2026, 10, 13), datetime(2026, 10, 16)]
+
+
+def test_wildcard_weekday_does_not_widen_day():
+    assert Cron("0 0 13 * *").next_after(datetime(2026, 10, 1)) == datetime(2026, 10, 13)
+    assert Cron("0 0 * * 5").next_after(datetime(2026, 10, 3)) == datetime(2026, 10, 9)
+
+
+def test_short_months_are_skipped():
+    assert runs("0 0 31 * *", datetime(2026, 1, 31), 2) == [datetime(2026, 3, 31), datetime(2026, 5, 31)]
+
+
+def test_feb_29():
+    assert Cron("0 0 29 2 *").next_after(datetime(2026, 3, 1)) == datetime(2028, 2, 29)
+    assert Cron("0 12 29 2 *").next_after(datetime(2028, 2, 29, 11, 59)) == datetime(2028, 2, 29, 12, 0)
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "0 24 * * *", "0 0 0 * *", "0 0 * 13 *",
+                                  "0 0 * * 8", "5-1 * * * *", "a * * * *"])
+def test_invalid(expr):
+    with pytest.raises(ValueError):
+        Cron(expr)
+
+
+def test_never_matches():
+    with pytest.raises(ValueError):
+        Cron("0 0 30 2 *").next_after(datetime(2026, 1, 1))
+
+
+# ========== next_run across DST (Europe/London) ==========
+
+def test_clocks_forward_runs_skipped_time_an_hour_later(monkeypatch):
+    # 2026-03-29 01:00 GMT becomes 02:00 BST; 01:30 never happens
+    assert utc_runs("30 1 * * *", datetime(2026, 3, 28, 2, 0, tzinfo=UTC), 2, monkeypatch) == [
+        datetime(2026, 3, 29, 1, 30, tzinfo=UTC), datetime(2026, 3, 30, 0, 30, tzinfo=UTC)]
+
+
+def test_clocks_forward_hourly(monkeypatch):
+    assert utc_runs("0 * * * *", datetime(2026, 3, 28, 23, 30, tzinfo=UTC), 3, monkeypatch) == [
+        datetime(2026, 3, 29, 0, 0, tzinfo=UTC), datetime(2026, 3, 29, 1, 0, tzinfo=UTC),
+        datetime(2026, 3, 29, 2, 0, tzinfo=UTC)]
+
+
+def test_clocks_back_fixed_time_runs_once(monkeypatch):
+    # 2026-10-25 02:00 BST becomes 01:00 GMT; 01:30 happens twice
+    assert utc_runs("30 1 * * *", datetime(2026, 10, 24, 23, 0, tzinfo=UTC), 2, monkeypatch) == [
+        datetime(2026, 10, 25, 0, 30, tzinfo=UTC), datetime(2026, 10, 26, 1, 30, tzinfo=UTC)]
+    assert utc_runs("30 1 * * *", datetime(2026, 10, 25, 1, 10, tzinfo=UTC), 1, monkeypatch) == [
+        datetime(2026, 10, 26, 1, 30, tzinfo=UTC)]
+
+
+def test_clocks_back_hourly_runs_in_both_passes(monkeypatch):
+    assert utc_runs("*/30 * * * *", datetime(2026, 10, 24, 23, 45, tzinfo=UTC), 6, monkeypatch) == [
+        datetime(2026, 10, 25, 0, 0, tzinfo=UTC), datetime(2026, 10, 25, 0, 30, tzinfo=UTC),
+        datetime(2026, 10, 25, 1, 0, tzinfo=UTC), datetime(2026, 10, 25, 1, 30, tzinfo=UTC),
+        datetime(2026, 10, 25, 2, 0, tzinfo=UTC), datetime(2026, 10, 25, 2, 30, tzinfo=UTC)]
+
+
+# ========== Leases ==========
+
+class FakeLeases:
+    """``scheduled_jobs`` as far as run_due touches it: a lease per job name."""
+
+    def __init__(self, job):
+        self.job, self.locked_by, self.renewals, self.finished = job, None, 0, None
+
+    @contextlib.asynccontextmanager
+    async def cursor(self, commit=True):
+        yield self
+
+    async def execute(self, sql, params):
+        self.rowcount = 0
+        if "locked_until = NOW() + make_interval" in sql:
+            if params[1] == self.locked_by:
+                self.renewals, self.rowcount = self.renewals + 1, 1
+        elif "last_status" in sql:
+            if params[-1] == self.locked_by:
+                self.finished, self.locked_by = params[1], None
+
+    async def claim(self):
+        self.locked_by = "worker:token"
+        return self.job, self.locked_by
+
+
+def fake_leases(monkeypatch, func, lease_seconds=3):
+    leases = FakeLeases(Job("test", Cron("* * * * *"), func, lease_seconds))
+    monkeypatch.setattr(scheduler, "get_async_cursor", leases.cursor)
+    monkeypatch.setattr(scheduler, "claim", leases.claim)
+    return leases
+
+
+def test_lease_renewed_while_job_runs(monkeypatch):
+    async def slow():
+        await asyncio.sleep(2.5)
+        return {"done": 1}
+
+    leases = fake_leases(monkeypatch, slow)
+    assert asyncio.run(scheduler.run_due())
+    assert leases.renewals == 2 and leases.finished == "OK"
+
+
+def test_lost_lease_cancels_run(monkeypatch):
+    cancelled = []
+
+    async def slow():
+        leases.locked_by = "other:token"  # lease expired and another worker took the job
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    leases = fake_leases(monkeypatch, slow)
+    assert asyncio.run(scheduler.run_due())
+    assert cancelled and leases.finished is None and leases.locked_by == "other:token"
@@ -0,0 +1,214 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from src.finance import statements
+from src.finance.statements import InvoiceIndex, Line, match_lines, parse_amount, parse_date
+
+STUDENT = "5f0c6a1e-0000-4000-8000-000000000001"
+OTHER = "5f0c6a1e-0000-4000-8000-000000000002"
+OLDER = "0a1b2c3d-0000-4000-8000-00000000000a"
+NEWER = "0a1b2c3d-0000-4000-8000-00000000000b"
+ELSEWHERE = "0a1b2c3d-0000-4000-8000-00000000000c"
+
+
+def index():
+    return InvoiceIndex([
+        {"id": OLDER, "student_id": STUDENT, "student_number": "UC001", "outstanding": "100.00"},
+        {"id": NEWER, "student_id": STUDENT, "student_number": "UC001", "outstanding": "50.00"},
+        {"id": ELSEWHERE, "student_id": OTHER, "student_number": "UC002", "outstanding": "80.00"},
+    ])
+
+
+def lines(data, reader):
+    return list(reader(io.BytesIO(data.encode())))
+
+
+# ========== parse_amount ==========
+
+@pytest.mark.parametrize("raw, expected", [
+    ("120.00", Decimal("120.00")),
+    ("USD 1,250.00", Decimal("1250.00")),
+    ("1.250,00", Decimal("1250.00")),
+    ("12,5", Decimal("12.5")),
+    ("1,250", Decimal("1250")),
+    ("(40.00)", Decimal("-40.00")),
+    ("40.00-", Decimal("-40.00")),
+    ("-5", Decimal("-5")),
+])
+def test_parse_amount(raw, expected):
+    assert parse_amount(raw) == expected
+
+
+@pytest.mark.parametrize("raw", ["", None, "n/a"])
+def test_parse_amount_rejects(raw):
+    assert parse_amount(raw) is None
+
+
+# ========== parse_date ==========
+
+@pytest.mark.parametrize("raw", [
+    "2026-01-15", "15/01/2026", "15-01-2026", "15.01.2026", "20260115",
+    "15 Jan 2026", "15-Jan-2026", "15 January 2026", "2026-01-15T10:30:00", "2026-01-15 10:30",
+])
+def test_parse_date(raw):
+    assert parse_date(raw) == date(2026, 1, 15)
+
+
+def test_parse_date_day_first():
+    assert parse_date("01/02/2026") == date(2026, 2, 1)
+
+
+@pytest.mark.parametrize("raw", ["", None, "yesterday", "2026-13-01"])
+def test_parse_date_rejects(raw):
+    assert parse_date(raw) is None
+
+
+# ========== InvoiceIndex.allocate ==========
+
+def test_allocate_oldest_first():
+    idx = index()
+    assert idx.allocate([OLDER.upper(), NEWER.upper()], Decimal("120")) == [
+        (OLDER.upper(), Decimal("100")), (NEWER.upper(), Decimal("20"))]
+    assert idx.outstanding[NEWER.upper()] == Decimal("30")
+
+
+def test_allocate_overpayment_is_credit_on_newest():
+    idx = index()
+    assert idx.allocate([OLDER.upper(), NEWER.upper()], Decimal("200")) == [
+        (OLDER.upper(), Decimal("100")), (NEWER.upper(), Decimal("100"))]
+    assert idx.outstanding[NEWER.upper()] == Decimal("-50")
+
+
+def test_allocate_after_everything_is_paid():
+    idx = index()
+    idx.allocate([OLDER.upper(), NEWER.upper()], Decimal("150"))
+    assert idx.allocate([OLDER.upper(), NEWER.upper()], Decimal("10")) == [(NEWER.upper(), Decimal("10"))]
+    assert idx.outstanding[OLDER.upper()] == 0
+
+
+# ========== match_lines ==========
+
+def test_match_by_student_number_splits_over_invoices():
+    payments, unmatched, skipped = match_lines(
+        [Line(2, "2026-01-15", "120.00", "TX1", "Fees uc001")], index(), set())
+    assert [(p.invoice_id, p.amount) for p in payments] == [
+        (OLDER.upper(), Decimal("100.00")), (NEWER.upper(), Decimal("20.00"))]
+    assert all(p.row == 2 and p.date == date(2026, 1, 15) and p.reference == "TX1" for p in payments)
+    assert (unmatched, skipped) == ([], 0)
+
+
+def test_match_by_invoice_id_pays_only_that_invoice():
+    payments, _, _ = match_lines([Line(2, "2026-01-15", "10", "", f"Invoice {NEWER}")], index(), set())
+    assert [(p.invoice_id, p.amount, p.reference) for p in payments] == [(NEWER.upper(), Decimal("10"), None)]
+
+
+def test_duplicate_and_already_imported_lines_are_skipped():
+    rows = [
+        Line(2, "2026-01-15", "20", "TX1", "UC001"),
+        Line(3, "2026-01-15", "20", "TX1", "UC001"),  # same reference and day in this file
+        Line(4, "2026-01-16", "20", "TX1", "UC001"),  # same reference, another day
+        Line(5, "2026-01-15", "30", "OLD", "UC002"),
+    ]
+    payments, unmatched, skipped = match_lines(rows, index(), {("OLD", date(2026, 1, 15))})
+    assert [p.row for p in payments] == [2, 4]
+    assert (unmatched, skipped) == ([], 2)
+
+
+def test_debits_and_blank_credits_are_skipped():
+    rows = [Line(2, "2026-01-15", "-5.00", "CHG", "UC001"), Line(3, "2026-01-15", "", "X", "UC001")]
+    assert match_lines(rows, index(), set()) == ([], [], 2)
+
+
+@pytest.mark.parametrize("line, error", [
+    (Line(2, "someday", "10", "R", "UC001"), "Date 'someday' not recognised"),
+    (Line(2, "2026-01-15", "ten", "R", "UC001"), "Amount 'ten' is not a number"),
+    (Line(2, "2026-01-15", "10", "R", "school fees"), "No open invoice or student number found"),
+    (Line(2, "2026-01-15", "10", "R", "UC001 and UC002"), "Matches more than one student"),
+])
+def test_unmatched_lines_carry_an_error(line, error):
+    payments, unmatched, skipped = match_lines([line], index(), set())
+    assert payments == [] and skipped == 0
+    assert [u["error"] for u in unmatched] == [error]
+
+
+# ========== Readers ==========
+
+def test_read_csv_finds_columns_by_name():
+    data = "Transaction Date,Details,Paid In,Receipt No.\n15/01/2026,Fees UC001,120.00,R1\n,,,\n16/01/2026,Short row\n"
+    assert lines(data, statements.read_csv) == [
+        Line(2, "15/01/2026", "120.00", "R1", "Fees UC001"),
+        Line(4, "16/01/2026", "", "", "Short row"),
+    ]
+
+
+def test_read_csv_needs_date_and_amount():
+    with pytest.raises(statements.StatementError):
+        lines("Reference,Description\nR1,x\n", statements.read_csv)
+
+
+MT940 = """:20:STMT
+:25:123456789
+:28C:1/1
+:60F:C260101USD1000,00
+:61:2601150115C120,00NTRFNONREF//BANK123
+:86:Fees UC001
+ term 1
+:61:2601160116D5,00NCHGNONREF
+:86:Bank charge
+:61:2601170117C50,5NTRFINV42//B9
+:86:UC002
+:62F:C260117USD1165,50
+-
+"""
+
+
+def test_read_mt940():
+    assert lines(MT940, statements.read_mt940) == [
+        Line(5, "20260115", "120.00", "BANK123", "Fees UC001 term 1"),
+        Line(8, "20260116", "-5.00", "", "Bank charge"),
+        Line(10, "20260117", "50.5", "INV42", "B9 UC002"),
+    ]
+
+
+OFX_SGML = """OFXHEADER:100
+<OFX>
+<BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20260115120000[0:GMT]
+<TRNAMT>120.00
+<FITID>F1
+<NAME>J Moyo
+<MEMO>UC001 fees
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20260116
+<TRNAMT>-5.00
+<FITID>F2
+</STMTTRN>
+</BANKTRANLIST>
+</OFX>
+"""
+
+OFX_XML = ("<OFX><STMTTRN><DTPOSTED>20260115</DTPOSTED><TRNAMT>7.50</TRNAMT>"
+           "<FITID>X1</FITID><MEMO>UC001</MEMO></STMTTRN></OFX>\n")
+
+
+def test_read_ofx_sgml():
+    assert lines(OFX_SGML, statements.read_ofx) == [
+        Line(1, "20260115", "120.00", "F1", "J Moyo UC001 fees"),
+        Line(2, "20260116", "-5.00", "F2", ""),
+    ]
+
+
+def test_read_ofx_xml():
+    assert lines(OFX_XML, statements.read_ofx) == [Line(1, "20260115", "7.50", "X1", "UC001")]
+
+
+def test_read_statement_rejects_unknown_types():
+    with pytest.raises(statements.StatementError):
+        statements.read_statement(io.BytesIO(b""), "statement.pdf")
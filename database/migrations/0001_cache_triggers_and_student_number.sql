@@ -0,0 +1,57 @@
+-- Brings databases created from an older schema.sql up to date with the
+-- objects added for caching and mark-sheet imports. Every statement is
+-- idempotent, so this is a no-op on a fresh install.
+
+ALTER TABLE students ADD COLUMN IF NOT EXISTS student_number VARCHAR(50);
+CREATE UNIQUE INDEX IF NOT EXISTS students_student_number_key ON students(student_number);
+
+-- ========== Reference-data change notifications ==========
+CREATE OR REPLACE FUNCTION notify_refdata_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('refdata_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['academic_years', 'terms', 'forms', 'streams', 'classes', 'subjects',
+                             'institution_settings', 'news_events'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_refdata', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed()', 'trg_' || t || '_refdata', t);
+    END LOOP;
+END;
+$$;
+
+-- ========== Table version counters (HTTP ETags) ==========
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+INSERT INTO table_versions (table_name) VALUES ('exams'), ('exam_results'), ('invoices'), ('payments')
+ON CONFLICT (table_name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = table_versions.version + 1, updated_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['exams', 'exam_results', 'invoices', 'payments'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_version', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()', 'trg_' || t || '_version', t);
+    END LOOP;
+END;
+$$;
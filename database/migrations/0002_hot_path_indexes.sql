@@ -0,0 +1,62 @@
+-- migrate: no-transaction
+-- Indexes for the filters and keyset sort orders the API actually issues.
+-- Built CONCURRENTLY so a live database keeps taking writes; the runner
+-- executes each statement on its own outside a transaction and drops any
+-- INVALID leftover of an interrupted build before retrying.
+
+-- Login, user creation and seeding look users up by LOWER(email)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email_lower ON users (LOWER(email));
+-- users list: keyset (created_at DESC, id DESC), optionally filtered by role
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_role_created ON users (role, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created ON users (created_at DESC, id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_role;
+
+-- Name-ordered directory listings: keyset (last_name, first_name, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_students_name ON students (last_name, first_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_teachers_name ON teachers (last_name, first_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_parents_name ON parents (last_name, first_name, id);
+
+-- Class rosters (students list, attendance, mark sheets, report cards);
+-- UNIQUE(student_id, academic_year_id) already serves per-student lookups
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_student_classes_class ON student_classes (class_id, student_id);
+-- Reverse of UNIQUE(parent_id, student_id): parents of a student
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_parent_links_student ON parent_student_links (student_id);
+
+-- Exams by class and term; unfiltered list is keyset (created_at DESC, id DESC)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exams_class_term ON exams (class_id, term_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exams_term ON exams (term_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exams_created ON exams (created_at DESC, id DESC);
+-- Student results; UNIQUE(exam_id, student_id) covers the per-exam side
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_results_student ON exam_results (student_id);
+
+-- Attendance register by class (keyset date DESC, last_name, id) and per-student history;
+-- UNIQUE(student_id, class_id, date) does not lead with date for either
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_attendance_class_date ON attendance (class_id, date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_attendance_student_date ON attendance (student_id, date DESC);
+
+-- Finance: per-year summaries/debtors, per-student status filters, newest-first list
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_academic_year ON invoices (academic_year_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_student_status ON invoices (student_id, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_created ON invoices (created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_invoice ON payments (invoice_id);
+
+-- Learning materials and assignments: keyset (created_at DESC, id DESC) per class
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_materials_class_published
+    ON learning_materials (class_id, created_at DESC, id DESC) WHERE is_published = true;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_materials_published
+    ON learning_materials (created_at DESC, id DESC) WHERE is_published = true;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assignments_class_created ON assignments (class_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assignments_created ON assignments (created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_library_public_created
+    ON library_items (created_at DESC, id DESC) WHERE is_public = true;
+
+-- Applications: keyset (created_at DESC, id DESC), optionally by status
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_applications_status_created ON applications (status, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_applications_created ON applications (created_at DESC, id DESC);
+
+-- Inbox/sent folders: keyset (created_at DESC, id DESC) per user; these
+-- supersede the single-column indexes from schema.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_recipient_created ON messages (recipient_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_sender_created ON messages (sender_id, created_at DESC, id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_recipient;
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_sender;
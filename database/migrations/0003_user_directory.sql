@@ -0,0 +1,102 @@
+-- Searchable user directory for message recipients. One row per user with
+-- the display name the UI shows and a lower-cased "name email" search
+-- string, kept current by triggers on users and the profile tables.
+-- Trigram index for substring/fuzzy matches of 3+ characters, btree
+-- text_pattern_ops indexes for short prefixes.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE IF NOT EXISTS user_directory (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    email VARCHAR(255) NOT NULL,
+    role VARCHAR(50) NOT NULL,
+    display_name VARCHAR(255) NOT NULL,
+    search TEXT NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE OR REPLACE FUNCTION refresh_user_directory(uid UUID) RETURNS void AS $$
+BEGIN
+    INSERT INTO user_directory AS d (user_id, email, role, display_name, search, is_active, updated_at)
+    SELECT u.id, u.email, u.role, x.display_name, LOWER(x.display_name || ' ' || u.email), u.is_active, clock_timestamp()
+    FROM users u
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(
+            (SELECT t.first_name || ' ' || t.last_name FROM teachers t WHERE t.user_id = u.id),
+            (SELECT s.first_name || ' ' || s.last_name FROM students s WHERE s.user_id = u.id),
+            (SELECT p.first_name || ' ' || p.last_name FROM parents p WHERE p.user_id = u.id),
+            u.email
+        ) AS display_name
+    ) x
+    WHERE u.id = uid
+    ON CONFLICT (user_id) DO UPDATE SET
+        email = EXCLUDED.email,
+        role = EXCLUDED.role,
+        display_name = EXCLUDED.display_name,
+        search = EXCLUDED.search,
+        is_active = EXCLUDED.is_active,
+        updated_at = EXCLUDED.updated_at
+    WHERE (d.email, d.role, d.display_name, d.is_active)
+          IS DISTINCT FROM (EXCLUDED.email, EXCLUDED.role, EXCLUDED.display_name, EXCLUDED.is_active);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_directory_user_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_user_directory(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_directory_profile_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id) THEN
+        IF OLD.user_id IS NOT NULL THEN
+            PERFORM refresh_user_directory(OLD.user_id);
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.user_id IS NOT NULL THEN
+        PERFORM refresh_user_directory(NEW.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lets in-process directory indexes apply single-user changes (and deletes)
+CREATE OR REPLACE FUNCTION notify_user_directory_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('user_directory_changed', COALESCE(NEW.user_id, OLD.user_id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_directory ON users;
+CREATE TRIGGER trg_users_directory AFTER INSERT OR UPDATE OF email, role, is_active ON users
+    FOR EACH ROW EXECUTE FUNCTION user_directory_user_changed();
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['teachers', 'students', 'parents'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_directory', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR DELETE OR UPDATE OF first_name, last_name, user_id ON %I '
+                       'FOR EACH ROW EXECUTE FUNCTION user_directory_profile_changed()', 'trg_' || t || '_directory', t);
+    END LOOP;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_user_directory_notify ON user_directory;
+CREATE TRIGGER trg_user_directory_notify AFTER INSERT OR UPDATE OR DELETE ON user_directory
+    FOR EACH ROW EXECUTE FUNCTION notify_user_directory_changed();
+
+SELECT refresh_user_directory(id) FROM users;
+
+CREATE INDEX IF NOT EXISTS idx_user_directory_search_trgm ON user_directory USING gin (search gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_user_directory_search_prefix ON user_directory (search text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_user_directory_email_prefix ON user_directory (LOWER(email) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_user_directory_updated ON user_directory (updated_at);
+
+-- Contact scoping: the classes a teacher takes this year
+CREATE INDEX IF NOT EXISTS idx_class_teachers_teacher ON class_teachers (teacher_id, academic_year_id);
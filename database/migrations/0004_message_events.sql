@@ -0,0 +1,30 @@
+-- Message events for real-time delivery. Every worker LISTENs on
+-- message_events and pushes the payload to the sockets of the users
+-- involved, adjusting its cached unread counters on the way. Payloads carry
+-- ids only (NOTIFY payloads are limited to 8000 bytes); clients fetch the
+-- message body through the API.
+
+CREATE OR REPLACE FUNCTION notify_message_event() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('message_events', json_build_object(
+            'type', 'message', 'id', NEW.id, 'sender_id', NEW.sender_id, 'recipient_id', NEW.recipient_id,
+            'is_read', NEW.is_read, 'created_at', NEW.created_at)::text);
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF OLD.is_read IS DISTINCT FROM NEW.is_read THEN
+            PERFORM pg_notify('message_events', json_build_object(
+                'type', CASE WHEN NEW.is_read THEN 'read' ELSE 'unread' END, 'id', NEW.id,
+                'sender_id', NEW.sender_id, 'recipient_id', NEW.recipient_id)::text);
+        END IF;
+    ELSE
+        PERFORM pg_notify('message_events', json_build_object(
+            'type', 'deleted', 'id', OLD.id, 'sender_id', OLD.sender_id, 'recipient_id', OLD.recipient_id,
+            'is_read', OLD.is_read)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_messages_events ON messages;
+CREATE TRIGGER trg_messages_events AFTER INSERT OR UPDATE OF is_read OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION notify_message_event();
@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Unread counters: COUNT(*) over a recipient's unread messages only.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_unread ON messages (recipient_id) WHERE NOT is_read;
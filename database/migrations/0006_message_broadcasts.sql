@@ -0,0 +1,30 @@
+-- One-to-many announcements. A broadcast row records the target and the
+-- fan-out progress; each recipient still gets an ordinary messages row
+-- (tagged with broadcast_id) so inboxes, unread counters and live events
+-- work unchanged.
+
+CREATE TABLE IF NOT EXISTS message_broadcasts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    sender_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    target_type VARCHAR(30) NOT NULL CHECK (target_type IN (
+        'all', 'role', 'class', 'class_parents', 'form', 'form_parents'
+    )),
+    target_id UUID,
+    target_role VARCHAR(50),
+    subject VARCHAR(200),
+    body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'QUEUED' CHECK (status IN ('QUEUED', 'SENDING', 'DONE', 'FAILED')),
+    recipients_total INT,
+    recipients_sent INT NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_message_broadcasts_sender ON message_broadcasts (sender_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_message_broadcasts_created ON message_broadcasts (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_message_broadcasts_pending ON message_broadcasts (updated_at) WHERE status IN ('QUEUED', 'SENDING');
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS broadcast_id UUID REFERENCES message_broadcasts(id) ON DELETE SET NULL;
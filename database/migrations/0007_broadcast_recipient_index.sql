@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- One message per broadcast recipient; lets an interrupted fan-out resume
+-- with ON CONFLICT DO NOTHING.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_broadcast_recipient
+    ON messages (broadcast_id, recipient_id) WHERE broadcast_id IS NOT NULL;
@@ -0,0 +1,180 @@
+-- Incrementally maintained fee ledger.
+--
+--   invoices.amount_paid   running total of the invoice's payments; status
+--                          follows it (PARTIAL / PAID, back to PENDING)
+--   invoices.form_id       form the student was in when billed
+--   student_balances       invoiced / paid / balance per student and year
+--   finance_rollups        the same per year, form, term and status
+--
+-- Statement-level triggers with transition tables aggregate each write
+-- before applying it, so a bulk insert of invoices or payments touches
+-- every ledger row once rather than once per invoice. Payments feed
+-- invoices.amount_paid; the invoice trigger then moves the amounts between
+-- ledger rows. rebuild_finance_ledger() recomputes everything from scratch.
+
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS amount_paid DECIMAL(12,2) NOT NULL DEFAULT 0;
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS form_id UUID REFERENCES forms(id) ON DELETE SET NULL;
+
+CREATE TABLE IF NOT EXISTS student_balances (
+    student_id UUID NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    academic_year_id UUID NOT NULL REFERENCES academic_years(id) ON DELETE CASCADE,
+    invoiced DECIMAL(14,2) NOT NULL DEFAULT 0,
+    paid DECIMAL(14,2) NOT NULL DEFAULT 0,
+    balance DECIMAL(14,2) GENERATED ALWAYS AS (invoiced - paid) STORED,
+    invoice_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (student_id, academic_year_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_student_balances_debtors ON student_balances (academic_year_id, balance DESC)
+    WHERE balance > 0;
+
+CREATE TABLE IF NOT EXISTS finance_rollups (
+    academic_year_id UUID NOT NULL REFERENCES academic_years(id) ON DELETE CASCADE,
+    form_id UUID,
+    term_id UUID,
+    status VARCHAR(30),
+    invoiced DECIMAL(14,2) NOT NULL DEFAULT 0,
+    paid DECIMAL(14,2) NOT NULL DEFAULT 0,
+    invoice_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE NULLS NOT DISTINCT (academic_year_id, form_id, term_id, status)
+);
+
+-- ========== Form snapshot ==========
+CREATE OR REPLACE FUNCTION invoices_fill_form() RETURNS trigger AS $$
+BEGIN
+    IF NEW.form_id IS NULL THEN
+        SELECT c.form_id INTO NEW.form_id
+        FROM student_classes sc
+        JOIN classes c ON c.id = sc.class_id
+        WHERE sc.student_id = NEW.student_id AND sc.academic_year_id = NEW.academic_year_id
+        LIMIT 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_invoices_fill_form ON invoices;
+CREATE TRIGGER trg_invoices_fill_form BEFORE INSERT ON invoices
+    FOR EACH ROW EXECUTE FUNCTION invoices_fill_form();
+
+UPDATE invoices i SET form_id = c.form_id
+FROM student_classes sc
+JOIN classes c ON c.id = sc.class_id
+WHERE i.form_id IS NULL AND sc.student_id = i.student_id AND sc.academic_year_id = i.academic_year_id;
+
+-- ========== Payments -> invoices.amount_paid ==========
+CREATE OR REPLACE FUNCTION payments_apply() RETURNS trigger AS $$
+DECLARE
+    deltas TEXT;
+BEGIN
+    deltas := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT invoice_id, amount, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT invoice_id, amount, -1 AS sign FROM old_rows'
+        ELSE 'SELECT invoice_id, amount, 1 AS sign FROM new_rows UNION ALL SELECT invoice_id, amount, -1 FROM old_rows'
+    END;
+    EXECUTE format($f$
+        UPDATE invoices i SET
+            amount_paid = i.amount_paid + d.paid,
+            status = CASE WHEN i.amount_paid + d.paid >= i.amount THEN 'PAID'
+                          WHEN i.amount_paid + d.paid > 0 THEN 'PARTIAL'
+                          WHEN i.status IN ('PAID', 'PARTIAL') THEN 'PENDING'
+                          ELSE i.status END,
+            updated_at = NOW()
+        FROM (SELECT invoice_id, SUM(sign * amount) AS paid FROM (%s) x GROUP BY invoice_id) d
+        WHERE i.id = d.invoice_id AND d.paid <> 0
+    $f$, deltas);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ========== Invoices -> ledger ==========
+CREATE OR REPLACE FUNCTION finance_ledger_apply() RETURNS trigger AS $$
+DECLARE
+    cols CONSTANT TEXT := 'student_id, academic_year_id, form_id, term_id, status, amount, amount_paid';
+    deltas TEXT;
+BEGIN
+    deltas := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT %s, 1 AS sign FROM new_rows', cols)
+        WHEN 'DELETE' THEN format('SELECT %s, -1 AS sign FROM old_rows', cols)
+        ELSE format('SELECT %1$s, 1 AS sign FROM new_rows UNION ALL SELECT %1$s, -1 FROM old_rows', cols)
+    END;
+    -- The joins skip students and years deleted by the statement that cascaded here
+    EXECUTE format($f$
+        INSERT INTO student_balances AS b (student_id, academic_year_id, invoiced, paid, invoice_count)
+        SELECT d.student_id, d.academic_year_id, SUM(d.sign * d.amount), SUM(d.sign * d.amount_paid), SUM(d.sign)
+        FROM (%s) d
+        JOIN students s ON s.id = d.student_id
+        JOIN academic_years ay ON ay.id = d.academic_year_id
+        GROUP BY d.student_id, d.academic_year_id
+        HAVING SUM(d.sign * d.amount) <> 0 OR SUM(d.sign * d.amount_paid) <> 0 OR SUM(d.sign) <> 0
+        ON CONFLICT (student_id, academic_year_id) DO UPDATE SET
+            invoiced = b.invoiced + EXCLUDED.invoiced,
+            paid = b.paid + EXCLUDED.paid,
+            invoice_count = b.invoice_count + EXCLUDED.invoice_count,
+            updated_at = NOW()
+    $f$, deltas);
+    EXECUTE format($f$
+        INSERT INTO finance_rollups AS r (academic_year_id, form_id, term_id, status, invoiced, paid, invoice_count)
+        SELECT d.academic_year_id, d.form_id, d.term_id, d.status,
+               SUM(d.sign * d.amount), SUM(d.sign * d.amount_paid), SUM(d.sign)
+        FROM (%s) d
+        JOIN academic_years ay ON ay.id = d.academic_year_id
+        GROUP BY d.academic_year_id, d.form_id, d.term_id, d.status
+        HAVING SUM(d.sign * d.amount) <> 0 OR SUM(d.sign * d.amount_paid) <> 0 OR SUM(d.sign) <> 0
+        ON CONFLICT (academic_year_id, form_id, term_id, status) DO UPDATE SET
+            invoiced = r.invoiced + EXCLUDED.invoiced,
+            paid = r.paid + EXCLUDED.paid,
+            invoice_count = r.invoice_count + EXCLUDED.invoice_count,
+            updated_at = NOW()
+    $f$, deltas);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_finance_ledger() RETURNS void AS $$
+BEGIN
+    UPDATE invoices i SET amount_paid = x.paid
+    FROM (
+        SELECT i2.id, COALESCE(SUM(p.amount), 0) AS paid
+        FROM invoices i2 LEFT JOIN payments p ON p.invoice_id = i2.id
+        GROUP BY i2.id
+    ) x
+    WHERE x.id = i.id AND i.amount_paid <> x.paid;
+    DELETE FROM student_balances;
+    INSERT INTO student_balances (student_id, academic_year_id, invoiced, paid, invoice_count)
+    SELECT student_id, academic_year_id, SUM(amount), SUM(amount_paid), COUNT(*)
+    FROM invoices GROUP BY student_id, academic_year_id;
+    DELETE FROM finance_rollups;
+    INSERT INTO finance_rollups (academic_year_id, form_id, term_id, status, invoiced, paid, invoice_count)
+    SELECT academic_year_id, form_id, term_id, status, SUM(amount), SUM(amount_paid), COUNT(*)
+    FROM invoices GROUP BY academic_year_id, form_id, term_id, status;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill while the ledger triggers do not exist yet
+SELECT rebuild_finance_ledger();
+
+DO $$
+DECLARE
+    op TEXT;
+BEGIN
+    FOREACH op IN ARRAY ARRAY['insert', 'update', 'delete'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON payments', 'trg_payments_' || op || '_ledger');
+        EXECUTE format('CREATE TRIGGER %I AFTER %s ON payments REFERENCING %s '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION payments_apply()',
+                       'trg_payments_' || op || '_ledger', UPPER(op),
+                       CASE op WHEN 'insert' THEN 'NEW TABLE AS new_rows'
+                               WHEN 'delete' THEN 'OLD TABLE AS old_rows'
+                               ELSE 'OLD TABLE AS old_rows NEW TABLE AS new_rows' END);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON invoices', 'trg_invoices_' || op || '_ledger');
+        EXECUTE format('CREATE TRIGGER %I AFTER %s ON invoices REFERENCING %s '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION finance_ledger_apply()',
+                       'trg_invoices_' || op || '_ledger', UPPER(op),
+                       CASE op WHEN 'insert' THEN 'NEW TABLE AS new_rows'
+                               WHEN 'delete' THEN 'OLD TABLE AS old_rows'
+                               ELSE 'OLD TABLE AS old_rows NEW TABLE AS new_rows' END);
+    END LOOP;
+END;
+$$;
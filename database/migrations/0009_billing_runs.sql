@@ -0,0 +1,22 @@
+-- Term billing runs. Each run invoices every enrolled student of a term
+-- (optionally one form) from fee_structures in a single statement; the
+-- row records what it did. Invoices it created carry billing_run_id.
+
+CREATE TABLE IF NOT EXISTS billing_runs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    academic_year_id UUID NOT NULL REFERENCES academic_years(id) ON DELETE CASCADE,
+    term_id UUID NOT NULL REFERENCES terms(id) ON DELETE CASCADE,
+    form_id UUID REFERENCES forms(id) ON DELETE SET NULL,
+    due_date DATE,
+    students_total INT NOT NULL DEFAULT 0,
+    invoices_created INT NOT NULL DEFAULT 0,
+    already_billed INT NOT NULL DEFAULT 0,
+    unpriced INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_billing_runs_created ON billing_runs (created_at DESC, id DESC);
+
+ALTER TABLE invoices ADD COLUMN IF NOT EXISTS billing_run_id UUID REFERENCES billing_runs(id) ON DELETE SET NULL;
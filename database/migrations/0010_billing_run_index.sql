@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- One billing-run invoice per student and term; concurrent runs for the
+-- same term fall back to ON CONFLICT DO NOTHING instead of double billing.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_billing_student_term
+    ON invoices (student_id, term_id) WHERE billing_run_id IS NOT NULL;
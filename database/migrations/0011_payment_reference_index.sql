@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- Statement imports look up already-recorded bank references to skip
+-- lines imported before.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_reference ON payments (reference, payment_date)
+    WHERE reference IS NOT NULL;
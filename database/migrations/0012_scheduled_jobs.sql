@@ -0,0 +1,43 @@
+-- Background job schedule and chronic-absence alerts.
+--
+-- scheduled_jobs has one row per registered job (see src/scheduler.py).
+-- Workers claim due rows with FOR UPDATE SKIP LOCKED and hold them with a
+-- lease (locked_by / locked_until) while the job runs; an expired lease
+-- means the worker died and the job may be claimed again. Set enabled =
+-- false to pause a job.
+
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    name VARCHAR(100) PRIMARY KEY,
+    schedule VARCHAR(100) NOT NULL,
+    enabled BOOLEAN NOT NULL DEFAULT true,
+    lease_seconds INT NOT NULL DEFAULT 900,
+    next_run_at TIMESTAMPTZ NOT NULL,
+    locked_by VARCHAR(200),
+    locked_until TIMESTAMPTZ,
+    last_started_at TIMESTAMPTZ,
+    last_finished_at TIMESTAMPTZ,
+    last_status VARCHAR(20) CHECK (last_status IN ('OK', 'FAILED')),
+    last_error TEXT,
+    last_result JSONB,
+    last_duration_ms INT,
+    run_count INT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs (next_run_at) WHERE enabled;
+
+-- One row per student and term whose absence rate crossed the threshold;
+-- resolved_at is set once the rate falls back below it.
+CREATE TABLE IF NOT EXISTS attendance_alerts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    student_id UUID NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    term_id UUID NOT NULL REFERENCES terms(id) ON DELETE CASCADE,
+    days_recorded INT NOT NULL,
+    days_absent INT NOT NULL,
+    absence_rate DECIMAL(5,2) GENERATED ALWAYS AS (ROUND(days_absent * 100.0 / NULLIF(days_recorded, 0), 2)) STORED,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    resolved_at TIMESTAMPTZ,
+    UNIQUE (student_id, term_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_attendance_alerts_term ON attendance_alerts (term_id, absence_rate DESC);
@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- Open invoices by due date, for the nightly overdue-marking job.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_open_due ON invoices (due_date)
+    WHERE status IN ('PENDING', 'PARTIAL');
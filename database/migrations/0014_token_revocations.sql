@@ -0,0 +1,47 @@
+-- Access-token revocation.
+--
+-- A row means: reject every token of user_id issued at or before
+-- revoked_at. Rows are written by a trigger when a user is deactivated,
+-- changes role or is deleted, so the cut-off holds however the change was
+-- made. Workers keep the live rows in memory (src/auth/revocation.py),
+-- applying token_revoked notifications at once and re-reading the table
+-- every few seconds. A row can be dropped once every token it covers has
+-- expired (the auth.prune_revocations job). No foreign key: the row must
+-- outlive a deleted user.
+
+CREATE TABLE IF NOT EXISTS token_revocations (
+    user_id UUID PRIMARY KEY,
+    revoked_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    reason VARCHAR(20) NOT NULL CHECK (reason IN ('DEACTIVATED', 'ROLE_CHANGED', 'DELETED'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_token_revocations_revoked_at ON token_revocations (revoked_at);
+
+CREATE OR REPLACE FUNCTION revoke_user_tokens() RETURNS trigger AS $$
+DECLARE
+    why TEXT;
+    uid UUID;
+    at TIMESTAMPTZ := clock_timestamp();
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        why := 'DELETED';
+        uid := OLD.id;
+    ELSIF OLD.is_active AND NOT NEW.is_active THEN
+        why := 'DEACTIVATED';
+        uid := NEW.id;
+    ELSIF OLD.role IS DISTINCT FROM NEW.role THEN
+        why := 'ROLE_CHANGED';
+        uid := NEW.id;
+    ELSE
+        RETURN NULL;
+    END IF;
+    INSERT INTO token_revocations (user_id, revoked_at, reason) VALUES (uid, at, why)
+    ON CONFLICT (user_id) DO UPDATE SET revoked_at = EXCLUDED.revoked_at, reason = EXCLUDED.reason;
+    PERFORM pg_notify('token_revoked', uid::text || ' ' || extract(epoch FROM at)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_revoke_tokens ON users;
+CREATE TRIGGER trg_users_revoke_tokens AFTER UPDATE OF is_active, role OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION revoke_user_tokens();
@@ -0,0 +1,43 @@
+-- Refresh-token sessions.
+--
+-- A login opens a session; the client holds "<session id>.<secret>" and
+-- the row stores only SHA-256 of the current secret. Every refresh
+-- rotates the secret (previous_token_hash keeps the last one briefly, so
+-- two tabs refreshing at once do not trip reuse detection). Presenting
+-- any other secret for a live session means a copied token was used: the
+-- session is revoked with reason REUSED. Access tokens carry the session
+-- id as "sid"; revoking a session notifies session_revoked so workers
+-- stop accepting them (src/auth/revocation.py).
+
+CREATE TABLE IF NOT EXISTS auth_sessions (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash BYTEA NOT NULL,
+    previous_token_hash BYTEA,
+    rotated_at TIMESTAMPTZ,
+    refresh_count INT NOT NULL DEFAULT 0,
+    user_agent VARCHAR(300),
+    ip_address VARCHAR(64),
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    last_used_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    revoked_at TIMESTAMPTZ,
+    revoked_reason VARCHAR(20) CHECK (revoked_reason IN ('LOGOUT', 'REVOKED', 'REUSED'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_user ON auth_sessions (user_id, last_used_at DESC)
+    WHERE revoked_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_revoked ON auth_sessions (revoked_at) WHERE revoked_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_expires ON auth_sessions (expires_at);
+
+CREATE OR REPLACE FUNCTION notify_session_revoked() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('session_revoked', NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_auth_sessions_revoked ON auth_sessions;
+CREATE TRIGGER trg_auth_sessions_revoked AFTER UPDATE OF revoked_at ON auth_sessions
+    FOR EACH ROW WHEN (OLD.revoked_at IS NULL AND NEW.revoked_at IS NOT NULL)
+    EXECUTE FUNCTION notify_session_revoked();
@@ -0,0 +1,80 @@
+-- Access tokens carry the caller's profile ids and scope (classes a
+-- teacher takes this year, students a parent or student may see; see
+-- src/auth/principal.py). When the rows behind those claims change, the
+-- affected users' tokens are revoked with reason SCOPE_CHANGED; clients
+-- then refresh and receive up-to-date claims. A change of the current
+-- academic year is not tracked: teachers' class claims catch up as their
+-- tokens expire.
+
+ALTER TABLE token_revocations DROP CONSTRAINT IF EXISTS token_revocations_reason_check;
+ALTER TABLE token_revocations ADD CONSTRAINT token_revocations_reason_check
+    CHECK (reason IN ('DEACTIVATED', 'ROLE_CHANGED', 'DELETED', 'SCOPE_CHANGED'));
+
+-- Statement-level, so a bulk import of links revokes each user once
+CREATE OR REPLACE FUNCTION revoke_scope_tokens() RETURNS trigger AS $$
+DECLARE
+    changed TEXT;
+    users_sql TEXT;
+BEGIN
+    changed := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT * FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT * FROM old_rows'
+        ELSE 'SELECT * FROM new_rows UNION ALL SELECT * FROM old_rows'
+    END;
+    users_sql := CASE TG_TABLE_NAME
+        WHEN 'parent_student_links' THEN format('SELECT p.user_id FROM (%s) r JOIN parents p ON p.id = r.parent_id', changed)
+        ELSE format('SELECT t.user_id FROM (%s) r JOIN teachers t ON t.id = r.teacher_id', changed)
+    END;
+    EXECUTE format($f$
+        WITH revoked AS (
+            INSERT INTO token_revocations AS tr (user_id, revoked_at, reason)
+            SELECT DISTINCT u.user_id, $1, 'SCOPE_CHANGED' FROM (%s) u WHERE u.user_id IS NOT NULL
+            ON CONFLICT (user_id) DO UPDATE SET revoked_at = EXCLUDED.revoked_at, reason = EXCLUDED.reason
+            RETURNING tr.user_id
+        )
+        SELECT pg_notify('token_revoked', user_id::text || ' ' || extract(epoch FROM $1)::text) FROM revoked
+    $f$, users_sql) USING clock_timestamp();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Profile rows moved to another user, or deleted: both users' profile id claims change
+CREATE OR REPLACE FUNCTION revoke_profile_tokens() RETURNS trigger AS $$
+DECLARE
+    at TIMESTAMPTZ := clock_timestamp();
+    uid UUID;
+BEGIN
+    FOREACH uid IN ARRAY ARRAY[OLD.user_id, CASE WHEN TG_OP = 'UPDATE' THEN NEW.user_id END] LOOP
+        CONTINUE WHEN uid IS NULL;
+        INSERT INTO token_revocations (user_id, revoked_at, reason) VALUES (uid, at, 'SCOPE_CHANGED')
+        ON CONFLICT (user_id) DO UPDATE SET revoked_at = EXCLUDED.revoked_at, reason = EXCLUDED.reason;
+        PERFORM pg_notify('token_revoked', uid::text || ' ' || extract(epoch FROM at)::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+    op TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['parent_student_links', 'class_teachers'] LOOP
+        FOREACH op IN ARRAY ARRAY['insert', 'update', 'delete'] LOOP
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_' || op || '_scope', t);
+            EXECUTE format('CREATE TRIGGER %I AFTER %s ON %I REFERENCING %s '
+                           'FOR EACH STATEMENT EXECUTE FUNCTION revoke_scope_tokens()',
+                           'trg_' || t || '_' || op || '_scope', UPPER(op), t,
+                           CASE op WHEN 'insert' THEN 'NEW TABLE AS new_rows'
+                                   WHEN 'delete' THEN 'OLD TABLE AS old_rows'
+                                   ELSE 'OLD TABLE AS old_rows NEW TABLE AS new_rows' END);
+        END LOOP;
+    END LOOP;
+    FOREACH t IN ARRAY ARRAY['teachers', 'students', 'parents'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_scope', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE OR UPDATE OF user_id ON %I FOR EACH ROW '
+                       'WHEN (OLD.user_id IS NOT NULL) EXECUTE FUNCTION revoke_profile_tokens()',
+                       'trg_' || t || '_scope', t);
+    END LOOP;
+END;
+$$;
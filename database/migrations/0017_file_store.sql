@@ -0,0 +1,60 @@
+-- Content-addressed upload storage (src/uploads/).
+--
+-- file_blobs has one row per stored object, keyed by the SHA-256 of its
+-- bytes; the bytes live in the storage backend under that hash. Every
+-- uploaded file is a file_uploads row pointing at its blob, so the same
+-- document uploaded by thirty teachers is stored once. ref_count is kept
+-- by a trigger on file_uploads; blobs it drops to zero are deleted, with
+-- their objects, by the uploads.collect_garbage job.
+--
+-- Resumable uploads start as PENDING rows with the declared length;
+-- received is the byte offset a client resumes from. The partial bytes
+-- are staged under <upload_dir>/partial/<id> until the last chunk
+-- arrives, then hashed and stored.
+
+CREATE TABLE IF NOT EXISTS file_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    ref_count INT NOT NULL DEFAULT 0 CHECK (ref_count >= 0),
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_file_blobs_unreferenced ON file_blobs (created_at) WHERE ref_count = 0;
+
+CREATE TABLE IF NOT EXISTS file_uploads (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    owner_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    file_name VARCHAR(255),
+    content_type VARCHAR(100),
+    length BIGINT NOT NULL CHECK (length >= 0),
+    received BIGINT NOT NULL DEFAULT 0,
+    sha256 CHAR(64) REFERENCES file_blobs(sha256),
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING' CHECK (status IN ('PENDING', 'COMPLETE')),
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ,
+    CHECK (received <= length),
+    CHECK (status = 'PENDING' OR sha256 IS NOT NULL)
+);
+
+CREATE INDEX IF NOT EXISTS idx_file_uploads_sha256 ON file_uploads (sha256);
+CREATE INDEX IF NOT EXISTS idx_file_uploads_pending ON file_uploads (expires_at) WHERE status = 'PENDING';
+
+CREATE OR REPLACE FUNCTION file_blob_refs() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.sha256 IS NOT DISTINCT FROM NEW.sha256 THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.sha256 IS NOT NULL THEN
+        UPDATE file_blobs SET ref_count = ref_count - 1 WHERE sha256 = OLD.sha256;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.sha256 IS NOT NULL THEN
+        UPDATE file_blobs SET ref_count = ref_count + 1 WHERE sha256 = NEW.sha256;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_file_uploads_refs ON file_uploads;
+CREATE TRIGGER trg_file_uploads_refs AFTER INSERT OR DELETE OR UPDATE OF sha256 ON file_uploads
+    FOR EACH ROW EXECUTE FUNCTION file_blob_refs();
@@ -0,0 +1,60 @@
+-- Table version counters without a shared row lock.
+--
+-- 0001 bumped one table_versions row per writing statement. That row stayed
+-- locked until commit, so every transaction writing exams, exam_results,
+-- invoices or payments (a payment touches two of them through
+-- payments_apply) queued behind the previous one: billing runs, statement
+-- imports and mark entry serialised on it.
+--
+-- Each table now has a sequence. nextval takes no lock and never waits. It
+-- runs from a deferred constraint trigger, so it happens once per
+-- transaction and table, at commit time. A reader therefore cannot see a
+-- new version while the rows behind it are still uncommitted for the
+-- length of the writer's transaction. src/http_cache.table_version() reads
+-- the sequences' last values.
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['exams', 'exam_results', 'invoices', 'payments'] LOOP
+        EXECUTE format('CREATE SEQUENCE IF NOT EXISTS %I', 'table_version_' || t);
+    END LOOP;
+    -- Continue past the old counters, so no ETag already issued is reused for other content
+    IF to_regclass('table_versions') IS NOT NULL THEN
+        PERFORM setval(format('table_version_%s', table_name)::regclass, version + 1)
+        FROM table_versions WHERE table_name IN ('exams', 'exam_results', 'invoices', 'payments');
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    -- Once per transaction and table, however many rows changed
+    IF current_setting('erp_table_version.' || TG_TABLE_NAME, true) IS DISTINCT FROM 'bumped' THEN
+        PERFORM set_config('erp_table_version.' || TG_TABLE_NAME, 'bumped', true);
+        PERFORM nextval(format('table_version_%s', TG_TABLE_NAME)::regclass);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['exams', 'exam_results', 'invoices', 'payments'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_version', t);
+        EXECUTE format('CREATE CONSTRAINT TRIGGER %I AFTER INSERT OR UPDATE OR DELETE ON %I '
+                       'DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION bump_table_version()',
+                       'trg_' || t || '_version', t);
+        -- Constraint triggers cannot fire on TRUNCATE
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_version_truncate', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()',
+                       'trg_' || t || '_version_truncate', t);
+    END LOOP;
+END;
+$$;
+
+DROP TABLE IF EXISTS table_versions;
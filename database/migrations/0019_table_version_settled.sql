@@ -0,0 +1,49 @@
+-- Table versions that never run ahead of committed rows; more tables versioned.
+--
+-- 0018 bumped the version sequences from a deferred row trigger, on the
+-- assumption that the new version would only show at commit. It does not:
+-- nextval is visible to every session at once, before the commit is. A
+-- GET reading the versions in that window then read the old rows and
+-- cached them under the new ETag, which kept answering 304 until the next
+-- write. Being FOR EACH ROW, it also queued one deferred event per row of
+-- a bulk write.
+--
+-- bump_table_version() now runs from a plain statement trigger. Before its
+-- nextval (once per transaction and table) the writer takes a shared
+-- transaction advisory lock for the table, held until its commit is
+-- visible; writers never wait for one another on it.
+-- src/http_cache.table_version() reads the sequences, then tries the same
+-- lock exclusively for an instant. If a writer still holds it, the version
+-- may cover rows not visible yet and the route falls back to hashing the
+-- body; otherwise every bump it read is committed, and the rows the handler
+-- reads afterwards are at least that new.
+--
+-- track_table_version(t) adds the sequence and trigger for a table; the
+-- tables joined by the versioned results and invoice routes are added here.
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    -- Once per transaction and table, however many statements and rows
+    IF current_setting('erp_table_version.' || TG_TABLE_NAME, true) IS DISTINCT FROM 'bumped' THEN
+        PERFORM pg_advisory_xact_lock_shared(hashtext('table_version'), hashtext(TG_TABLE_NAME));
+        PERFORM set_config('erp_table_version.' || TG_TABLE_NAME, 'bumped', true);
+        PERFORM nextval(format('table_version_%s', TG_TABLE_NAME)::regclass);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_table_version(t TEXT) RETURNS void AS $$
+BEGIN
+    EXECUTE format('CREATE SEQUENCE IF NOT EXISTS %I', 'table_version_' || t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_version', t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_version_truncate', t);
+    EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()',
+                   'trg_' || t || '_version', t);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT track_table_version(t)
+FROM unnest(ARRAY['exams', 'exam_results', 'invoices', 'payments',
+                  'students', 'student_classes', 'subjects', 'terms', 'academic_years']) t;
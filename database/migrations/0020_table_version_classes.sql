@@ -0,0 +1,5 @@
+-- Version classes and forms too (see 0019): the class analytics matrix
+-- prints the class and form names, and lists the roster from
+-- student_classes and students, including students with no marks yet.
+
+SELECT track_table_version(t) FROM unnest(ARRAY['classes', 'forms']) t;
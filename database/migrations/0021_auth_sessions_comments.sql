@@ -0,0 +1,16 @@
+-- Correct account of refresh-token reuse detection.
+--
+-- The header of 0015 says presenting any secret other than the current one
+-- revokes the session as REUSED. Only the superseded secret does, and only
+-- after the grace window (previous_token_hash, rotated_at): that is a token
+-- copied before the last rotation. Any other secret is rejected and leaves
+-- the session alone, so guessing at a session id cannot log its owner out
+-- (src/auth/sessions.py). Applied migrations cannot be edited, so the
+-- schema carries the correction as comments instead.
+
+COMMENT ON TABLE auth_sessions IS
+    'Refresh-token sessions; token_hash is SHA-256 of the current secret (src/auth/sessions.py)';
+COMMENT ON COLUMN auth_sessions.previous_token_hash IS
+    'Secret replaced by the last rotation; accepted within the grace window, revokes the session as REUSED after it';
+COMMENT ON COLUMN auth_sessions.revoked_reason IS
+    'LOGOUT, REVOKED, or REUSED (the superseded secret presented after the grace window; any other wrong secret changes nothing)';
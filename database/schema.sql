@@ -105,6 +105,7 @@ CREATE TABLE teachers (
 CREATE TABLE students (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID UNIQUE REFERENCES users(id) ON DELETE SET NULL,
+    student_number VARCHAR(50) UNIQUE,
     first_name VARCHAR(100) NOT NULL,
     last_name VARCHAR(100) NOT NULL,
     date_of_birth DATE,
@@ -358,3 +359,65 @@ INSERT INTO institution_settings (key, value) VALUES
 ('phone', '07795977691'),
 ('examination_authority', 'ZIMSEC')
 ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW();
+
+-- ========== Reference-data change notifications ==========
+-- The API caches these tables in memory (src/refdata.py). Every committed
+-- change tells listening workers which table to drop from their cache.
+CREATE OR REPLACE FUNCTION notify_refdata_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('refdata_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_academic_years_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON academic_years
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+CREATE TRIGGER trg_terms_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON terms
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+CREATE TRIGGER trg_forms_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON forms
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+CREATE TRIGGER trg_streams_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON streams
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+CREATE TRIGGER trg_classes_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON classes
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+CREATE TRIGGER trg_subjects_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON subjects
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+CREATE TRIGGER trg_institution_settings_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON institution_settings
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+CREATE TRIGGER trg_news_events_refdata AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON news_events
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_refdata_changed();
+
+-- ========== Table version counters (HTTP ETags) ==========
+-- One sequence per table, bumped once per writing transaction by a
+-- statement trigger (nextval takes no row lock, so writers never queue on
+-- it). The writer also holds a shared advisory lock for the table until its
+-- commit is visible; src/http_cache.table_version() only turns versions
+-- into ETags when no writer holds it, so a version never runs ahead of the
+-- rows it stands for.
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    -- Once per transaction and table, however many statements and rows
+    IF current_setting('erp_table_version.' || TG_TABLE_NAME, true) IS DISTINCT FROM 'bumped' THEN
+        PERFORM pg_advisory_xact_lock_shared(hashtext('table_version'), hashtext(TG_TABLE_NAME));
+        PERFORM set_config('erp_table_version.' || TG_TABLE_NAME, 'bumped', true);
+        PERFORM nextval(format('table_version_%s', TG_TABLE_NAME)::regclass);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_table_version(t TEXT) RETURNS void AS $$
+BEGIN
+    EXECUTE format('CREATE SEQUENCE IF NOT EXISTS %I', 'table_version_' || t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_version', t);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_' || t || '_version_truncate', t);
+    EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()',
+                   'trg_' || t || '_version', t);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT track_table_version(t)
+FROM unnest(ARRAY['exams', 'exam_results', 'invoices', 'payments',
+                  'students', 'student_classes', 'subjects', 'terms', 'academic_years',
+                  'classes', 'forms']) t;
@@ -1,5 +1,5 @@
 import { createContext, useContext, useState, useEffect, useCallback } from 'react'
-import { authApi } from '../services/api'
+import { authApi, clearTokens, saveTokens } from '../services/api'
 
 const AuthContext = createContext(null)
 
@@ -20,8 +20,7 @@ export function AuthProvider({ children }) {
       setUser(data)
       localStorage.setItem('user', JSON.stringify(data))
     } catch {
-      localStorage.removeItem('token')
-      localStorage.removeItem('user')
+      clearTokens()
       setUser(null)
     } finally {
       setLoading(false)
@@ -34,15 +33,15 @@ export function AuthProvider({ children }) {
 
   const login = async (email, password) => {
     const data = await authApi.login(email, password)
-    localStorage.setItem('token', data.access_token)
+    saveTokens(data)
     localStorage.setItem('user', JSON.stringify(data.user))
     setUser(data.user)
     return data.user
   }
 
   const logout = () => {
-    localStorage.removeItem('token')
-    localStorage.removeItem('user')
+    authApi.logout()
+    clearTokens()
     setUser(null)
   }
 
@@ -10,7 +10,41 @@ function getToken() {
   return localStorage.getItem('token')
 }
 
-export async function api(url, options = {}) {
+export function saveTokens(data) {
+  localStorage.setItem('token', data.access_token)
+  if (data.refresh_token) localStorage.setItem('refresh_token', data.refresh_token)
+}
+
+export function clearTokens() {
+  localStorage.removeItem('token')
+  localStorage.removeItem('refresh_token')
+  localStorage.removeItem('user')
+}
+
+// One refresh at a time; concurrent 401s wait for the same new token
+let refreshing = null
+
+function refreshToken() {
+  const refresh_token = localStorage.getItem('refresh_token')
+  if (!refresh_token) return Promise.resolve(false)
+  if (!refreshing) {
+    refreshing = fetch(`${API_BASE}/api/auth/refresh`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token }),
+    })
+      .then(async (res) => {
+        if (!res.ok) return false
+        saveTokens(await res.json())
+        return true
+      })
+      .catch(() => false)
+      .finally(() => { refreshing = null })
+  }
+  return refreshing
+}
+
+export async function api(url, options = {}, retried = false) {
   const token = getToken()
   const headers = {
     'Content-Type': 'application/json',
@@ -18,9 +52,9 @@ export async function api(url, options = {}) {
     ...options.headers,
   }
   const res = await fetch(`${API_BASE}${url}`, { ...options, headers })
-  if (res.status === 401) {
-    localStorage.removeItem('token')
-    localStorage.removeItem('user')
+  if (res.status === 401 && !url.startsWith('/api/auth/login')) {
+    if (!retried && await refreshToken()) return api(url, options, true)
+    clearTokens()
     window.location.href = '/login'
     throw new Error('Unauthorized')
   }
@@ -35,6 +69,18 @@ export async function api(url, options = {}) {
 export const authApi = {
   login: (email, password) => api('/api/auth/login', { method: 'POST', body: JSON.stringify({ email, password }) }),
   me: () => api('/api/auth/me'),
+  logout: () => {
+    const refresh_token = localStorage.getItem('refresh_token')
+    if (!refresh_token) return Promise.resolve(null)
+    return fetch(`${API_BASE}/api/auth/logout`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token }),
+    }).catch(() => null)
+  },
+  sessions: () => api('/api/auth/sessions'),
+  revokeSession: (id) => api(`/api/auth/sessions/${id}`, { method: 'DELETE' }),
+  revokeOtherSessions: () => api('/api/auth/sessions', { method: 'DELETE' }),
 }
 
 export const publicApi = {
@@ -52,6 +98,7 @@ export const publicApi = {
 export const usersApi = {
   list: (params) => api(`/api/users?${new URLSearchParams(params)}`),
   create: (data) => api('/api/users', { method: 'POST', body: JSON.stringify(data) }),
+  update: (id, data) => api(`/api/users/${id}`, { method: 'PATCH', body: JSON.stringify(data) }),
 }
 
 export const studentsApi = {
@@ -87,6 +134,7 @@ export const subjectsApi = {
 export const attendanceApi = {
   list: (params) => api(`/api/attendance?${new URLSearchParams(params)}`),
   byStudent: (studentId, params) => api(`/api/attendance/student/${studentId}?${new URLSearchParams(params)}`),
+  alerts: (params) => api(`/api/attendance/alerts?${new URLSearchParams(params)}`),
   mark: (classId, body) => api(`/api/attendance?class_id=${classId}`, { method: 'POST', body: JSON.stringify(body) }),
   bulk: (classId, body) => api(`/api/attendance/bulk?class_id=${classId}`, { method: 'POST', body: JSON.stringify(body) }),
 }
@@ -121,6 +169,21 @@ export const financeApi = {
   recordPayment: (invoiceId, body) => api(`/api/finance/invoices/${invoiceId}/payments`, { method: 'POST', body: JSON.stringify(body) }),
   debtors: (params) => api(`/api/finance/debtors?${new URLSearchParams(params)}`),
   summary: (params) => api(`/api/finance/summary?${new URLSearchParams(params)}`),
+  billingRun: (body) => api('/api/finance/billing-runs', { method: 'POST', body: JSON.stringify(body) }),
+  billingRuns: (params) => api(`/api/finance/billing-runs?${new URLSearchParams(params)}`),
+  getBillingRun: (id) => api(`/api/finance/billing-runs/${id}`),
+  importStatement: async (file, params = {}) => {
+    const token = getToken()
+    const form = new FormData()
+    form.append('file', file)
+    const res = await fetch(`${API_BASE}/api/finance/statements/import?${new URLSearchParams(params)}`, {
+      method: 'POST',
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      body: form,
+    })
+    if (!res.ok) throw new Error(await res.text())
+    return res.json()
+  },
 }
 
 export const messagesApi = {
@@ -128,6 +191,11 @@ export const messagesApi = {
   send: (body) => api('/api/messages', { method: 'POST', body: JSON.stringify(body) }),
   users: (q) => api(`/api/messages/users?${q ? `q=${encodeURIComponent(q)}` : ''}`),
   get: (id) => api(`/api/messages/${id}`),
+  unreadCount: () => api('/api/messages/unread-count'),
+  broadcast: (body) => api('/api/messages/broadcasts', { method: 'POST', body: JSON.stringify(body) }),
+  broadcastPreview: (params) => api(`/api/messages/broadcasts/preview?${new URLSearchParams(params)}`),
+  broadcastStatus: (id) => api(`/api/messages/broadcasts/${id}`),
+  subscribe: (onEvent) => subscribeMessages(onEvent),
 }
 
 export const reportsApi = {
@@ -149,17 +217,116 @@ export const learningApi = {
   library: (params) => api(`/api/learning/library?${new URLSearchParams(params)}`),
 }
 
+// Chunked uploads: small chunks lose little when a slow link drops, and the
+// upload id is kept per file so a retry (or a page reload) resumes from the
+// server's offset instead of starting over.
+const UPLOAD_CHUNK = 512 * 1024
+const UPLOAD_RETRIES = 8
+const uploadKey = (file) => `upload:${file.name}:${file.size}:${file.lastModified}`
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+async function uploadFetch(url, options = {}, retried = false) {
+  const token = getToken()
+  const res = await fetch(`${API_BASE}${url}`, {
+    ...options,
+    headers: { ...(token && { Authorization: `Bearer ${token}` }), ...options.headers },
+  })
+  if (res.status === 401 && !retried && await refreshToken()) return uploadFetch(url, options, true)
+  return res
+}
+
+async function uploadOffset(id) {
+  const res = await uploadFetch(`/api/uploads/resumable/${id}`, { method: 'HEAD' })
+  return res.ok ? Number(res.headers.get('Upload-Offset')) : null
+}
+
 export const uploadApi = {
-  upload: async (file) => {
-    const token = getToken()
-    const form = new FormData()
-    form.append('file', file)
-    const res = await fetch(`${API_BASE}/api/uploads`, {
-      method: 'POST',
-      headers: token ? { Authorization: `Bearer ${token}` } : {},
-      body: form,
-    })
-    if (!res.ok) throw new Error(await res.text())
-    return res.json()
+  upload: async (file, onProgress) => {
+    if (file.size === 0) {
+      const form = new FormData()
+      form.append('file', file)
+      const res = await uploadFetch('/api/uploads', { method: 'POST', body: form })
+      if (!res.ok) throw new Error(await res.text())
+      return res.json()
+    }
+    const key = uploadKey(file)
+    let id = localStorage.getItem(key)
+    let offset = id ? await uploadOffset(id).catch(() => null) : null
+    if (offset === null) {
+      const created = await api('/api/uploads/resumable', {
+        method: 'POST',
+        body: JSON.stringify({ file_name: file.name, content_type: file.type || null, length: file.size }),
+      })
+      id = created.id
+      offset = 0
+      localStorage.setItem(key, id)
+    }
+    for (let failures = 0; ;) {
+      if (offset === file.size) {
+        // Every byte arrived but the reply was lost
+        const status = await api(`/api/uploads/resumable/${id}`)
+        localStorage.removeItem(key)
+        return status.file
+      }
+      let res
+      try {
+        res = await uploadFetch(`/api/uploads/resumable/${id}`, {
+          method: 'PATCH',
+          headers: { 'Upload-Offset': String(offset), 'Content-Type': 'application/offset+octet-stream' },
+          body: file.slice(offset, offset + UPLOAD_CHUNK),
+        })
+      } catch (err) {
+        // Connection dropped: back off, then ask the server how much arrived
+        if (++failures > UPLOAD_RETRIES) throw err
+        await sleep(Math.min(1000 * 2 ** failures, 30000))
+        offset = await uploadOffset(id).catch(() => offset)
+        if (offset === null) throw err
+        continue
+      }
+      if (res.status === 409 && res.headers.get('Upload-Offset')) {
+        offset = Number(res.headers.get('Upload-Offset'))
+        continue
+      }
+      if (!res.ok) throw new Error(await res.text())
+      failures = 0
+      offset = Number(res.headers.get('Upload-Offset'))
+      if (onProgress) onProgress(offset / file.size)
+      if (res.status === 200) {
+        localStorage.removeItem(key)
+        return res.json()
+      }
+    }
   },
+  remove: (id) => api(`/api/uploads/${id}`, { method: 'DELETE' }),
+}
+
+// Live message events (new messages, read receipts, unread count) over a WebSocket.
+// Reconnects after drops, and with a refreshed token after expiry; returns a function that closes it.
+function subscribeMessages(onEvent) {
+  let socket
+  let timer
+  let closed = false
+  const url = (API_BASE || window.location.origin).replace(/^http/, 'ws') + '/api/messages/ws'
+  const open = () => {
+    const token = getToken()
+    if (!token || closed) return
+    socket = new WebSocket(url)
+    socket.onopen = () => socket.send(JSON.stringify({ type: 'auth', token }))
+    socket.onmessage = (e) => onEvent(JSON.parse(e.data))
+    socket.onclose = (e) => {
+      if (closed) return
+      if (e.code === 4001 || e.code === 4401) {
+        // Access token expired or rejected: refresh it, then reconnect
+        refreshToken().then((ok) => { if (ok && !closed) open() })
+      } else {
+        timer = setTimeout(open, 5000)
+      }
+    }
+  }
+  open()
+  return () => {
+    closed = true
+    clearTimeout(timer)
+    if (socket) socket.close()
+  }
 }